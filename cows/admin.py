@@ -1,6 +1,6 @@
 # cows/admin.py
 from django.contrib import admin
-from .models import Cow, Event, CowDocument, Task, Herd 
+from .models import Cow, Event, CowDocument, Task, TaskRecurrence, Herd, WeightMeasurement
 
 @admin.register(Herd)
 class HerdAdmin(admin.ModelAdmin):
@@ -50,6 +50,14 @@ class EventAdmin(admin.ModelAdmin):
     search_fields = ['cow__name', 'cow__tag_id', 'notes']
     autocomplete_fields = ['cow'] 
 
+@admin.register(WeightMeasurement)
+class WeightMeasurementAdmin(admin.ModelAdmin):
+    list_display = ['cow', 'date', 'weight', 'daily_gain', 'rolling_gain', 'source']
+    list_filter = ['source', 'date']
+    search_fields = ['cow__name', 'cow__tag_id']
+    autocomplete_fields = ['cow']
+    readonly_fields = ['daily_gain', 'rolling_gain']
+
 @admin.register(CowDocument)
 class CowDocumentAdmin(admin.ModelAdmin):
     list_display = ['cow', 'title', 'filename', 'user', 'uploaded_at']
@@ -63,4 +71,13 @@ class TaskAdmin(admin.ModelAdmin):
     list_filter = ['is_completed', 'task_type', 'due_date', 'user']
     search_fields = ['title', 'cow__name', 'cow__tag_id', 'notes']
     autocomplete_fields = ['cow']
-    list_editable = ['is_completed'] 
+    list_editable = ['is_completed']
+    raw_id_fields = ['recurrence', 'source_event']
+
+@admin.register(TaskRecurrence)
+class TaskRecurrenceAdmin(admin.ModelAdmin):
+    list_display = ['title', 'cow', 'task_type', 'frequency', 'interval', 'start_date', 'end_date', 'is_active', 'generated_until']
+    list_filter = ['is_active', 'frequency', 'task_type']
+    search_fields = ['title', 'cow__name', 'cow__tag_id', 'notes']
+    autocomplete_fields = ['cow']
+    readonly_fields = ['generated_until'] 
@@ -0,0 +1,119 @@
+# cows/async_views.py
+
+import time
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .models import Cow
+from .pedigree import fetch_pedigree, parse_depth
+from .search import search, search_params
+from .stats import aget_stats, herd_param
+from .sync import change_feeds, changes_payload, since_param
+from .views import CowViewSet
+
+# Endpointy tylko do odczytu w wersji async - podpinane w cows/urls.py, gdy ASYNC_API=True (highlander_farm/asgi.py).
+# Odpowiedzi są takie same jak z widoków DRF (te same querysety, filtry, paginacja i serializery), ale czekanie
+# na bazę i cache nie blokuje wątku: jeden proces ASGI obsługuje wiele urządzeń naraz.
+# Uwaga: w Django 5.0 zapytania async ORM i tak wykonuje wątek roboczy (sync_to_async), zyskiem jest
+# obsługa połączeń (powolne sieci w oborze, wiele urządzeń na raz), a nie równoległość samej bazy.
+
+_jwt = JWTAuthentication()
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status, headers=headers)
+
+
+async def authenticate(request):
+    """Użytkownik z nagłówka "Authorization: Bearer <token>" (jak JWTAuthentication, ale przez async ORM) albo None."""
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header else None
+    if raw_token is None: return None
+    try: token = _jwt.get_validated_token(raw_token)
+    except (InvalidToken, TokenError): return None
+    User = get_user_model()
+    try: user = await User.objects.aget(**{jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM]})
+    except (KeyError, User.DoesNotExist): return None
+    return user if user.is_active else None
+
+
+def async_api_view(fallback=None):
+    """GET obsługuje widok async (z requestem DRF - query_params, kontekst serializerów); pozostałe metody
+    idą do dotychczasowego widoku DRF `fallback`. Błędy DRF (ValidationError, 404) mają ten sam format co w DRF."""
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                if fallback is None: return json_response({'detail': f'Metoda "{request.method}" niedozwolona.'}, status=405)
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+            user = await authenticate(request)
+            if user is None:
+                return json_response({'detail': 'Nie podano danych uwierzytelniających.'}, status=401, headers={'WWW-Authenticate': 'Bearer realm="api"'})
+            drf_request = Request(request, authenticators=()); drf_request.user = user
+            try: return await view(drf_request, *args, **kwargs)
+            except (APIException, Http404) as exc:
+                response = exception_handler(exc, {'request': drf_request})
+                return json_response(response.data, status=response.status_code)
+        return wrapper
+    return decorator
+
+
+# === LISTA KRÓW ===
+def _list_view(viewset_class, request):
+    """Viewset DRF bez dispatch - jego get_queryset, filtry, paginacja i serializery."""
+    view = viewset_class(action_map={'get': 'list'}); view.format_kwarg = None; view.args = (); view.kwargs = {}
+    view.request = view.initialize_request(request._request); view.request.user = request.user
+    return view
+
+def _prepare_list(view):
+    # Filtry potrafią sprawdzić coś w bazie (np. czy stado z ?herd= istnieje), więc w wątku, jak ORM
+    queryset = view.filter_queryset(view.get_queryset())
+    return queryset, view.paginator.page_queryset(queryset, view.request, view)
+
+@async_api_view(fallback=CowViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def cow_list(request):
+    view = _list_view(CowViewSet, request)
+    queryset, page = await sync_to_async(_prepare_list)(view)
+    if page is None: return json_response(view.get_serializer([cow async for cow in queryset], many=True).data)
+    rows = view.paginator.page_rows([cow async for cow in page])
+    return json_response(view.paginator.get_paginated_response(view.get_serializer(rows, many=True).data).data)
+
+
+# === STATYSTYKI, RODOWÓD, WYSZUKIWARKA, KANAŁ ZMIAN ===
+@async_api_view()
+async def cow_stats(request):
+    data, cached = await aget_stats(request, herd_id=herd_param(request.query_params))
+    return json_response(data, headers={'X-Cache': 'HIT' if cached else 'MISS'})
+
+nested_pedigree = CowViewSet.as_view({'get': 'pedigree'})
+
+@async_api_view()
+async def cow_pedigree(request, pk):
+    # Bez ?depth - dotychczasowa odpowiedź zagnieżdżona z serializerów DRF
+    if 'depth' not in request.query_params: return await sync_to_async(nested_pedigree)(request._request, pk=pk)
+    if not await Cow.objects.filter(pk=pk).aexists(): raise Http404
+    return json_response(await sync_to_async(fetch_pedigree)(pk, parse_depth(request.query_params['depth'])))
+
+@async_api_view()
+async def search_view(request):
+    text, entities, limit = search_params(request.query_params)
+    started = time.perf_counter(); results = await sync_to_async(search)(text, entities=entities, limit=limit)
+    return json_response({'query': text, 'results': results, 'took_ms': round((time.perf_counter() - started) * 1000, 2)})
+
+@async_api_view()
+async def sync_changes(request):
+    cursor = timezone.now(); feeds, tombstones = change_feeds(since_param(request.query_params))
+    rows = {name: [obj async for obj in queryset] for name, queryset, _ in feeds}
+    deleted = None if tombstones is None else [row async for row in tombstones]
+    return json_response(changes_payload(cursor, feeds, rows, deleted, request))
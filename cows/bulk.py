@@ -0,0 +1,118 @@
+# cows/bulk.py
+
+from datetime import date
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .models import Cow, Event, Herd, Task
+from .serializers import CowCreateUpdateSerializer, EventSerializer, TaskSerializer
+from .signals import bulk_changed
+
+# Operacje na wielu krowach naraz (przepęd między stadami, sprzedaż partii, archiwizacja): dane sprawdzane raz,
+# zapis jednym UPDATE i jednym bulk_create zdarzeń zamiast setek PATCH-y z pełną odpowiedzią CowSerializer.
+DEFAULT_BULK_MAX_COWS = 5000
+# Pola, które mają sens dla całej grupy (bez numerów, imion, rodziców i wag pojedynczych zwierząt)
+PATCH_FIELDS = [
+    'herd', 'status', 'exit_date', 'exit_reason', 'sale_price', 'meat_delivery_date', 'breed', 'business_number',
+    'pregnancy_duration', 'is_pregnancy_possible', 'relocation_status', 'relocation_after_drive',
+    'duplicates_to_make', 'duplicates_to_order',
+]
+FILTER_FIELDS = ['herd', 'status', 'gender', 'breed'] # jak filterset_fields listy krów
+
+
+def max_cows():
+    return getattr(settings, 'BULK_MAX_COWS', DEFAULT_BULK_MAX_COWS)
+
+def select_cows(data):
+    """Krowy z {"ids": [...]} i/lub {"filter": {"herd": 1, "status": "ACTIVE", ...}} (oba - część wspólna).
+    Pusty wybór jest błędem, żeby pomyłka w kliencie nie zmieniła całego gospodarstwa."""
+    ids = data.get('ids'); filters = data.get('filter') or {}
+    if not ids and not filters: raise ValidationError({'error': "Podaj 'ids' albo 'filter'"})
+    cows = Cow.objects.all()
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids): raise ValidationError({'ids': 'Lista liczbowych ID krów'})
+        cows = cows.filter(pk__in=ids)
+    if not isinstance(filters, dict) or set(filters) - set(FILTER_FIELDS):
+        raise ValidationError({'filter': f"Dozwolone klucze: {', '.join(FILTER_FIELDS)}"})
+    for field, value in filters.items():
+        if field == 'herd' and not (value is None or (isinstance(value, int) and Herd.objects.filter(pk=value).exists())):
+            raise ValidationError({'filter': f'Nie ma stada {value}'})
+        if field in ('status', 'gender') and value not in dict(Cow._meta.get_field(field).choices):
+            raise ValidationError({'filter': f"Nieprawidłowa wartość '{value}' dla {field}"})
+        cows = cows.filter(**{field: value})
+    return cows.order_by('pk')
+
+def validate_patch(patch):
+    """Zmiany sprawdzone raz tym samym serializerem co PATCH pojedynczej krowy. Zwraca {kolumna: wartość}."""
+    if not isinstance(patch, dict) or not patch: raise ValidationError({'patch': 'Podaj zmieniane pola'})
+    unknown = set(patch) - set(PATCH_FIELDS)
+    if unknown: raise ValidationError({'patch': f"Tych pól nie można zmieniać zbiorczo: {', '.join(sorted(unknown))}"})
+    serializer = CowCreateUpdateSerializer(data=patch, partial=True); serializer.is_valid(raise_exception=True)
+    return {('herd_id' if field == 'herd' else field): (value.pk if field == 'herd' and value else value) for field, value in serializer.validated_data.items()}
+
+def describe_patch(patch):
+    """Treść zdarzenia w historii krowy, np. "Zmiana zbiorcza: Stado: DOLNE; STATUS: Sprzedana"."""
+    parts = []
+    for column, value in patch.items():
+        field = Cow._meta.get_field(column.removesuffix('_id'))
+        if column == 'herd_id': value = Herd.objects.filter(pk=value).values_list('name', flat=True).first() if value else '-'
+        elif field.choices: value = dict(field.choices).get(value, value)
+        parts.append(f"{field.verbose_name}: {'-' if value in (None, '') else value}")
+    return 'Zmiana zbiorcza: ' + '; '.join(parts)
+
+def validate_event(event, notes):
+    """Zdarzenie dopisywane każdej krowie - domyślnie INNE z dzisiejszą datą i opisem zmian."""
+    payload = {'event_type': 'INNE', 'date': date.today(), 'notes': notes, **(event or {})}
+    serializer = EventSerializer(data=payload, partial=True); serializer.is_valid(raise_exception=True)
+    return {key: value for key, value in serializer.validated_data.items() if key != 'cow'}
+
+
+def bulk_update_cows(data, user):
+    """{"ids"/"filter", "patch", "event" (opcjonalnie), "dry_run"} -> podsumowanie bez serializowania krów."""
+    patch = validate_patch(data.get('patch')); cows = select_cows(data)
+    event = validate_event(data.get('event'), describe_patch(patch)) if data.get('event') is not False else None
+    with transaction.atomic():
+        rows = list(cows.select_for_update().values_list('pk', 'herd_id')); ids = [pk for pk, _ in rows]
+        if len(ids) > max_cows(): raise ValidationError({'error': f'Za dużo krów naraz ({len(ids)}, limit {max_cows()})'})
+        summary = {'matched': len(ids), 'fields': sorted(column.removesuffix('_id') for column in patch), 'ids': ids}
+        if data.get('dry_run') or not ids: return {**summary, 'updated': 0, 'events': 0}
+        updated = Cow.objects.filter(pk__in=ids).update(**patch, updated_at=timezone.now())
+        events = Event.objects.bulk_create([Event(cow_id=pk, user=user, **event) for pk in ids], batch_size=500) if event else []
+        # Stada sprzed przeniesienia - ich podsumowania też trzeba przeliczyć
+        bulk_changed.send(sender=Cow, ids=ids, fields=list(patch), herd_ids={herd_id for _, herd_id in rows} if 'herd_id' in patch else ())
+        if events: bulk_changed.send(sender=Event, ids=[e.pk for e in events])
+    return {**summary, 'updated': updated, 'events': len(events)}
+
+
+# === ZDARZENIA I ZADANIA DLA WIELU KRÓW (szczepienie stada, zabiegi, zaplanowane kontrole) ===
+def validate_shared(serializer_class, payload):
+    """Wspólne pola rekordu sprawdzone raz serializerem pojedynczego zapisu (bez pola 'cow')."""
+    if not isinstance(payload, dict) or not payload: raise ValidationError({'payload': 'Podaj wspólne dane zapisu'})
+    serializer = serializer_class(data=payload); del serializer.fields['cow']
+    serializer.is_valid(raise_exception=True)
+    return dict(serializer.validated_data)
+
+def records_for_cows(model, serializer_class, data, user, active_only=False):
+    """Niezapisane obiekty `model` z tym samym payloadem dla każdej wybranej krowy i podsumowanie wyboru."""
+    values = validate_shared(serializer_class, data.get('payload')); cows = select_cows(data)
+    if active_only: cows = cows.filter(status='ACTIVE') # zadania tylko dla aktywnych, jak w TaskSerializer
+    ids = list(cows.values_list('pk', flat=True))
+    if len(ids) > max_cows(): raise ValidationError({'error': f'Za dużo krów naraz ({len(ids)}, limit {max_cows()})'})
+    return [model(cow_id=pk, user=user, **values) for pk in ids], {'matched': len(ids), 'ids': ids}
+
+def create_for_cows(model, serializer_class, data, user, active_only=False):
+    """{"ids"/"filter", "payload", "dry_run"} -> jeden bulk_create w jednej transakcji."""
+    with transaction.atomic():
+        records, summary = records_for_cows(model, serializer_class, data, user, active_only)
+        if data.get('dry_run') or not records: return {**summary, 'created': 0, 'created_ids': []}
+        records = model.objects.bulk_create(records, batch_size=500)
+        created_ids = [record.pk for record in records]
+        bulk_changed.send(sender=model, ids=created_ids)
+    return {**summary, 'created': len(created_ids), 'created_ids': created_ids}
+
+def create_events(data, user):
+    return create_for_cows(Event, EventSerializer, data, user)
+
+def create_tasks(data, user):
+    return create_for_cows(Task, TaskSerializer, data, user, active_only=True)
@@ -0,0 +1,65 @@
+# cows/exporter.py
+
+import csv
+import re
+import tempfile
+from django.db.models import F
+from openpyxl import Workbook
+from .importer import COLUMN_MAP, HERD_COLUMN
+
+# Kolumny w tej samej postaci co w imporcie, więc wyeksportowany plik można zaimportować z powrotem
+EXPORT_COLUMNS = list(COLUMN_MAP.items())
+# Pola tabeli Cow dla values() (rodzice po numerze ARiMR, stado po nazwie)
+VALUE_FIELDS = {'dam_tag': 'dam__tag_id', 'sire_tag': 'sire__tag_id'}
+GENDER_LABELS = {'F': 'SAMICA', 'M': 'SAMIEC'}
+# Import rozpoznaje każdą z tych etykiet (cows/importer.py), więc status przechodzi przez eksport i import bez zmian
+STATUS_LABELS = {'ACTIVE': 'AKTYWNA', 'SOLD': 'SPRZEDANA', 'ARCHIVED': 'PADŁ/ZARCHIWIZOWANA', 'OTHER': 'INNY'}
+NO_HERD_SHEET = 'BEZ_STADA'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def export_rows(queryset):
+    """Strumień (nazwa stada, wiersz) posortowany po stadzie - jedno zapytanie z JOIN, bez obiektów modelu."""
+    lookups = [VALUE_FIELDS.get(field, field) for _, field in EXPORT_COLUMNS]
+    rows = (queryset.order_by(F('herd__name').asc(nulls_last=True), 'tag_id')
+            .values_list('herd__name', *lookups).iterator(chunk_size=2000))
+    gender_index = lookups.index('gender'); status_index = lookups.index('status'); price_index = lookups.index('sale_price')
+    for herd_name, *values in rows:
+        values[gender_index] = GENDER_LABELS.get(values[gender_index], values[gender_index])
+        values[status_index] = STATUS_LABELS.get(values[status_index], values[status_index])
+        if values[price_index] is not None: values[price_index] = float(values[price_index])
+        yield herd_name, values
+
+
+def sheet_title(herd_name, used):
+    # Tylko dla czytelności - import bierze stado z kolumny STADO (tytuł jest skracany i bywa z sufiksem _2)
+    title = re.sub(r'[\[\]:*?/\\]', '', (herd_name or NO_HERD_SHEET).strip()).replace(' ', '_')[:31] or NO_HERD_SHEET
+    base, n = title, 2
+    while title.upper() in used: title = f"{base[:28]}_{n}"; n += 1
+    used.add(title.upper())
+    return title
+
+
+def write_workbook(queryset):
+    """Zapisuje skoroszyt (arkusz = stado) w trybie write-only do pliku tymczasowego i go zwraca."""
+    workbook = Workbook(write_only=True); headers = [HERD_COLUMN] + [header for header, _ in EXPORT_COLUMNS]
+    sheet = None; current = object(); used = set()
+    for herd_name, values in export_rows(queryset):
+        if herd_name != current:
+            sheet = workbook.create_sheet(sheet_title(herd_name, used)); sheet.append(headers); current = herd_name
+        sheet.append([herd_name] + values)
+    if sheet is None: workbook.create_sheet(NO_HERD_SHEET).append(headers)
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook.save(output); output.seek(0)
+    return output
+
+
+class _Echo:
+    def write(self, value): return value
+
+def stream_csv(queryset):
+    """Generator linii CSV (z kolumną STADO) dla StreamingHttpResponse."""
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff' + writer.writerow([HERD_COLUMN] + [header for header, _ in EXPORT_COLUMNS]) # BOM - poprawne polskie znaki w Excelu
+    for herd_name, values in export_rows(queryset):
+        yield writer.writerow([herd_name or ''] + ['' if v is None else v for v in values])
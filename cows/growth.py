@@ -0,0 +1,190 @@
+# cows/growth.py
+
+import io
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+from .models import Cow, HerdGrowthSummary, WeightMeasurement, normalize_tag
+
+# Ważenia to szereg czasowy (WeightMeasurement); przyrosty liczone są wsadowo w pandas dla wszystkich zmienionych krów
+# naraz i zapisywane z powrotem: przy ważeniu (daily_gain, rolling_gain), na krowie (weight, weight_date,
+# daily_weight_gain) i w HerdGrowthSummary (percentyle stada). Endpointy /growth/ tylko czytają gotowe wartości.
+DEFAULT_ROLLING_DAYS = 30 # okno średniego przyrostu
+PERCENTILES = (10, 25, 50, 75, 90)
+DECILES = tuple(range(0, 101, 10)) # do pozycji krowy w stadzie (np.interp)
+MAX_WEIGHT = 2000 # kg - odrzuca pomyłki typu gramy zamiast kilogramów
+RECOMPUTE_BATCH = 500 # krów na zapytanie o ważenia
+COW_FIELDS = ['weight', 'weight_date', 'daily_weight_gain'] # pola krowy ustawiane z ważeń (bulk_changed fields=)
+# Nagłówki pliku z wagi/Excela (wielkość liter bez znaczenia)
+FILE_COLUMNS = {
+    'NR ARIMR': 'tag', 'KOLCZYK': 'tag', 'EID': 'tag', 'TAG': 'tag',
+    'DATA': 'date', 'DATA WAŻENIA': 'date', 'DATE': 'date',
+    'WAGA': 'weight', 'WAGA (KG)': 'weight', 'KG': 'weight', 'WEIGHT': 'weight',
+}
+
+
+def rolling_days():
+    return getattr(settings, 'GROWTH_ROLLING_DAYS', DEFAULT_ROLLING_DAYS)
+
+def _value(number, digits=3):
+    return None if number is None or not np.isfinite(number) else round(float(number), digits)
+
+
+# === OBLICZENIA (wektorowo, wszystkie krowy naraz) ===
+def compute_gains(frame, window_days):
+    """frame: cow_id, date (datetime64), weight. Dodaje daily_gain (od poprzedniego ważenia) i rolling_gain
+    (przyrost/dzień w oknie `window_days`: suma zmian wagi / suma dni - przerwy między ważeniami nie zaniżają średniej)."""
+    frame = frame.sort_values(['cow_id', 'date'], kind='stable').reset_index(drop=True)
+    grouped = frame.groupby('cow_id', sort=False)
+    frame['weight_diff'] = grouped['weight'].diff(); frame['days'] = grouped['date'].diff().dt.days.astype(float)
+    frame['daily_gain'] = frame['weight_diff'] / frame['days']
+    window = frame.set_index('date').groupby('cow_id', sort=False)[['weight_diff', 'days']].rolling(f'{window_days}D').sum()
+    frame['rolling_gain'] = (window['weight_diff'] / window['days']).to_numpy()
+    return frame.replace([np.inf, -np.inf], np.nan)
+
+def describe(values):
+    values = np.asarray(values, dtype=float)
+    if not values.size: return None
+    return {
+        'count': int(values.size), 'mean': _value(values.mean()), 'min': _value(values.min()), 'max': _value(values.max()),
+        'percentiles': {f'p{p}': _value(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+        'deciles': [_value(v) for v in np.percentile(values, DECILES)],
+    }
+
+def percentile_rank(value, stats):
+    """Przybliżona pozycja (0-100) wartości w rozkładzie stada - z zapisanych decyli, bez czytania całego stada."""
+    if value is None or not stats: return None
+    return round(float(np.interp(value, stats['deciles'], DECILES)), 1)
+
+
+# === PRZELICZANIE I ZAPIS WYNIKÓW ===
+def recompute(cow_ids):
+    """Przelicza przyrosty podanych krów, zapisuje zmienione wartości i odświeża podsumowania ich stad.
+    Zwraca liczbę krów, których pola się zmieniły."""
+    from .signals import bulk_changed # signals importuje ten moduł
+    cow_ids = sorted(set(cow_ids)); window_days = rolling_days(); changed_cows = []; herd_ids = set()
+    for start in range(0, len(cow_ids), RECOMPUTE_BATCH):
+        batch = cow_ids[start:start + RECOMPUTE_BATCH]
+        records = list(WeightMeasurement.objects.filter(cow_id__in=batch).values_list('id', 'cow_id', 'date', 'weight', 'daily_gain', 'rolling_gain'))
+        cows = {cow.pk: cow for cow in Cow.objects.filter(pk__in=batch).only('id', 'herd_id', 'weight', 'weight_date', 'daily_weight_gain')}
+        herd_ids.update(cow.herd_id for cow in cows.values() if cow.herd_id)
+        if not records: continue
+        frame = pd.DataFrame.from_records(records, columns=['id', 'cow_id', 'date', 'weight', 'old_daily', 'old_rolling'])
+        frame['date'] = pd.to_datetime(frame['date'])
+        frame = compute_gains(frame, window_days)
+        measurements = []
+        for row_id, daily, rolling, old_daily, old_rolling in zip(frame['id'], frame['daily_gain'], frame['rolling_gain'], frame['old_daily'], frame['old_rolling']):
+            daily, rolling = _value(daily), _value(rolling)
+            if (daily, rolling) != (_value(old_daily), _value(old_rolling)):
+                measurements.append(WeightMeasurement(id=row_id, daily_gain=daily, rolling_gain=rolling))
+        WeightMeasurement.objects.bulk_update(measurements, ['daily_gain', 'rolling_gain'], batch_size=RECOMPUTE_BATCH)
+        now = timezone.now()
+        for latest in frame.groupby('cow_id', sort=False).tail(1).itertuples():
+            cow = cows.get(latest.cow_id)
+            if cow is None: continue
+            # Jedno ważenie - przyrostu nie da się policzyć, zostaje dotychczasowy (np. wpisany w arkuszu)
+            gain = _value(latest.rolling_gain)
+            values = (float(latest.weight), latest.date.date(), cow.daily_weight_gain if gain is None else gain)
+            if values != (cow.weight, cow.weight_date, cow.daily_weight_gain):
+                cow.weight, cow.weight_date, cow.daily_weight_gain = values; cow.updated_at = now; changed_cows.append(cow)
+    Cow.objects.bulk_update(changed_cows, [*COW_FIELDS, 'updated_at'], batch_size=RECOMPUTE_BATCH)
+    # Tylko waga - rodowód, podsumowania stad i indeks wyszukiwania tego nie używają (patrz signals.touches)
+    if changed_cows: bulk_changed.send(sender=Cow, ids=[cow.pk for cow in changed_cows], fields=COW_FIELDS)
+    summarize_herds(herd_ids)
+    return len(changed_cows)
+
+def summarize_herds(herd_ids):
+    """Percentyle przyrostu i wagi aktywnych krów - jedno zapytanie i jeden upsert dla wszystkich stad."""
+    herd_ids = sorted(set(herd_ids))
+    if not herd_ids: return
+    rows = pd.DataFrame.from_records(
+        Cow.objects.filter(herd_id__in=herd_ids, status='ACTIVE').values_list('herd_id', 'daily_weight_gain', 'weight'),
+        columns=['herd_id', 'gain', 'weight'],
+    ).astype({'gain': float, 'weight': float})
+    groups = dict(list(rows.groupby('herd_id'))); now = timezone.now(); summaries = []
+    for herd_id in herd_ids:
+        group = groups.get(herd_id, rows.iloc[:0]); gains = group['gain'].dropna()
+        summary = {'daily_gain': describe(gains), 'weight': describe(group['weight'].dropna()), 'active': len(group), 'window_days': rolling_days()}
+        summaries.append(HerdGrowthSummary(herd_id=herd_id, animals=len(gains), summary=summary, computed_at=now))
+    HerdGrowthSummary.objects.bulk_create(summaries, update_conflicts=True, unique_fields=['herd'], update_fields=['animals', 'summary', 'computed_at'])
+
+
+# === WPROWADZANIE WAŻEŃ ===
+def save_measurements(rows, source, user=None):
+    """rows: [(cow_id, data, waga)]. Ważenie z tego samego dnia nadpisuje poprzednie. Zwraca liczbę zapisanych."""
+    latest = {}
+    for cow_id, day, weight in rows: latest[(cow_id, day)] = weight # ostatni wpis z dnia wygrywa, jak przy upsercie
+    objs = [WeightMeasurement(cow_id=cow_id, date=day, weight=weight, source=source, user=user) for (cow_id, day), weight in latest.items()]
+    WeightMeasurement.objects.bulk_create(objs, batch_size=RECOMPUTE_BATCH, update_conflicts=True, unique_fields=['cow', 'date'], update_fields=['weight', 'source', 'user'])
+    recompute({cow_id for cow_id, _ in latest})
+    return len(objs)
+
+def record_current_weights(cow_ids, source='MANUAL', user=None):
+    """WAGA zmieniona na krowie (formularz, synchronizacja offline, import arkusza) staje się dzisiejszym ważeniem."""
+    stale = Cow.objects.filter(pk__in=cow_ids, weight__isnull=False).annotate(
+        measured=Subquery(WeightMeasurement.objects.filter(cow=OuterRef('pk')).order_by('-date').values('weight')[:1])
+    ).filter(Q(measured__isnull=True) | ~Q(measured=F('weight'))).values_list('id', 'weight')
+    today = timezone.localdate()
+    rows = [(cow_id, today, weight) for cow_id, weight in stale]
+    return save_measurements(rows, source, user) if rows else 0
+
+def _int(value):
+    try: return int(value)
+    except (TypeError, ValueError): return None
+
+def resolve_rows(records, errors):
+    """[{cow albo tag, date, weight}] -> [(cow_id, data, waga)]. Numery w dowolnym zapisie (jak skaner), jedno zapytanie
+    o krowy; daty i wagi parsowane wektorowo (daty dzień-pierwszy, przecinek dziesiętny). Brak daty - dzisiejsze ważenie."""
+    today = timezone.localdate()
+    frame = pd.DataFrame({'date': [r.get('date') for r in records], 'weight': [r.get('weight') for r in records]}, dtype=object)
+    weights = pd.to_numeric(frame['weight'].astype(str).str.replace(',', '.', regex=False), errors='coerce').to_numpy()
+    dates = pd.to_datetime(frame['date'], errors='coerce', dayfirst=True, format='mixed')
+    keys = [normalize_tag(r['tag']) if r.get('tag') else None for r in records]
+    by_tag = dict(Cow.objects.filter(tag_normalized__in={k for k in keys if k}).order_by('-id').values_list('tag_normalized', 'id'))
+    known = set(Cow.objects.filter(pk__in={_int(r.get('cow')) for r in records} - {None}).values_list('id', flat=True))
+    rows = []
+    for index, (record, key, day, weight) in enumerate(zip(records, keys, dates, weights), start=1):
+        cow_id = _int(record.get('cow'))
+        cow_id = cow_id if cow_id in known else by_tag.get(key) if record.get('cow') is None else None
+        if cow_id is None: errors.append(f"Wiersz {index}: nie znaleziono krowy {record.get('tag') or record.get('cow')}"); continue
+        day = today if record.get('date') in (None, '') else None if pd.isna(day) else day.date()
+        if day is None: errors.append(f"Wiersz {index}: nieprawidłowa data '{record.get('date')}'"); continue
+        if day > today: errors.append(f"Wiersz {index}: data ważenia w przyszłości"); continue
+        if not 0 < weight <= MAX_WEIGHT: errors.append(f"Wiersz {index}: nieprawidłowa waga '{record.get('weight')}'"); continue
+        rows.append((cow_id, day, float(weight)))
+    return rows
+
+def read_file(file):
+    """CSV z wagi elektronicznej (separator wykrywany) albo arkusz Excela -> rekordy dla resolve_rows."""
+    if file.name.lower().endswith(('.csv', '.txt')):
+        raw = file.read()
+        try: text = raw.decode('utf-8-sig')
+        except UnicodeDecodeError: text = raw.decode('cp1250') # eksport z programów wag pod Windows
+        df = pd.read_csv(io.StringIO(text), sep=None, engine='python', dtype=str)
+    else: df = pd.read_excel(file, dtype={0: str})
+    df.columns = [str(col).strip().upper() for col in df.columns]
+    df = df.rename(columns=FILE_COLUMNS)
+    if 'tag' not in df or 'weight' not in df: return None
+    if 'date' not in df: df['date'] = None
+    df = df[['tag', 'date', 'weight']].astype(object).where(df[['tag', 'date', 'weight']].notna(), None)
+    return [{'tag': row['tag'], 'date': row['date'], 'weight': row['weight']} for row in df.to_dict('records')]
+
+
+# === ODCZYT (bez przeliczania) ===
+def cow_growth(cow):
+    summary = HerdGrowthSummary.objects.filter(herd_id=cow.herd_id).values_list('summary', flat=True).first() if cow.herd_id else None
+    measurements = list(cow.weights.values('date', 'weight', 'daily_gain', 'rolling_gain', 'source'))
+    return {
+        'cow': cow.pk, 'tag_id': cow.tag_id, 'weight': cow.weight, 'weight_date': cow.weight_date,
+        'daily_weight_gain': cow.daily_weight_gain, 'window_days': rolling_days(),
+        'herd_percentile': percentile_rank(cow.daily_weight_gain, (summary or {}).get('daily_gain')),
+        'measurements': measurements,
+    }
+
+def herd_growth_summary(herd):
+    """Zapisane podsumowanie; stado bez niego (jeszcze nikt go nie ważył) liczone raz i zapisywane."""
+    row = HerdGrowthSummary.objects.filter(herd=herd).first()
+    if row is None: summarize_herds([herd.pk]); row = HerdGrowthSummary.objects.get(herd=herd)
+    return {'herd': herd.pk, 'name': herd.name, 'animals': row.animals, 'computed_at': row.computed_at, **row.summary}
@@ -0,0 +1,224 @@
+# cows/importer.py
+
+import logging
+import time
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from .models import Cow, Herd
+from .signals import bulk_changed
+from . import growth
+
+logger = logging.getLogger(__name__)
+
+# === PEŁNA MAPA KOLUMN (nagłówek w arkuszu -> pole modelu) ===
+COLUMN_MAP = {
+    'NR ARIMR': 'tag_id', 'NAZWA': 'name', 'DATA UR': 'birth_date',
+    'PŁEĆ': 'gender', 'RASA': 'breed', 'MAŚĆ': 'color',
+    'NR PASZPORTU': 'passport_number', 'STATUS': 'status',
+    'NR MATKI': 'dam_tag', 'NR OJCA': 'sire_tag',
+    'DATA SPRZEDAŻY/PADNIĘCIA': 'exit_date', 'NABYWCA/PRZYCZYNA': 'exit_reason',
+    'KWOTA': 'sale_price', 'DOSTAWA MIĘSA': 'meat_delivery_date', 'UWAGI': 'notes',
+    'WAGA': 'weight', 'PRZYROST/DZIEŃ': 'daily_weight_gain',
+    'DŁUGOŚĆ ISTNIEJĄCEJ CIĄŻY': 'pregnancy_duration',
+    'MOŻLIWOŚĆ BYCIA CIELNĄ WG ZESTAWIENIA': 'is_pregnancy_possible',
+    'RELOKACJA': 'relocation_status',
+    'DUPLIKATY DO ZALOZENIA': 'duplicates_to_make',
+    'ZAMOWIC KOLCZYKI DUPLIKATY': 'duplicates_to_order',
+    'RELKOACJA PO PRXEPEDZIE': 'relocation_after_drive',
+    'NUMER DZIALALNOSCI': 'business_number'
+}
+
+# Pełna nazwa stada (eksport ją zapisuje) - ma pierwszeństwo przed nazwą arkusza, która jest skracana do 31 znaków i bez spacji
+HERD_COLUMN = 'STADO'
+
+STRING_FIELDS = [
+    'tag_id', 'name', 'breed', 'color', 'passport_number', 'business_number', 'exit_reason', 'notes',
+    'pregnancy_duration', 'is_pregnancy_possible', 'relocation_status', 'duplicates_to_make',
+    'duplicates_to_order', 'relocation_after_drive', 'dam_tag', 'sire_tag',
+]
+DATE_FIELDS = ['birth_date', 'exit_date', 'meat_delivery_date']
+FLOAT_FIELDS = ['sale_price', 'weight', 'daily_weight_gain']
+# Pola zapisywane w modelu Cow (puste komórki nie nadpisują istniejących wartości)
+COW_FIELDS = ['herd', 'name', 'gender', 'status'] + [f for f in STRING_FIELDS + DATE_FIELDS + FLOAT_FIELDS if f not in ('tag_id', 'name', 'dam_tag', 'sire_tag')]
+
+IMPORT_BATCH_SIZE = 500
+
+
+# === CZYSZCZENIE KOLUMN (operacje wektorowe) ===
+def clean_strings(series):
+    present = series.notna()
+    cleaned = series.where(~present, series.astype(str).str.strip())
+    return cleaned.where(present & (cleaned != ''), None)
+
+def clean_dates(series):
+    if not pd.api.types.is_datetime64_any_dtype(series):
+        series = pd.to_datetime(series, errors='coerce', format='mixed')
+    return pd.Series(np.where(series.notna(), series.dt.date, None), index=series.index, dtype=object)
+
+def clean_floats(series):
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series.astype(str).str.replace(',', '.', regex=False), errors='coerce')
+    return series.astype(float)
+
+
+def read_sheet(xls, sheet_name, herd_name, errors):
+    """Czyta arkusz i zwraca DataFrame z oczyszczonymi kolumnami (jeden wiersz = jedna krowa)."""
+    df = pd.read_excel(xls, sheet_name=sheet_name)
+    df.columns = [str(col).strip().upper() for col in df.columns]
+    df = df.rename(columns=COLUMN_MAP)
+    rows = pd.DataFrame(index=df.index)
+    empty = pd.Series(None, index=df.index, dtype=object)
+    for field in STRING_FIELDS: rows[field] = clean_strings(df[field]) if field in df else empty
+    for field in DATE_FIELDS: rows[field] = clean_dates(df[field]) if field in df else empty
+    for field in FLOAT_FIELDS: rows[field] = clean_floats(df[field]) if field in df else np.nan
+
+    # Arkusz bez kolumny PŁEĆ/STATUS: jak dotąd ustawia samca i status aktywny (pusta komórka tak samo).
+    # IMPORT_KEEP_MISSING_COLUMNS=True - brak kolumny nie zmienia tych pól istniejących krów (arkusze cząstkowe)
+    keep_missing = getattr(settings, 'IMPORT_KEEP_MISSING_COLUMNS', False)
+    if 'gender' in df:
+        rows['gender'] = np.where(clean_strings(df['gender']).fillna('').str.contains('SAMICA|JAŁÓWKA'), 'F', 'M')
+    else: rows['gender'] = empty if keep_missing else 'M'
+    if 'status' in df:
+        status_raw = clean_strings(df['status']).fillna('')
+        # Etykiety eksportu (cows/exporter.py STATUS_LABELS) wracają jako ten sam status; nieznane - jako aktywne
+        rows['status'] = np.select(
+            [status_raw.str.contains('SPRZEDAN'), status_raw.str.contains('PADŁ|ZARCHIWIZOWAN'), status_raw.str.contains('INNY'), status_raw.str.contains('AKTYWN')],
+            ['SOLD', 'ARCHIVED', 'OTHER', 'ACTIVE'], default='ACTIVE'
+        )
+    else: rows['status'] = empty if keep_missing else 'ACTIVE'
+    # Puste STADO w pliku z tą kolumną = krowa bez stada (stado istniejącej krowy się nie zmienia)
+    rows['herd_name'] = clean_strings(df[HERD_COLUMN]) if HERD_COLUMN in df else herd_name
+
+    missing = rows['tag_id'].isna()
+    for index in rows.index[missing]:
+        errors.append(f"Arkus_ {sheet_name}, Wiersz {index + 2}: Brak 'NR ARIMR'")
+    rows = rows[~missing].copy()
+    rows['sheet'] = sheet_name; rows['row'] = rows.index + 2
+    return rows
+
+
+def read_workbook(file, errors):
+    xls = pd.ExcelFile(file); frames = []
+    for sheet_name in xls.sheet_names:
+        herd_name = sheet_name.split(' ')[0].strip().upper()
+        if not herd_name:
+            errors.append(f"Arkus_ {sheet_name} ma nieprawidłową nazwę.")
+            continue
+        frames.append(read_sheet(xls, sheet_name, herd_name, errors))
+    if not frames: return pd.DataFrame(columns=STRING_FIELDS + DATE_FIELDS + FLOAT_FIELDS + ['gender', 'status', 'herd_name', 'sheet', 'row'])
+    rows = pd.concat(frames, ignore_index=True)
+    # Ten sam numer w kilku wierszach/arkuszach: późniejsze niepuste wartości nadpisują wcześniejsze
+    rows = rows.groupby('tag_id', sort=False, as_index=False).last()
+    return rows.astype(object).where(rows.notna(), None)
+
+
+# === ZAPIS ===
+def _save_rows(cows, bulk, single, errors, labels):
+    """Zapis zbiorczy w savepoincie; gdy się nie uda - wiersz po wierszu, z błędem przypisanym do wiersza."""
+    if not cows: return 0
+    try:
+        with transaction.atomic(): bulk(cows)
+        return len(cows)
+    except DatabaseError as e:
+        logger.warning(f"Import: zapis zbiorczy nie powiódł się ({str(e)}), zapisuję wiersze pojedynczo")
+    saved = 0
+    for cow in cows:
+        try:
+            with transaction.atomic(): single(cow)
+            saved += 1
+        except Exception as e:
+            errors.append(f"{labels[id(cow)]} (Tag: {cow.tag_id}): Błąd zapisu - {str(e)}")
+    return saved
+
+
+def get_herds(rows):
+    """Stada po nazwie; istniejące dopasowane bez względu na wielkość liter (arkusz "POŁUDNIE" -> stado "Południe")."""
+    existing = {}
+    for herd in Herd.objects.order_by('pk'): existing.setdefault(herd.name.upper(), herd)
+    herds = {}
+    for herd_name in rows['herd_name'].dropna().unique():
+        herd = existing.get(herd_name.upper())
+        if herd is None: herd = existing[herd_name.upper()] = Herd.objects.create(name=herd_name)
+        herds[herd_name] = herd
+    return herds
+
+
+def write_cows(rows, herds, errors, previous_herds=None):
+    """Wstawia nowe i aktualizuje istniejące krowy. Zwraca (utworzone, zaktualizowane, {tag: krowa}).
+    previous_herds - zbiór uzupełniany stadami aktualizowanych krów sprzed zmiany (podsumowania stad)."""
+    existing = Cow.objects.in_bulk(list(rows['tag_id']), field_name='tag_id')
+    if previous_herds is not None: previous_herds.update(cow.herd_id for cow in existing.values() if cow.herd_id)
+    new_cows = []; changed = []; labels = {}; by_tag = {}
+    for record in rows.to_dict('records'):
+        tag_id = record['tag_id']; record['herd'] = herds.get(record['herd_name'])
+        cow = existing.get(tag_id)
+        if cow is None: cow = Cow(tag_id=tag_id, name=f"Krowa {tag_id}", gender='M'); new_cows.append(cow)
+        else: changed.append(cow)
+        for field in COW_FIELDS:
+            if record[field] is not None: setattr(cow, field, record[field])
+        labels[id(cow)] = f"Arkus_ {record['sheet']}, Wiersz {record['row']}"; by_tag[tag_id] = cow
+    now = timezone.now()
+    for cow in changed: cow.updated_at = now
+    update_fields = COW_FIELDS + ['updated_at']
+    def insert_one(cow):
+        cow.pk = None; cow._state.adding = True # pk mógł zostać nadany przez wycofany bulk_create
+        cow.save(force_insert=True)
+    created = _save_rows(new_cows, lambda objs: Cow.objects.bulk_create(objs, batch_size=IMPORT_BATCH_SIZE), insert_one, errors, labels)
+    updated = _save_rows(changed, lambda objs: Cow.objects.bulk_update(objs, update_fields, batch_size=IMPORT_BATCH_SIZE), lambda cow: cow.save(update_fields=update_fields), errors, labels)
+    return created, updated, {tag: cow for tag, cow in by_tag.items() if cow.pk is not None}
+
+
+def link_parents(rows, cows_by_tag):
+    """Łączy matki i ojców po numerach ARiMR - jedno zapytanie o brakujące numery i jeden bulk_update."""
+    parent_tags = (set(rows['dam_tag'].dropna()) | set(rows['sire_tag'].dropna())) - {None}
+    parents = {tag: cow.pk for tag, cow in cows_by_tag.items() if tag in parent_tags}
+    missing = parent_tags - parents.keys()
+    if missing: parents.update(Cow.objects.filter(tag_id__in=missing).values_list('tag_id', 'id'))
+    linked = []; now = timezone.now()
+    for tag_id, dam_tag, sire_tag in zip(rows['tag_id'], rows['dam_tag'], rows['sire_tag']):
+        cow = cows_by_tag.get(tag_id)
+        if cow is None: continue
+        dam_id = parents.get(dam_tag) if dam_tag != tag_id else None
+        sire_id = parents.get(sire_tag) if sire_tag != tag_id else None
+        if dam_id: cow.dam_id = dam_id
+        if sire_id: cow.sire_id = sire_id
+        # updated_at: import w tle zatwierdza porcje krów wcześniej - urządzenie, które pobrało je bez rodziców,
+        # musi dostać krowę jeszcze raz w kanale zmian
+        if dam_id or sire_id: cow.updated_at = now; linked.append(cow)
+    if linked: Cow.objects.bulk_update(linked, ['dam', 'sire', 'updated_at'], batch_size=IMPORT_BATCH_SIZE)
+    return len(linked)
+
+
+def import_workbook(file, progress=None, atomic=True, chunk_size=IMPORT_BATCH_SIZE):
+    """Importuje skoroszyt ARiMR (arkusz = stado). Zwraca podsumowanie z czasami etapów (ms).
+    Krowy zapisywane są porcjami po `chunk_size` wierszy; po każdej porcji wołane jest
+    progress(processed, total, created, updated, errors). Przy atomic=False każda porcja
+    to osobna transakcja (import w tle nie blokuje bazy na cały czas trwania)."""
+    errors = []; timings = {}; started = stage = time.perf_counter()
+    def lap(name):
+        nonlocal stage
+        now = time.perf_counter(); timings[name] = round((now - stage) * 1000, 1); stage = now
+    rows = read_workbook(file, errors); lap('read_and_clean')
+    total = len(rows); created = updated = 0; cows_by_tag = {}; previous_herds = set()
+    if progress: progress(0, total, 0, 0, errors)
+    with transaction.atomic() if atomic else nullcontext():
+        with transaction.atomic(): herds = get_herds(rows)
+        for offset in range(0, total, chunk_size):
+            with transaction.atomic():
+                chunk_created, chunk_updated, chunk_cows = write_cows(rows.iloc[offset:offset + chunk_size], herds, errors, previous_herds)
+            created += chunk_created; updated += chunk_updated; cows_by_tag.update(chunk_cows)
+            if progress: progress(min(offset + chunk_size, total), total, created, updated, errors)
+        lap('write')
+        logger.info("Import: Rozpoczynam łączenie rodziców...")
+        with transaction.atomic(): linked = link_parents(rows, cows_by_tag)
+        lap('link_parents')
+        # WAGA z arkusza jako ważenie z dnia importu (przed bulk_changed, żeby zapisało się ze źródłem IMPORT)
+        growth.record_current_weights([cow.pk for cow in cows_by_tag.values() if cow.weight is not None], source='IMPORT'); lap('weights')
+        bulk_changed.send(sender=Cow, ids=sorted(cow.pk for cow in cows_by_tag.values()), herd_ids=previous_herds)
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Import: {created} nowych, {updated} zaktualizowanych, czasy {timings}")
+    return {"status": "ok", "created": created, "updated": updated, "linked": linked, "errors": errors, "timings": timings}
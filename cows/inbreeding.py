@@ -0,0 +1,166 @@
+# cows/inbreeding.py
+
+import heapq
+import logging
+import threading
+import time
+from array import array
+from django.core.cache import cache
+from django.db import transaction
+from .models import Cow
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'cows:pedigree:generation'
+# Próg ostrzeżenia przy kojarzeniu: 6,25% to potomstwo kuzynów pierwszego stopnia
+DEFAULT_INBREEDING_WARNING = 0.0625
+
+
+def topological_order(parents):
+    """Kolejność krów "rodzice przed potomstwem" (DFS bez rekurencji). Zwraca (kolejność, krowy z pętlą w rodowodzie)."""
+    order = []; state = {}; looped = set() # state: 1 - w trakcie, 2 - gotowe
+    def known(cow_id): return iter([p for p in parents[cow_id] if p in parents])
+    for root in parents:
+        if root in state: continue
+        state[root] = 1; stack = [(root, known(root))]
+        while stack:
+            node, pending = stack[-1]
+            for parent in pending:
+                if parent not in state: state[parent] = 1; stack.append((parent, known(parent))); break
+                if state[parent] == 1: looped.add(node) # krowa jest własnym przodkiem (zły import)
+            else:
+                stack.pop(); state[node] = 2; order.append(node)
+    return order, looped
+
+
+class PedigreeGraph:
+    """Rodowód całego pogłowia w zwartych tablicach: krowa = indeks 1..n (rodzice mają mniejsze indeksy),
+    0 = nieznany rodzic. Współczynniki inbredu liczone metodą Meuwissena i Luo (1992)."""
+
+    def __init__(self, rows):
+        parents = {cow_id: (dam_id, sire_id) for cow_id, dam_id, sire_id in rows}
+        order, self.looped = topological_order(parents)
+        self.ids = [None] + order; self.index = {cow_id: i for i, cow_id in enumerate(self.ids) if i}
+        self.dam = array('i', [0]); self.sire = array('i', [0]); self.children = {}
+        self.F = array('d', [-1.0]); self.D = array('d', [0.0]) # F[0] = -1, więc nieznany rodzic nie wnosi pokrewieństwa
+        self.generation = None; self._kinship = {}
+        for i, cow_id in enumerate(order, start=1):
+            dam_id, sire_id = parents[cow_id]
+            self.dam.append(self._parent_index(dam_id, i)); self.sire.append(self._parent_index(sire_id, i))
+            self.F.append(0.0); self.D.append(0.0); self._link(i)
+            self._compute(i)
+
+    @classmethod
+    def load(cls):
+        return cls(Cow.objects.values_list('id', 'dam_id', 'sire_id').order_by('id').iterator(chunk_size=5000))
+
+    def _parent_index(self, parent_id, child):
+        index = self.index.get(parent_id, 0)
+        return index if index < child else 0 # rodzic "młodszy" od dziecka = krawędź pętli, pomijamy
+
+    def _link(self, i):
+        for parent in {self.dam[i], self.sire[i]} - {0}: self.children.setdefault(parent, set()).add(i)
+
+    def _unlink(self, i):
+        for parent in {self.dam[i], self.sire[i]} - {0}: self.children.get(parent, set()).discard(i)
+
+    # === ALGORYTM MEUWISSENA-LUO ===
+    def _offspring_inbreeding(self, sire, dam):
+        """F potomka pary = współczynnik pokrewieństwa (coancestry) rodziców. Przechodzi tylko po ich przodkach,
+        od najmłodszego, rozdzielając L (udział genów) na rodziców: F = D_potomka + suma L_j^2 * D_j - 1."""
+        if not sire or not dam: return 0.0
+        key = (sire, dam) if sire < dam else (dam, sire)
+        if key in self._kinship: return self._kinship[key]
+        dam_array, sire_array, D = self.dam, self.sire, self.D
+        contributions = {}; heap = []
+        for parent in (sire, dam):
+            if parent not in contributions: heapq.heappush(heap, -parent)
+            contributions[parent] = contributions.get(parent, 0.0) + 0.5
+        total = 0.5 - 0.25 * (self.F[sire] + self.F[dam])
+        while heap:
+            j = -heapq.heappop(heap); share = contributions.pop(j)
+            total += share * share * D[j]
+            for parent in (sire_array[j], dam_array[j]):
+                if not parent: continue
+                if parent not in contributions: heapq.heappush(heap, -parent); contributions[parent] = 0.0
+                contributions[parent] += 0.5 * share
+        self._kinship[key] = total - 1.0
+        return total - 1.0
+
+    def _compute(self, i):
+        sire, dam = self.sire[i], self.dam[i]
+        self.F[i] = self._offspring_inbreeding(sire, dam)
+        self.D[i] = 0.5 - 0.25 * (self.F[sire] + self.F[dam]) # wariancja segregacji Mendla
+
+    # === API ===
+    def inbreeding(self, cow_id):
+        i = self.index.get(cow_id)
+        return None if i is None else self.F[i]
+
+    def kinship(self, dam_id, sire_id):
+        """Oczekiwany inbred potomka pary (None, jeśli którejś krowy nie ma w rodowodzie)."""
+        dam, sire = self.index.get(dam_id), self.index.get(sire_id)
+        if dam is None or sire is None: return None
+        return self._offspring_inbreeding(sire, dam)
+
+    def update(self, cow_id, dam_id, sire_id):
+        """Przyrostowa zmiana rodziców jednej krowy (albo nowa krowa). Przelicza ją i jej potomków.
+        Zwraca False, gdy zmiana łamie kolejność rodzic-przed-dzieckiem - wtedy graf trzeba zbudować od nowa."""
+        i = self.index.get(cow_id); new = i is None
+        if cow_id in self.looped or any(p is not None and p not in self.index for p in (dam_id, sire_id)): return False
+        dam, sire = self.index.get(dam_id, 0), self.index.get(sire_id, 0)
+        if new:
+            i = len(self.ids); self.ids.append(cow_id); self.index[cow_id] = i
+            self.dam.append(0); self.sire.append(0); self.F.append(0.0); self.D.append(0.0)
+        elif dam >= i or sire >= i: return False
+        elif (self.dam[i], self.sire[i]) == (dam, sire): return True
+        self._unlink(i); self.dam[i], self.sire[i] = dam, sire; self._link(i)
+        # Pokrewieństwa par zapamiętane wcześniej mogą dotyczyć potomków tej krowy
+        self._kinship.clear()
+        affected = {i}; pending = [i]
+        while pending:
+            for child in self.children.get(pending.pop(), ()):
+                if child not in affected: affected.add(child); pending.append(child)
+        for j in sorted(affected): self._compute(j)
+        return True
+
+
+# === GRAF WSPÓŁDZIELONY W PROCESIE ===
+# Każdy proces trzyma własny graf; numer generacji w cache mówi, czy inny proces zmienił rodowód.
+_graph = None
+_lock = threading.RLock()
+
+def _new_generation():
+    # Po wyczyszczeniu cache numer startuje od czasu, a nie od 1 - stary graf w innym procesie nie uzna się za aktualny
+    return time.time_ns() // 1000
+
+def _incr_generation():
+    try: return cache.incr(GENERATION_KEY)
+    except ValueError: generation = _new_generation(); cache.set(GENERATION_KEY, generation, None); return generation
+
+def get_graph():
+    global _graph
+    generation = cache.get_or_set(GENERATION_KEY, _new_generation, None)
+    with _lock:
+        if _graph is None or _graph.generation != generation:
+            _graph = PedigreeGraph.load(); _graph.generation = generation
+            logger.info(f"Rodowód: zbudowano graf ({len(_graph.ids) - 1} krów, generacja {generation})")
+        return _graph
+
+def parents_changed(cow_id, dam_id, sire_id, created=False):
+    """Wołane po zapisie krowy. Jeśli rodzice się nie zmienili - nic; inaczej po zatwierdzeniu transakcji
+    podbija generację i (gdy graf w tym procesie jest aktualny) aktualizuje go przyrostowo."""
+    graph = _graph
+    if not created and graph is not None:
+        i = graph.index.get(cow_id)
+        if i is not None and (graph.ids[graph.dam[i]], graph.ids[graph.sire[i]]) == (dam_id, sire_id): return
+    def apply():
+        generation = _incr_generation()
+        with _lock:
+            if _graph is not None and _graph.generation == generation - 1 and _graph.update(cow_id, dam_id, sire_id):
+                _graph.generation = generation
+    transaction.on_commit(apply)
+
+def invalidate_pedigree():
+    """Usunięcia i zapisy zbiorcze: graf zostanie zbudowany od nowa przy następnym użyciu."""
+    transaction.on_commit(_incr_generation)
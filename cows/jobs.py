@@ -0,0 +1,139 @@
+# cows/jobs.py
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .importer import IMPORT_BATCH_SIZE, import_workbook
+from .models import Cow, ImportJob
+from .signals import bulk_changed
+from . import recurrence, thumbnails
+
+logger = logging.getLogger(__name__)
+
+# === LOKALNE PULE WĄTKÓW (bez zewnętrznego brokera) ===
+# Importy: domyślnie jeden wątek - SQLite i tak ma jednego pisarza, a importy nie konkurują ze sobą.
+# Miniatury zdjęć: osobna pula, żeby długi import nie wstrzymywał zdjęć z obory (Pillow zwalnia GIL przy skalowaniu).
+# Harmonogram: przesuwanie horyzontu zadań cyklicznych raz dziennie, gdy nikt nie ustawił crona.
+POOLS = {'import': ('IMPORT_WORKERS', 1), 'thumbnails': ('THUMBNAIL_WORKERS', 2), 'scheduler': ('SCHEDULER_WORKERS', 1)}
+_executors = {}
+_executor_lock = threading.Lock()
+
+def get_executor(pool='import'):
+    with _executor_lock:
+        if pool not in _executors:
+            setting, default = POOLS[pool]
+            _executors[pool] = ThreadPoolExecutor(max_workers=getattr(settings, setting, default), thread_name_prefix=f'cows-{pool}')
+        return _executors[pool]
+
+
+def enqueue_import(job):
+    """Przekazuje zadanie do puli po zatwierdzeniu transakcji, w której powstał rekord ImportJob."""
+    transaction.on_commit(lambda: get_executor().submit(run_import_job, job.pk))
+
+
+# Pula żyje w procesie - restart albo wdrożenie gubi zadania z kolejki i przerywa trwające
+DEFAULT_IMPORT_STALE_AFTER = timedelta(minutes=15)
+
+def recover_stale_imports():
+    """Wołane przy odpytywaniu o postęp: PENDING bez znaku życia wraca do puli (przejęcie zadania jest atomowe,
+    więc podwójne zgłoszenie nic nie psuje), a RUNNING bez znaku życia kończy się jako FAILED."""
+    stale_after = getattr(settings, 'IMPORT_STALE_AFTER', DEFAULT_IMPORT_STALE_AFTER)
+    if not isinstance(stale_after, timedelta): stale_after = timedelta(seconds=stale_after)
+    now = timezone.now(); cutoff = now - stale_after
+    last_sign = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, created_at__lt=cutoff)
+    for job in ImportJob.objects.filter(last_sign, status='RUNNING'):
+        if ImportJob.objects.filter(pk=job.pk, status='RUNNING').filter(last_sign).update(
+            status='FAILED', finished_at=now, message='Import przerwany (restart serwera) - wyślij plik ponownie'
+        ): delete_import_file(job)
+    for job_id in ImportJob.objects.filter(last_sign, status='PENDING').values_list('pk', flat=True):
+        ImportJob.objects.filter(pk=job_id).update(heartbeat_at=now)
+        get_executor().submit(run_import_job, job_id)
+
+def delete_import_file(job):
+    """Plik jest potrzebny tylko do końca importu."""
+    if job.file: job.file.delete(save=False)
+    ImportJob.objects.filter(pk=job.pk).update(file='')
+
+
+def run_import_job(job_id):
+    close_old_connections()
+    try:
+        # Przejęcie tylko oczekującego zadania - ponownie zgłoszone (recover_stale_imports) nie uruchomi się dwa razy
+        now = timezone.now()
+        if not ImportJob.objects.filter(pk=job_id, status='PENDING').update(status='RUNNING', started_at=now, heartbeat_at=now): return
+        job = ImportJob.objects.get(pk=job_id)
+        def progress(processed, total, created, updated, errors):
+            ImportJob.objects.filter(pk=job_id).update(
+                processed_rows=processed, total_rows=total, created_count=created, updated_count=updated, errors=list(errors),
+                heartbeat_at=timezone.now()
+            )
+        try:
+            with job.file.open('rb') as file:
+                summary = import_workbook(file, progress=progress, atomic=False, chunk_size=getattr(settings, 'IMPORT_CHUNK_SIZE', IMPORT_BATCH_SIZE))
+            ImportJob.objects.filter(pk=job_id).update(
+                status='DONE', finished_at=timezone.now(), created_count=summary['created'], updated_count=summary['updated'],
+                errors=summary['errors'], timings=summary['timings']
+            )
+        except Exception as e:
+            logger.exception(f"Krytyczny błąd importu w tle (#{job_id}): {str(e)}")
+            ImportJob.objects.filter(pk=job_id).update(status='FAILED', finished_at=timezone.now(), message=str(e))
+        delete_import_file(job)
+    except Exception as e:
+        logger.exception(f"Błąd obsługi zadania importu #{job_id}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+# === MINIATURY ZDJĘĆ ===
+def enqueue_thumbnails(cow):
+    """Po zatwierdzeniu zapisu zdjęcia: miniatury i oczyszczony oryginał w tle (odpowiedź nie czeka na Pillow)."""
+    cow_id, name = cow.pk, cow.photo.name
+    transaction.on_commit(lambda: get_executor('thumbnails').submit(run_thumbnails, cow_id, name))
+
+
+def run_thumbnails(cow_id, name):
+    """Obrabia zdjęcie `name` krowy. Jeśli w międzyczasie wgrano inne, wynik jest odrzucany."""
+    close_old_connections()
+    try:
+        storage = Cow._meta.get_field('photo').storage
+        with storage.open(name, 'rb') as file: original, thumbs = thumbnails.render(file)
+        photo_name, paths = thumbnails.save_photo(name, original, thumbs, storage)
+        previous = Cow.objects.filter(pk=cow_id, photo=name).values_list('photo_thumbs', flat=True).first()
+        updated = Cow.objects.filter(pk=cow_id, photo=name).update(photo=photo_name, photo_thumbs=paths, updated_at=timezone.now())
+        if not updated: # zdjęcie zmienione albo usunięte w trakcie obróbki
+            storage.delete(photo_name); thumbnails.delete_thumbnails(paths, storage); return
+        if photo_name != name: storage.delete(name)
+        thumbnails.delete_thumbnails(previous, storage)
+        bulk_changed.send(sender=Cow, ids=[cow_id], fields=['photo', 'photo_thumbs']) # karty skanera; rodowód, stada i indeks bez zmian
+    except Exception as e:
+        logger.exception(f"Błąd obróbki zdjęcia krowy #{cow_id} ({name}): {str(e)}")
+    finally:
+        close_old_connections()
+
+
+# === ZADANIA CYKLICZNE (lokalny harmonogram) ===
+SCHEDULER_CACHE_KEY = 'cows:recurrence:last_run'
+
+def schedule_occurrences():
+    """Raz dziennie (pierwsze otwarcie listy zadań lub kalendarza) przesuwa w tle horyzont wystąpień zadań cyklicznych.
+    Z cronem (manage.py generate_task_occurrences) to tylko zabezpieczenie - generowanie jest idempotentne."""
+    today = date.today().isoformat()
+    if not cache.add(f'{SCHEDULER_CACHE_KEY}:{today}', True, 24 * 3600): return
+    transaction.on_commit(lambda: get_executor('scheduler').submit(run_scheduler))
+
+
+def run_scheduler():
+    close_old_connections()
+    try:
+        created = recurrence.generate()
+        if created: logger.info(f"Utworzono {created} wystąpień zadań cyklicznych")
+    except Exception as e:
+        logger.exception(f"Błąd generowania zadań cyklicznych: {str(e)}")
+    finally:
+        close_old_connections()
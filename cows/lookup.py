@@ -0,0 +1,118 @@
+# cows/lookup.py
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .media import resign
+from .models import Cow, normalize_tag
+from .serializers import CowSerializer
+
+# Karty krów dla skanera (/api/cows/search/?tag_id= i POST /api/cows/lookup/), kluczem jest znormalizowany numer.
+# Poziom 1: LRU w pamięci procesu; poziom 2 (opcjonalnie, TAG_LOOKUP_SHARED_CACHE): cache Django współdzielony
+# między procesami. Klucz zawiera numer generacji (podbijany po każdej zmianie krów/stad) i dzisiejszą datę (wiek),
+# więc nieaktualne karty po prostu przestają być używane, a LRU wypycha je z pamięci.
+GENERATION_KEY = 'cows:tag-lookup:generation'
+SHARED_CACHE_PREFIX = 'cows:tag-lookup'
+DEFAULT_TAG_LOOKUP_CACHE_SIZE = 2048
+DEFAULT_TAG_LOOKUP_TTL = 3600
+MAX_LOOKUP_TAGS = 500
+
+
+class LRUCache:
+    """Słownik z limitem rozmiaru - przy przepełnieniu wypada najdawniej używany wpis. Bezpieczny dla wątków."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize; self._data = OrderedDict(); self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None: self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value; self._data.move_to_end(key)
+            while len(self._data) > self.maxsize: self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local = LRUCache(getattr(settings, 'TAG_LOOKUP_CACHE_SIZE', DEFAULT_TAG_LOOKUP_CACHE_SIZE))
+
+
+# === GENERACJA ===
+def _generation():
+    # Start od czasu, a nie od 1 - po wyczyszczeniu cache stare karty z LRU innego procesu nie trafią
+    return cache.get_or_set(GENERATION_KEY, lambda: time.time_ns() // 1000, None)
+
+def _incr_generation():
+    try: cache.incr(GENERATION_KEY)
+    except ValueError: cache.set(GENERATION_KEY, time.time_ns() // 1000, None)
+    _local.clear()
+
+def invalidate_tag_lookup():
+    """Po zatwierdzeniu transakcji unieważnia wszystkie karty (także matki/ojca/stada wyświetlane na kartach dzieci)."""
+    transaction.on_commit(_incr_generation)
+
+
+# === WYSZUKIWANIE ===
+def card_queryset():
+    return Cow.objects.select_related('dam', 'sire', 'herd').with_age()
+
+def _card(cow):
+    # Bez requestu zdjęcie i miniatury mają ścieżki względne - adres bezwzględny dokleja _with_request przy każdej odpowiedzi
+    return dict(CowSerializer(cow).data)
+
+def _with_request(card, request):
+    # Karty są wspólne dla wszystkich - adresy zdjęć podpisywane są na nowo dla użytkownika żądania (cows/media.py)
+    if card is None or not card.get('photo') or request is None: return card
+    absolute = {name: request.build_absolute_uri(resign(card[name])) for name in ('photo', 'photo_thumb') if card.get(name)}
+    if card.get('photo_srcset'):
+        absolute['photo_srcset'] = ', '.join(f'{request.build_absolute_uri(resign(url))} {width}' for url, width in (item.rsplit(' ', 1) for item in card['photo_srcset'].split(', ')))
+    return {**card, **absolute}
+
+def _fetch(keys):
+    """Jedno zapytanie dla wszystkich brakujących numerów. Przy kilku krowach o tym samym numerze po normalizacji
+    (np. "PL005..." i "005..." wpisane jako osobne krowy) wygrywa zarejestrowana wcześniej."""
+    cards = {}
+    for cow in card_queryset().filter(tag_normalized__in=keys).order_by('-id'): cards[cow.tag_normalized] = _card(cow)
+    return cards
+
+def lookup_tags(tags, request=None):
+    """Zwraca ({numer z zapytania: karta albo None}, liczba kart z cache). Numery w dowolnym formacie
+    (spacje, myślniki, prefiks PL, odczyt EID z kodem 616)."""
+    prefix = f'{_generation()}:{date.today().isoformat()}'
+    keys = {tag: normalize_tag(tag) for tag in tags}
+    found = {}; missing = []
+    for key in dict.fromkeys(key for key in keys.values() if key):
+        card = _local.get(f'{prefix}:{key}')
+        if card is None: missing.append(key)
+        else: found[key] = card
+    hits = len(found)
+    shared = getattr(settings, 'TAG_LOOKUP_SHARED_CACHE', False)
+    if missing and shared:
+        cached = cache.get_many([f'{SHARED_CACHE_PREFIX}:{prefix}:{key}' for key in missing])
+        for key in missing:
+            card = cached.get(f'{SHARED_CACHE_PREFIX}:{prefix}:{key}')
+            if card is not None: found[key] = card; _local.set(f'{prefix}:{key}', card)
+        hits = len(found); missing = [key for key in missing if key not in found]
+    if missing:
+        fetched = _fetch(missing)
+        for key, card in fetched.items(): found[key] = card; _local.set(f'{prefix}:{key}', card)
+        if fetched and shared:
+            cache.set_many({f'{SHARED_CACHE_PREFIX}:{prefix}:{key}': card for key, card in fetched.items()},
+                           getattr(settings, 'TAG_LOOKUP_TTL', DEFAULT_TAG_LOOKUP_TTL))
+    return {tag: _with_request(found.get(key), request) for tag, key in keys.items()}, hits
+
+def lookup_tag(tag, request=None):
+    """Jedna karta: (karta albo None, czy z cache)."""
+    results, hits = lookup_tags([tag], request)
+    return results[tag], bool(hits)
@@ -0,0 +1,98 @@
+# cows/management/commands/explain_queries.py
+
+import re
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from cows.models import Cow, Task, SyncTombstone
+from cows.lookup import card_queryset
+from cows.search import search_sql
+from cows.stats import UPCOMING_DAYS
+from cows.views import CowViewSet, EventViewSet, TaskViewSet
+
+# SQLite: "SCAN tabela" to przejście po wszystkich wierszach (także "USING INDEX" - tylko w kolejności indeksu),
+# wyszukiwanie po indeksie to "SEARCH". PostgreSQL: "Seq Scan on tabela".
+SQLITE_SCAN = re.compile(r'\bSCAN (\w+)\b(?! VIRTUAL TABLE)') # FTS5 sam wybiera indeks
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+# Zapytania, w których pełny skan jest oczekiwany (cała tabela trafia do odpowiedzi)
+EXPECTED_SCANS = {'cows: lista (bez filtrów)', 'sync: pełny zrzut krów'}
+
+
+def endpoint_queryset(viewset_class, action, params=None, slice_to=None, **lookups):
+    """Queryset dokładnie taki, jaki zbuduje endpoint (get_queryset + filtry z parametrów).
+    Filtry po kluczach obcych idą w `lookups` - filterset odrzuciłby id, którego nie ma w bazie."""
+    view = viewset_class(action_map={'get': action}); view.format_kwarg = None; view.args = (); view.kwargs = {}
+    view.request = view.initialize_request(APIRequestFactory().get('/', params or {}))
+    queryset = view.filter_queryset(view.get_queryset()).filter(**lookups)
+    return queryset[:slice_to] if slice_to else queryset
+
+
+def endpoint_queries():
+    today = date.today(); cow_id = Cow.objects.values_list('id', flat=True).first() or 1
+    herd_id = Cow.objects.exclude(herd=None).values_list('herd_id', flat=True).first() or 1
+    tag_prefix = (Cow.objects.values_list('tag_id', flat=True).first() or 'PL0')[:6]
+    return [
+        ('cows: lista (bez filtrów)', endpoint_queryset(CowViewSet, 'list')),
+        ('cows: stado + status', endpoint_queryset(CowViewSet, 'list', {'status': 'ACTIVE'}, herd_id=herd_id)),
+        ('cows: wyszukiwanie (?search=)', endpoint_queryset(CowViewSet, 'list', {'search': tag_prefix})),
+        ('cows: po numerze (search/?tag_id=, lookup/)', card_queryset().filter(tag_normalized__in=['000000'])),
+        ('events: historia krowy', endpoint_queryset(EventViewSet, 'list', slice_to=51, cow_id=cow_id)),
+        ('tasks: otwarte w oknie dat', endpoint_queryset(TaskViewSet, 'list', {
+            'is_completed': 'false', 'due_date__gte': today.isoformat(), 'due_date__lte': (today + timedelta(days=30)).isoformat()}, slice_to=51)),
+        ('tasks: zadania krowy', endpoint_queryset(TaskViewSet, 'list', slice_to=51, cow_id=cow_id)),
+        ('stats: nadchodzące zadania', Task.objects.filter(is_completed=False, due_date__gte=today, due_date__lte=today + timedelta(days=UPCOMING_DAYS))),
+        ('stats: aktywne krowy stada', Cow.objects.filter(status='ACTIVE', herd_id=herd_id)),
+        ('sync: pełny zrzut krów', Cow.objects.order_by('updated_at', 'pk')),
+        ('sync: zmiany krów od kursora', Cow.objects.filter(updated_at__gte=timezone.now() - timedelta(hours=1)).order_by('updated_at', 'pk')),
+        ('sync: tombstones od kursora', SyncTombstone.objects.filter(deleted_at__gte=timezone.now() - timedelta(hours=1))),
+        ('search: /api/search/?q=', search_sql(tag_prefix)),
+    ]
+
+
+def explain(query):
+    """Plan dla querysetu albo surowego zapytania (sql, parametry); None - zapytanie nie trafia do bazy."""
+    if query is None: return None
+    if not isinstance(query, tuple): return None if query.query.is_empty() else query.explain()
+    sql, params = query
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def sequential_scans(plan):
+    pattern = POSTGRES_SCAN if connection.vendor == 'postgresql' else SQLITE_SCAN
+    tables = set(connection.introspection.table_names()) # pomijamy podzapytania (np. "SCAN m")
+    return sorted({match.group(1) for line in plan.splitlines() for match in [pattern.search(line)] if match and match.group(1) in tables})
+
+
+class Command(BaseCommand):
+    help = ("Uruchamia EXPLAIN dla zapytań głównych endpointów i oznacza pełne skany tabel (SQLite i PostgreSQL). "
+            "Na małej bazie PostgreSQL i tak wybiera Seq Scan - użyj --no-seqscan, żeby sprawdzić, czy indeks w ogóle pasuje.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plan', action='store_true', help='Wypisz pełny plan każdego zapytania')
+        parser.add_argument('--no-seqscan', action='store_true', help='PostgreSQL: SET enable_seqscan = off na czas analizy')
+        parser.add_argument('--fail', action='store_true', help='Zakończ błędem, jeśli znaleziono nieoczekiwane pełne skany (CI)')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'): raise CommandError(f'Nieobsługiwana baza: {connection.vendor}')
+        flagged = []
+        with transaction.atomic():
+            if options['no_seqscan'] and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor: cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, query in endpoint_queries():
+                plan = explain(query)
+                if plan is None: self.stdout.write(f"{'-':8} {name} (nie trafia do bazy)"); continue
+                scans = sequential_scans(plan)
+                if not scans: label = self.style.SUCCESS('OK      ')
+                elif name in EXPECTED_SCANS: label = self.style.WARNING('SKAN(ok)')
+                else: label = self.style.ERROR('SKAN    '); flagged.append(name)
+                self.stdout.write(f"{label} {name}" + (f"  [{', '.join(scans)}]" if scans else ''))
+                if options['verbose_plan']: self.stdout.write('    ' + plan.replace('\n', '\n    '))
+        if flagged:
+            message = f"Pełne skany w {len(flagged)} zapytaniach: {', '.join(flagged)}"
+            if options['fail']: raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
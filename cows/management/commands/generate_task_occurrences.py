@@ -0,0 +1,19 @@
+# cows/management/commands/generate_task_occurrences.py
+
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from cows.models import TaskRecurrence
+from cows.recurrence import generate, horizon_days, reschedule
+
+
+class Command(BaseCommand):
+    help = ("Tworzy wystąpienia zadań cyklicznych do dziś + TASK_HORIZON_DAYS (do uruchamiania z crona raz dziennie). "
+            "--rebuild tworzy od nowa otwarte przyszłe wystąpienia wszystkich reguł.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Usuń i utwórz ponownie otwarte przyszłe wystąpienia')
+
+    def handle(self, *args, **options):
+        if options['rebuild']: created = sum(reschedule(rule) for rule in TaskRecurrence.objects.filter(is_active=True))
+        else: created = generate()
+        self.stdout.write(self.style.SUCCESS(f"Nowe wystąpienia: {created} (horyzont {horizon_days()} dni, do {date.today() + timedelta(days=horizon_days())})"))
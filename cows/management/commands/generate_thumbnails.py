@@ -0,0 +1,30 @@
+# cows/management/commands/generate_thumbnails.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from cows.jobs import run_thumbnails
+from cows.models import Cow
+
+
+class Command(BaseCommand):
+    help = ("Miniatury (WebP/JPEG) i oczyszczone z EXIF oryginały dla zdjęć wgranych wcześniej. "
+            "Domyślnie tylko krowy ze zdjęciem bez miniatur; --force przetwarza wszystkie.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Przetwórz także zdjęcia, które mają już miniatury')
+        parser.add_argument('--workers', type=int, default=4, help='Liczba wątków (Pillow skaluje poza GIL)')
+
+    def handle(self, *args, **options):
+        cows = Cow.objects.exclude(photo='').exclude(photo=None)
+        if not options['force']: cows = cows.filter(photo_thumbs={})
+        todo = list(cows.values_list('id', 'photo'))
+        self.stdout.write(f"Zdjęć do obróbki: {len(todo)}")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for done, _ in enumerate(executor.map(lambda row: run_thumbnails(*row), todo), start=1):
+                if done % 50 == 0: self.stdout.write(f"  {done}/{len(todo)}")
+        missing = Cow.objects.filter(pk__in=[cow_id for cow_id, _ in todo], photo_thumbs={}).count()
+        message = f"Przetworzono {len(todo) - missing} zdjęć w {time.perf_counter() - started:.1f} s"
+        if missing: self.stdout.write(self.style.WARNING(f"{message}; bez miniatur: {missing} (szczegóły w logu)"))
+        else: self.stdout.write(self.style.SUCCESS(message))
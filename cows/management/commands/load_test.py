@@ -0,0 +1,108 @@
+# cows/management/commands/load_test.py
+
+import http.client
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# Mieszanka żądań jak przy zmianie zmiany: urządzenia pobierają zmiany, odświeżają listę i pulpit, szukają krów
+ENDPOINTS = {
+    'changes': lambda ctx: '/api/sync/changes/?' + urlencode({'since': ctx['since']}),
+    'cows': lambda ctx: '/api/cows/?page_size=50',
+    'stats': lambda ctx: '/api/cows/stats/',
+    'search': lambda ctx: '/api/search/?' + urlencode({'q': ctx['tag'][:6]}),
+    'pedigree': lambda ctx: f"/api/cows/{ctx['cow_id']}/pedigree/?depth=4",
+}
+
+
+class Target:
+    """Serwer pod testem: etykieta=adres, np. wsgi=http://127.0.0.1:8000."""
+    def __init__(self, spec):
+        label, _, url = spec.partition('=')
+        if not url: label, url = spec, spec
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname: raise CommandError(f'Nieprawidłowy adres: {spec}')
+        self.label = label; self.scheme = parts.scheme; self.host = parts.hostname; self.port = parts.port; self.token = None
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=60)
+
+    def request(self, connection, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.token: headers['Authorization'] = f'Bearer {self.token}'
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse(); data = response.read()
+        return response.status, data
+
+
+class Command(BaseCommand):
+    help = ("Test obciążenia odczytów API: wiele równoległych 'urządzeń' (wątków z połączeniem keep-alive) "
+            "na jednym lub kilku serwerach, np. porównanie WSGI i ASGI tej samej bazy:\n"
+            "  gunicorn highlander_farm.wsgi:application -w 1 --threads 8 -b :8000\n"
+            "  gunicorn highlander_farm.asgi:application -w 1 -k uvicorn.workers.UvicornWorker -b :8001\n"
+            "  python manage.py load_test --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001 "
+            "--username admin --password ...")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, help='etykieta=http://host:port (można powtórzyć)')
+        parser.add_argument('--username', required=True); parser.add_argument('--password', required=True)
+        parser.add_argument('--concurrency', type=int, default=50, help='Liczba równoległych klientów')
+        parser.add_argument('--requests', type=int, default=2000, help='Liczba żądań na serwer')
+        parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS), help='Tylko wybrane endpointy (domyślnie wszystkie)')
+        parser.add_argument('--since-minutes', type=int, default=60, help='Kursor kanału zmian: ile minut wstecz')
+
+    def handle(self, *args, **options):
+        targets = [Target(spec) for spec in options['target']]
+        endpoints = options['endpoint'] or sorted(ENDPOINTS)
+        rows = []
+        for target in targets:
+            ctx = self.prepare(target, options)
+            paths = [ENDPOINTS[name](ctx) for name in endpoints]
+            self.stdout.write(f"{target.label}: {options['requests']} żądań, {options['concurrency']} klientów ({', '.join(endpoints)})")
+            rows.append((target.label, *self.run(target, paths, options['requests'], options['concurrency'])))
+        self.stdout.write('')
+        self.stdout.write(f"{'serwer':10} {'żądań/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'błędy':>6}")
+        for label, throughput, latencies, errors in rows:
+            p50, p95, p99 = (statistics.quantiles(latencies, n=100)[q - 1] * 1000 if len(latencies) > 1 else 0 for q in (50, 95, 99))
+            self.stdout.write(f"{label:10} {throughput:9.1f} {p50:8.1f} {p95:8.1f} {p99:8.1f} {errors:6d}")
+
+    def prepare(self, target, options):
+        """Token JWT i przykładowa krowa (numer do wyszukiwania, id do rodowodu)."""
+        connection = target.connect()
+        status, data = target.request(connection, 'POST', '/api/token/', {'username': options['username'], 'password': options['password']})
+        if status != 200: raise CommandError(f'{target.label}: logowanie nieudane ({status})')
+        target.token = json.loads(data)['access']
+        status, data = target.request(connection, 'GET', '/api/cows/?page_size=1&fields=id,tag_id')
+        cows = json.loads(data)['results'] if status == 200 else []
+        if not cows: raise CommandError(f'{target.label}: brak krów w bazie ({status})')
+        connection.close()
+        since = (timezone.now() - timedelta(minutes=options['since_minutes'])).isoformat()
+        return {'cow_id': cows[0]['id'], 'tag': cows[0]['tag_id'], 'since': since}
+
+    def run(self, target, paths, total, concurrency):
+        """Zwraca (żądań/s, czasy odpowiedzi w s, liczba błędów)."""
+        counter = iter(range(total)); lock = threading.Lock(); latencies = []; errors = [0]
+        def client():
+            connection = target.connect()
+            while True:
+                with lock: n = next(counter, None)
+                if n is None: break
+                started = time.perf_counter()
+                try: status, _ = target.request(connection, 'GET', paths[n % len(paths)])
+                except (OSError, http.client.HTTPException): status = None; connection.close(); connection = target.connect()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if status != 200: errors[0] += 1
+            connection.close()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            for _ in range(concurrency): executor.submit(client)
+        return total / (time.perf_counter() - started), latencies, errors[0]
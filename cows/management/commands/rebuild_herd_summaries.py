@@ -0,0 +1,24 @@
+# cows/management/commands/rebuild_herd_summaries.py
+
+from django.core.management.base import BaseCommand
+from cows.models import Herd
+from cows.summaries import drift, rebuild
+
+
+class Command(BaseCommand):
+    help = ("Sprawdza i przelicza od zera podsumowania stad (HerdSummary) - np. po zmianach krów z pominięciem ORM "
+            "(SQL, migracje danych). --check tylko raportuje rozbieżności.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Tylko pokaż rozbieżności, bez zapisu')
+
+    def handle(self, *args, **options):
+        differences = drift(); names = dict(Herd.objects.values_list('id', 'name'))
+        for herd_id, diff in differences.items():
+            details = ', '.join(f"{name}: {saved} -> {actual}" for name, (saved, actual) in diff.items())
+            self.stdout.write(self.style.WARNING(f"{names.get(herd_id, herd_id)}: {details}"))
+        if options['check']:
+            self.stdout.write(f"Stada z rozbieżnościami: {len(differences)}")
+            if differences: raise SystemExit(1)
+            return
+        self.stdout.write(self.style.SUCCESS(f"Przeliczono podsumowania {rebuild()} stad (rozbieżności: {len(differences)})"))
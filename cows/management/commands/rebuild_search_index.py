@@ -0,0 +1,18 @@
+# cows/management/commands/rebuild_search_index.py
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from cows.models import SearchEntry
+from cows.search import rebuild
+
+
+class Command(BaseCommand):
+    help = "Przebudowuje indeks wyszukiwania (krowy, zdarzenia, zadania), np. po imporcie SQL z pominięciem sygnałów."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic(): rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Zindeksowano {SearchEntry.objects.count()} wpisów w {time.perf_counter() - started:.1f} s"
+        ))
@@ -0,0 +1,23 @@
+# cows/management/commands/recompute_growth.py
+
+import time
+from django.core.management.base import BaseCommand
+from cows.growth import RECOMPUTE_BATCH, recompute, summarize_herds
+from cows.models import Herd, WeightMeasurement
+
+
+class Command(BaseCommand):
+    help = ("Przelicza przyrosty ze wszystkich ważeń (np. po zmianie GROWTH_ROLLING_DAYS) i podsumowania wszystkich stad "
+            "(percentyle zależą też od statusu i stada krów, które zmieniają się bez nowych ważeń - warto uruchamiać co noc).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        cow_ids = list(WeightMeasurement.objects.order_by().values_list('cow_id', flat=True).distinct())
+        changed = 0
+        for start in range(0, len(cow_ids), RECOMPUTE_BATCH):
+            changed += recompute(cow_ids[start:start + RECOMPUTE_BATCH])
+            self.stdout.write(f"  {min(start + RECOMPUTE_BATCH, len(cow_ids))}/{len(cow_ids)}")
+        summarize_herds(Herd.objects.values_list('id', flat=True))
+        self.stdout.write(self.style.SUCCESS(
+            f"Krowy z ważeniami: {len(cow_ids)}, zmienione: {changed}, czas {time.perf_counter() - started:.1f} s"
+        ))
@@ -0,0 +1,162 @@
+# cows/media.py
+
+import contextvars
+import mimetypes
+import os
+import re
+import time
+from asyncio import iscoroutinefunction
+from urllib.parse import quote, unquote
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.http import content_disposition_header, http_date, parse_etags
+from django.views.decorators.http import require_http_methods
+
+# Zdjęcia i dokumenty nie leżą pod publicznym /media/: każdy URL z API (photo, photo_thumb, file_url...) jest podpisany
+# i ważny przez MEDIA_URL_TTL. <img src> nie wyśle nagłówka Authorization, więc podpis w adresie jest uprawnieniem -
+# dostają go tylko zalogowani (z odpowiedzi API). Podpis obejmuje id użytkownika, a plik wydawany jest tylko, dopóki
+# to konto jest aktywne - dezaktywacja konta unieważnia wszystkie jego adresy. Adres zmienia się raz na
+# MEDIA_URL_PERIOD, żeby przeglądarka mogła trzymać plik w cache zamiast pobierać go przy każdym odświeżeniu listy.
+# Sam plik wysyła serwer przed Django (MEDIA_SERVER): nginx - X-Accel-Redirect, Apache/lighttpd - X-Sendfile,
+# a bez nich FileResponse z obsługą Range (wznawianie pobierania dużych PDF-ów) i ETag/If-None-Match (304).
+DEFAULT_MEDIA_URL_TTL = 30 * 24 * 3600 # aplikacja offline trzyma adresy w IndexedDB do kolejnej zmiany krowy
+DEFAULT_MEDIA_URL_PERIOD = 24 * 3600
+DEFAULT_MEDIA_CACHE_MAX_AGE = 24 * 3600
+PRIVATE_DIRS = ('uploads-partial/',) # niedokończone wysyłki (cows/uploads.py)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK = 64 * 1024
+
+_signer = signing.Signer(salt='cows.media')
+_current_request = contextvars.ContextVar('cows_media_request', default=None)
+SIGNED_URL_RE = re.compile(r'/media/\d+/\d+/[^/]+/(?P<path>.+)$')
+
+
+def _signature(name, expires, user_id):
+    return _signer.signature(f'{name}:{expires}:{user_id}')
+
+def signed_path(name, user_id, now=None):
+    """(expires, podpis) - ten sam przez cały okres MEDIA_URL_PERIOD, ważny co najmniej MEDIA_URL_TTL."""
+    period = getattr(settings, 'MEDIA_URL_PERIOD', DEFAULT_MEDIA_URL_PERIOD)
+    ttl = getattr(settings, 'MEDIA_URL_TTL', DEFAULT_MEDIA_URL_TTL)
+    expires = (int(now or time.time()) // period + 1) * period + ttl
+    return expires, _signature(name, expires, user_id)
+
+def check_signature(name, expires, signature, user_id):
+    return expires >= time.time() and signing.constant_time_compare(signature, _signature(name, expires, user_id))
+
+
+# === UŻYTKOWNIK BIEŻĄCEGO ŻĄDANIA ===
+@sync_and_async_middleware
+def media_user_middleware(get_response):
+    """Zapamiętuje request, z którego url() weźmie użytkownika. DRF uwierzytelnia dopiero w widoku (JWT),
+    ale ustawia wtedy request.user także na HttpRequest - odczyt przy budowaniu adresu widzi już zalogowanego."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _current_request.set(request)
+            try: return await get_response(request)
+            finally: _current_request.reset(token)
+    else:
+        def middleware(request):
+            token = _current_request.set(request)
+            try: return get_response(request)
+            finally: _current_request.reset(token)
+    return middleware
+
+def current_user_id():
+    """Id zalogowanego użytkownika bieżącego żądania; 0 poza żądaniem (adres, którego protected_media nie wyda)."""
+    user = getattr(_current_request.get(), 'user', None)
+    return user.pk if user is not None and user.is_authenticated else 0
+
+
+class SignedMediaStorage(FileSystemStorage):
+    """FileSystemStorage, którego url() prowadzi do protected_media z podpisem dla użytkownika bieżącego żądania -
+    dotychczasowe .url w serializerach i miniaturach (cows/thumbnails.py) nie wymagają zmian."""
+    def url(self, name):
+        if name is None: return None
+        name = name.replace('\\', '/'); user_id = current_user_id()
+        expires, signature = signed_path(name, user_id)
+        return reverse('protected-media', kwargs={'user_id': user_id, 'expires': expires, 'signature': signature, 'path': name})
+
+def resign(url):
+    """Adres z danych współdzielonych między użytkownikami (cache kart skanera) podpisany dla bieżącego użytkownika."""
+    match = SIGNED_URL_RE.search(url or '')
+    return default_storage.url(unquote(match['path'])) if match else url
+
+
+# === WYSYŁANIE PLIKU ===
+def _etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+def _not_modified(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header: return False
+    tags = parse_etags(header)
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+def _byte_range(request, etag, size):
+    """(początek, koniec włącznie), None - cały plik, False - zakres niespełnialny. Jeden zakres; wiele zakresów
+    (multipart/byteranges) i nieaktualny If-Range dają cały plik, jak pozwala RFC 9110."""
+    match = RANGE_RE.match(request.headers.get('Range', '').replace(' ', ''))
+    if not match or size == 0: return None
+    if request.headers.get('If-Range', etag) != etag: return None
+    start, end = match.groups()
+    if not start and not end: return None
+    if not start: start, end = max(0, size - int(end)), size - 1
+    else: start, end = int(start), min(int(end), size - 1) if end else size - 1
+    return (start, end) if start <= end and start < size else False
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(STREAM_BLOCK, length))
+            if not block: break
+            length -= len(block); yield block
+
+def file_response(request, path, name):
+    stat = os.stat(path); etag = _etag(stat)
+    headers = {
+        'ETag': etag, 'Last-Modified': http_date(stat.st_mtime), 'Accept-Ranges': 'bytes',
+        'Cache-Control': f"private, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', DEFAULT_MEDIA_CACHE_MAX_AGE)}",
+    }
+    if _not_modified(request, etag):
+        response = HttpResponseNotModified()
+        for key, value in headers.items(): response[key] = value
+        return response
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    server = getattr(settings, 'MEDIA_SERVER', 'django')
+    if server in ('nginx', 'sendfile'):
+        # Serwer przed Django sam obsłuży Range i wyśle plik sendfile() - bez kopiowania przez proces Pythona
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if server == 'nginx': response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/') + quote(name)
+        else: response['X-Sendfile'] = path
+    else:
+        byte_range = _byte_range(request, etag, stat.st_size)
+        if byte_range is False:
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{stat.st_size}', 'Accept-Ranges': 'bytes'})
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=206, content_type=content_type, headers=headers)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'; response['Content-Length'] = str(end - start + 1)
+        else:
+            # Cały plik: FileResponse oddaje go przez wsgi.file_wrapper (sendfile w gunicornie)
+            response = FileResponse(open(path, 'rb'), content_type=content_type, headers=headers)
+    response['Content-Disposition'] = content_disposition_header(False, os.path.basename(name))
+    return response
+
+
+@require_http_methods(['GET', 'HEAD'])
+def protected_media(request, user_id, expires, signature, path):
+    if path.startswith(PRIVATE_DIRS) or not check_signature(path, expires, signature, user_id): raise Http404
+    if not get_user_model().objects.filter(pk=user_id, is_active=True).exists(): raise Http404 # konto usunięte albo zablokowane
+    try: full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation: raise Http404 # wyjście poza MEDIA_ROOT (../)
+    if not os.path.isfile(full_path): raise Http404
+    return file_response(request, full_path, path)
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('cows', 'Krowy'), ('events', 'Zdarzenia'), ('tasks', 'Zadania'), ('documents', 'Dokumenty'), ('herds', 'Stada')], max_length=20, verbose_name='Typ obiektu')),
+                ('object_id', models.BigIntegerField(verbose_name='ID obiektu')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Usunięto')),
+            ],
+            options={
+                'verbose_name': 'Usunięty obiekt (sync)',
+                'verbose_name_plural': 'Usunięte obiekty (sync)',
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cowdocument',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='herd',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='cow',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0002_sync_changes_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(blank=True, default='', max_length=64, verbose_name='Urządzenie')),
+                ('queue_id', models.CharField(max_length=64, verbose_name='ID w kolejce')),
+                ('fingerprint', models.CharField(max_length=40, verbose_name='Skrót zadania')),
+                ('result', models.JSONField(verbose_name='Wynik')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_receipts', to=settings.AUTH_USER_MODEL, verbose_name='Użytkownik')),
+            ],
+            options={
+                'verbose_name': 'Potwierdzenie synchronizacji',
+                'verbose_name_plural': 'Potwierdzenia synchronizacji',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='syncreceipt',
+            constraint=models.UniqueConstraint(fields=('user', 'device_id', 'queue_id'), name='unique_sync_receipt'),
+        ),
+    ]
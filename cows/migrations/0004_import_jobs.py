@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0003_sync_receipts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='imports/', verbose_name='Plik')),
+                ('status', models.CharField(choices=[('PENDING', 'Oczekuje'), ('RUNNING', 'W trakcie'), ('DONE', 'Zakończony'), ('FAILED', 'Błąd')], db_index=True, default='PENDING', max_length=10, verbose_name='Status')),
+                ('total_rows', models.PositiveIntegerField(default=0, verbose_name='Liczba wierszy')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='Przetworzone wiersze')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Utworzone')),
+                ('updated_count', models.PositiveIntegerField(default=0, verbose_name='Zaktualizowane')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Błędy')),
+                ('timings', models.JSONField(blank=True, default=dict, verbose_name='Czasy etapów (ms)')),
+                ('message', models.TextField(blank=True, null=True, verbose_name='Błąd krytyczny')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Zlecił')),
+            ],
+            options={
+                'verbose_name': 'Import Excel',
+                'verbose_name_plural': 'Importy Excel',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:14
+
+from django.db import DatabaseError, migrations, models, transaction
+
+# SearchFilter (icontains) na PostgreSQL to UPPER(kolumna::text) LIKE UPPER('%...%') - pomaga tylko indeks trigramowy.
+# SQLite nie ma odpowiednika (LIKE z wiodącym % zawsze skanuje tabelę), więc tam operacja nic nie robi.
+TRIGRAM_COLUMNS = ['name', 'tag_id', 'passport_number']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql': return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        return # brak uprawnień do rozszerzenia - wyszukiwanie działa, tylko bez indeksu
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS cow_{column}_trgm_idx ON cows_cow USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql': return
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS cow_{column}_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0004_import_jobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cow',
+            index=models.Index(fields=['herd', 'status'], name='cow_herd_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['cow', '-date', '-created_at'], name='event_cow_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['due_date'], name='task_open_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['cow', 'due_date'], name='task_cow_due_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:16
+
+from django.db import DatabaseError, migrations, models, transaction
+
+# SQLite: tabela FTS5 z zawartością w cows_searchentry, aktualizowana wyzwalaczami.
+# PostgreSQL: wyliczana kolumna tsvector (numery ARiMR z wagą A) z indeksem GIN + trigramy na numerach.
+SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE cows_search_fts USING fts5(tags, text, entity, content='cows_searchentry', content_rowid='id',
+       tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')""",
+    """CREATE TRIGGER cows_search_ai AFTER INSERT ON cows_searchentry BEGIN
+       INSERT INTO cows_search_fts(rowid, tags, text, entity) VALUES (new.id, new.tags, new.text, new.entity); END""",
+    """CREATE TRIGGER cows_search_ad AFTER DELETE ON cows_searchentry BEGIN
+       INSERT INTO cows_search_fts(cows_search_fts, rowid, tags, text, entity) VALUES ('delete', old.id, old.tags, old.text, old.entity); END""",
+    """CREATE TRIGGER cows_search_au AFTER UPDATE ON cows_searchentry BEGIN
+       INSERT INTO cows_search_fts(cows_search_fts, rowid, tags, text, entity) VALUES ('delete', old.id, old.tags, old.text, old.entity);
+       INSERT INTO cows_search_fts(rowid, tags, text, entity) VALUES (new.id, new.tags, new.text, new.entity); END""",
+]
+SQLITE_FTS_DROP = ['DROP TRIGGER IF EXISTS cows_search_ai', 'DROP TRIGGER IF EXISTS cows_search_ad',
+                   'DROP TRIGGER IF EXISTS cows_search_au', 'DROP TABLE IF EXISTS cows_search_fts']
+POSTGRES_SEARCH = [
+    """ALTER TABLE cows_searchentry ADD COLUMN document tsvector GENERATED ALWAYS AS (
+       setweight(to_tsvector('simple', tags), 'A') || setweight(to_tsvector('simple', text), 'B')) STORED""",
+    'CREATE INDEX cows_search_document_idx ON cows_searchentry USING gin (document)',
+]
+POSTGRES_TRIGRAM = 'CREATE INDEX IF NOT EXISTS cows_search_tags_trgm_idx ON cows_searchentry USING gin (tags gin_trgm_ops)'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                for sql in SQLITE_FTS: schema_editor.execute(sql)
+        except DatabaseError:
+            pass # SQLite bez FTS5 - wyszukiwarka użyje LIKE po cows_searchentry
+    elif vendor == 'postgresql':
+        for sql in POSTGRES_SEARCH: schema_editor.execute(sql)
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm'); schema_editor.execute(POSTGRES_TRIGRAM)
+        except DatabaseError:
+            pass
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_FTS_DROP: schema_editor.execute(sql)
+
+
+def fill_search_index(apps, schema_editor):
+    from cows.search import cow_entry, event_entry, task_entry
+    SearchEntry = apps.get_model('cows', 'SearchEntry')
+    sources = [('Cow', 'herd', cow_entry), ('Event', 'cow', event_entry), ('Task', 'cow', task_entry)]
+    for model_name, related, build in sources:
+        objects = apps.get_model('cows', model_name).objects.select_related(related).iterator(chunk_size=1000)
+        SearchEntry.objects.bulk_create((SearchEntry(**build(obj)) for obj in objects), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('cow', 'Krowa'), ('event', 'Zdarzenie'), ('task', 'Zadanie')], max_length=10, verbose_name='Typ obiektu')),
+                ('object_id', models.BigIntegerField(verbose_name='ID obiektu')),
+                ('cow_id', models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='ID krowy')),
+                ('title', models.CharField(max_length=255, verbose_name='Tytuł')),
+                ('subtitle', models.CharField(blank=True, default='', max_length=255, verbose_name='Opis')),
+                ('tags', models.CharField(blank=True, default='', max_length=255, verbose_name='Numery ARiMR')),
+                ('text', models.TextField(blank=True, default='', verbose_name='Treść')),
+            ],
+            options={
+                'verbose_name': 'Wpis wyszukiwarki',
+                'verbose_name_plural': 'Wpisy wyszukiwarki',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('entity', 'object_id'), name='unique_search_entry'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
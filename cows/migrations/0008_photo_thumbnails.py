@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0007_tag_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cow',
+            name='photo_thumbs',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Miniatury zdjęcia'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:33
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0008_photo_thumbnails'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200, verbose_name='Tytuł / Opis')),
+                ('filename', models.CharField(max_length=255, verbose_name='Nazwa pliku')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Rozmiar (bajty)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('cow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_uploads', to='cows.cow', verbose_name='Krowa')),
+                ('document', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='cows.cowdocument', verbose_name='Utworzony dokument')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Przesyła')),
+            ],
+            options={
+                'verbose_name': 'Wysyłanie dokumentu',
+                'verbose_name_plural': 'Wysyłanie dokumentów',
+            },
+        ),
+    ]
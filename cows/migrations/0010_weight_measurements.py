@@ -0,0 +1,71 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def seed_measurements(apps, schema_editor):
+    """Dotychczasowa WAGA krowy jako pierwsze ważenie (z dniem ostatniej zmiany rekordu) - historia zaczyna się od niej."""
+    Cow = apps.get_model('cows', 'Cow'); WeightMeasurement = apps.get_model('cows', 'WeightMeasurement')
+    rows = Cow.objects.filter(weight__isnull=False).values_list('id', 'weight', 'updated_at')
+    WeightMeasurement.objects.bulk_create([
+        WeightMeasurement(cow_id=cow_id, date=timezone.localdate(updated_at), weight=weight, source='IMPORT')
+        for cow_id, weight, updated_at in rows.iterator()
+    ], batch_size=500)
+    Cow.objects.filter(weight__isnull=False).update(weight_date=Subquery(WeightMeasurement.objects.filter(cow_id=OuterRef('pk')).values('date')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0009_document_uploads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HerdGrowthSummary',
+            fields=[
+                ('herd', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='growth_summary', serialize=False, to='cows.herd', verbose_name='Stado')),
+                ('animals', models.PositiveIntegerField(default=0, verbose_name='Krowy z przyrostem')),
+                ('summary', models.JSONField(default=dict, verbose_name='Podsumowanie')),
+                ('computed_at', models.DateTimeField(verbose_name='Przeliczono')),
+            ],
+            options={
+                'verbose_name': 'Przyrosty stada',
+                'verbose_name_plural': 'Przyrosty stad',
+            },
+        ),
+        migrations.AddField(
+            model_name='cow',
+            name='weight_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Data ostatniego ważenia'),
+        ),
+        migrations.CreateModel(
+            name='WeightMeasurement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Data ważenia')),
+                ('weight', models.FloatField(verbose_name='Waga (kg)')),
+                ('daily_gain', models.FloatField(blank=True, editable=False, null=True, verbose_name='Przyrost/dzień od poprzedniego ważenia')),
+                ('rolling_gain', models.FloatField(blank=True, editable=False, null=True, verbose_name='Średni przyrost/dzień (okno)')),
+                ('source', models.CharField(choices=[('SCALE', 'Waga elektroniczna'), ('IMPORT', 'Import z pliku'), ('MANUAL', 'Wpisane ręcznie')], default='MANUAL', max_length=10, verbose_name='Źródło')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weights', to='cows.cow', verbose_name='Krowa')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Operator')),
+            ],
+            options={
+                'verbose_name': 'Ważenie',
+                'verbose_name_plural': 'Ważenia',
+                'ordering': ['cow', 'date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='weightmeasurement',
+            constraint=models.UniqueConstraint(fields=('cow', 'date'), name='unique_weight_per_day'),
+        ),
+        migrations.RunPython(seed_measurements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0010_weight_measurements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HerdSummary',
+            fields=[
+                ('herd', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='cows.herd', verbose_name='Stado')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Wszystkie krowy')),
+                ('active', models.PositiveIntegerField(default=0, verbose_name='Aktywne')),
+                ('sold', models.PositiveIntegerField(default=0, verbose_name='Sprzedane')),
+                ('archived', models.PositiveIntegerField(default=0, verbose_name='Zarchiwizowane')),
+                ('females', models.PositiveIntegerField(default=0, verbose_name='Aktywne samice')),
+                ('males', models.PositiveIntegerField(default=0, verbose_name='Aktywne samce')),
+                ('pregnant', models.PositiveIntegerField(default=0, verbose_name='Cielne (aktywne)')),
+                ('pregnancy_possible', models.PositiveIntegerField(default=0, verbose_name='Mogące być cielne (aktywne)')),
+                ('sales_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Suma sprzedaży')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Podsumowanie stada',
+                'verbose_name_plural': 'Podsumowania stad',
+            },
+        ),
+    ]
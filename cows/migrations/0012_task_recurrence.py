@@ -0,0 +1,58 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cows', '0011_herd_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='source_event',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='follow_ups', to='cows.event', verbose_name='Zdarzenie źródłowe'),
+        ),
+        migrations.CreateModel(
+            name='TaskRecurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200, verbose_name='Tytuł zadania')),
+                ('task_type', models.CharField(choices=[('WETERYNARZ', 'Wizyta weterynarza'), ('SZCZEPIENIE', 'Zaplanuj szczepienie'), ('BADANIE', 'Zaplanuj badanie'), ('PIELĘGNACJA', 'Pielęgnacja (np. korekcja racic)'), ('INNE', 'Inne zadanie')], default='INNE', max_length=50, verbose_name='Typ zadania')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notatki')),
+                ('frequency', models.CharField(choices=[('DAILY', 'Co dzień'), ('WEEKLY', 'Co tydzień'), ('MONTHLY', 'Co miesiąc'), ('YEARLY', 'Co rok')], default='MONTHLY', max_length=10, verbose_name='Powtarzanie')),
+                ('interval', models.PositiveSmallIntegerField(default=1, verbose_name='Co ile jednostek')),
+                ('start_date', models.DateField(verbose_name='Pierwszy termin')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='Ostatni możliwy termin')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Aktywna')),
+                ('generated_until', models.DateField(blank=True, editable=False, null=True, verbose_name='Wystąpienia utworzone do')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('cow', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='task_recurrences', to='cows.cow', verbose_name='Krowa')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Operator')),
+            ],
+            options={
+                'verbose_name': 'Zadanie cykliczne',
+                'verbose_name_plural': 'Zadania cykliczne',
+                'ordering': ['start_date', 'pk'],
+            },
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='cows.taskrecurrence', verbose_name='Reguła cykliczna'),
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(fields=('recurrence', 'due_date'), name='unique_task_occurrence'),
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(fields=('source_event', 'title'), name='unique_event_follow_up'),
+        ),
+    ]
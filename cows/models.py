@@ -1,11 +1,67 @@
 # cows/models.py
 from django.db import models
+from django.db.models import Case, ExpressionWrapper, Q, Value, When
+from django.db.models.functions import ExtractYear, Left, Length, Replace, Substr, Upper
+from django.db.models.lookups import Exact
 from django.conf import settings
+from django.utils import timezone
+from datetime import date
 import os
+import uuid
+
+
+# === WIEK W BAZIE DANYCH ===
+def years_ago(today, years):
+    """Ta sama data `years` lat wcześniej (29 lutego -> 28 lutego)."""
+    try: return today.replace(year=today.year - years)
+    except ValueError: return today.replace(year=today.year - years, day=28)
+
+def age_expression(today=None):
+    """Wyrażenie SQL: pełne lata od birth_date do `today` (to samo co get_age w serializerach)."""
+    today = today or date.today()
+    birthday_ahead = Q(birth_date__month__gt=today.month) | Q(birth_date__month=today.month, birth_date__day__gt=today.day)
+    return ExpressionWrapper(
+        Value(today.year) - ExtractYear('birth_date') - Case(When(birthday_ahead, then=Value(1)), default=Value(0)),
+        output_field=models.IntegerField()
+    )
+
+# === NORMALIZACJA NUMERU ARiMR ===
+# "PL 0051-2345 6789", "pl005123456789", "005123456789" i odczyt EID "616005123456789" (616 = kod Polski
+# w ISO 11784) dają ten sam klucz "005123456789". Python i SQL muszą liczyć to identycznie.
+TAG_SEPARATORS = [' ', '-', '.', '/']
+
+def normalize_tag(value):
+    cleaned = str(value or '').upper()
+    for separator in TAG_SEPARATORS: cleaned = cleaned.replace(separator, '')
+    if cleaned[:2] == 'PL': return cleaned[2:]
+    if len(cleaned) == 15 and cleaned[:3] == '616': return cleaned[3:]
+    return cleaned
+
+def normalized_tag_expression():
+    cleaned = 'tag_id'
+    for separator in TAG_SEPARATORS: cleaned = Replace(cleaned, Value(separator), Value(''))
+    cleaned = Upper(cleaned)
+    return Case(
+        When(Exact(Left(cleaned, 2), Value('PL')), then=Substr(cleaned, 3)),
+        When(Exact(Length(cleaned), Value(15)) & Exact(Left(cleaned, 3), Value('616')), then=Substr(cleaned, 4)),
+        default=cleaned,
+    )
+
+class CowQuerySet(models.QuerySet):
+    def with_age(self, today=None):
+        """Dokleja kolumnę `age` liczoną w bazie - można po niej sortować i agregować."""
+        return self.annotate(age=age_expression(today))
+    def age_between(self, min_age=None, max_age=None, today=None):
+        """Filtr wieku jako zakres birth_date (korzysta z indeksu, bez liczenia wieku dla każdego wiersza)."""
+        today = today or date.today(); queryset = self
+        if min_age is not None: queryset = queryset.filter(birth_date__lte=years_ago(today, min_age))
+        if max_age is not None: queryset = queryset.filter(birth_date__gt=years_ago(today, max_age + 1))
+        return queryset
 
 class Herd(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="Nazwa stada")
     description = models.TextField(blank=True, null=True, verbose_name="Opis")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         verbose_name = "Stado"
@@ -27,6 +83,11 @@ class Cow(models.Model):
     # --- Identyfikacja i Stado ---
     herd = models.ForeignKey(Herd, on_delete=models.SET_NULL, null=True, blank=True, related_name='cows', verbose_name="Stado")
     tag_id = models.CharField(max_length=50, unique=True, verbose_name="NR ARIMR")
+    # Liczone przez bazę przy każdym zapisie (także bulk_create/update), z indeksem - wyszukiwanie skanerem
+    tag_normalized = models.GeneratedField(
+        expression=normalized_tag_expression(), output_field=models.CharField(max_length=50), db_persist=True,
+        db_index=True, verbose_name="NR ARIMR (znormalizowany)"
+    )
     name = models.CharField(max_length=100, verbose_name="NAZWA")
     passport_number = models.CharField(max_length=100, blank=True, null=True, verbose_name="NR PASZPORTU")
     business_number = models.CharField(max_length=100, blank=True, null=True, verbose_name="Numer działalności")
@@ -51,6 +112,7 @@ class Cow(models.Model):
     # --- Dane Hodowlane ---
     weight = models.FloatField(null=True, blank=True, verbose_name="WAGA")
     daily_weight_gain = models.FloatField(null=True, blank=True, verbose_name="PRZYROST/DZIEŃ")
+    weight_date = models.DateField(null=True, blank=True, editable=False, verbose_name="Data ostatniego ważenia") # z WeightMeasurement (cows/growth.py)
     pregnancy_duration = models.CharField(max_length=100, blank=True, null=True, verbose_name="DŁUGOŚĆ ISTNIEJĄCEJ CIĄŻY")
     is_pregnancy_possible = models.CharField(max_length=100, blank=True, null=True, verbose_name="MOŻLIWOŚĆ BYCIA CIELNĄ")
     
@@ -63,13 +125,20 @@ class Cow(models.Model):
 
     # --- Pola Aplikacji ---
     photo = models.ImageField(upload_to='cows/', blank=True, null=True, verbose_name="Zdjęcie (z aplikacji)")
+    # Ścieżki miniatur {"320": {"webp": ..., "jpeg": ...}} - wypełniane w tle po wgraniu zdjęcia (cows/jobs.py)
+    photo_thumbs = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Miniatury zdjęcia")
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = CowQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Krowa"
         verbose_name_plural = "Krowy"
         ordering = ['tag_id']
+        indexes = [
+            models.Index(fields=['herd', 'status'], name='cow_herd_status_idx'), # lista stada, statystyki per stado
+        ]
     
     def __str__(self):
         return f"{self.tag_id} - {self.name}"
@@ -85,10 +154,14 @@ class Event(models.Model):
     notes = models.TextField(blank=True, null=True, verbose_name="Notatki")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Operator")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     class Meta:
         ordering = ['-date', '-created_at'] 
         verbose_name = "Zdarzenie (Historia)"
         verbose_name_plural = "Zdarzenia (Historia)"
+        indexes = [
+            models.Index(fields=['cow', '-date', '-created_at'], name='event_cow_date_idx'), # historia krowy
+        ]
     def __str__(self):
         return f"[{self.cow.name}] - {self.event_type} ({self.date})"
 
@@ -97,6 +170,7 @@ class CowDocument(models.Model):
     title = models.CharField(max_length=200, verbose_name="Tytuł / Opis")
     file = models.FileField(upload_to='documents/', verbose_name="Plik")
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Przesłane przez")
     class Meta:
         ordering = ['-uploaded_at']
@@ -108,6 +182,24 @@ class CowDocument(models.Model):
     def filename(self):
         return os.path.basename(self.file.name)
 
+class DocumentUpload(models.Model):
+    """Dokument wysyłany w kawałkach (cows/uploads.py). Plik rośnie w CHUNKED_UPLOAD_DIR, a jego rozmiar na dysku
+    to miejsce, od którego klient wznawia; CowDocument powstaje dopiero przy finalizacji."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    cow = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name='document_uploads', verbose_name="Krowa")
+    title = models.CharField(max_length=200, verbose_name="Tytuł / Opis")
+    filename = models.CharField(max_length=255, verbose_name="Nazwa pliku")
+    size = models.PositiveBigIntegerField(verbose_name="Rozmiar (bajty)")
+    document = models.OneToOneField(CowDocument, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload', verbose_name="Utworzony dokument")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="Przesyła")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    class Meta:
+        verbose_name = "Wysyłanie dokumentu"
+        verbose_name_plural = "Wysyłanie dokumentów"
+    def __str__(self):
+        return f"{self.filename} ({self.size} B)"
+
 class Task(models.Model):
     TASK_TYPE_CHOICES = [
         ('WETERYNARZ', 'Wizyta weterynarza'),
@@ -123,10 +215,190 @@ class Task(models.Model):
     notes = models.TextField(blank=True, null=True, verbose_name="Notatki")
     is_completed = models.BooleanField(default=False, verbose_name="Wykonane", db_index=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Operator")
+    # Wystąpienie zadania cyklicznego albo zadanie wynikające ze zdarzenia (patrz cows/recurrence.py)
+    recurrence = models.ForeignKey('TaskRecurrence', on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences', verbose_name="Reguła cykliczna")
+    source_event = models.ForeignKey(Event, on_delete=models.SET_NULL, null=True, blank=True, related_name='follow_ups', verbose_name="Zdarzenie źródłowe")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     class Meta:
         ordering = ['due_date', 'created_at'] 
         verbose_name = "Zadanie (Kalendarz)"
         verbose_name_plural = "Zadania (Kalendarz)"
+        indexes = [
+            # Otwarte zadania w oknie dat (pulpit, kalendarz) - indeks częściowy, wykonane go nie powiększają
+            models.Index(fields=['due_date'], condition=models.Q(is_completed=False), name='task_open_due_idx'),
+            models.Index(fields=['cow', 'due_date'], name='task_cow_due_idx'),
+        ]
+        constraints = [
+            # Ponowne generowanie (harmonogram, bulk_changed) nie dubluje wystąpień ani zadań po zdarzeniu
+            models.UniqueConstraint(fields=['recurrence', 'due_date'], name='unique_task_occurrence'),
+            models.UniqueConstraint(fields=['source_event', 'title'], name='unique_event_follow_up'),
+        ]
     def __str__(self):
         return f"{self.title} (do {self.due_date})"
+
+class TaskRecurrence(models.Model):
+    """Reguła zadania cyklicznego (korekcja racic, odrobaczanie, coroczne szczepienia). Wystąpienia są zwykłymi
+    zadaniami (Task), tworzonymi z wyprzedzeniem TASK_HORIZON_DAYS - kalendarz, pulpit i synchronizacja ich nie liczą."""
+    FREQUENCY_CHOICES = [('DAILY', 'Co dzień'), ('WEEKLY', 'Co tydzień'), ('MONTHLY', 'Co miesiąc'), ('YEARLY', 'Co rok')]
+    cow = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name='task_recurrences', verbose_name="Krowa", null=True, blank=True)
+    title = models.CharField(max_length=200, verbose_name="Tytuł zadania")
+    task_type = models.CharField(max_length=50, choices=Task.TASK_TYPE_CHOICES, default='INNE', verbose_name="Typ zadania")
+    notes = models.TextField(blank=True, null=True, verbose_name="Notatki")
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='MONTHLY', verbose_name="Powtarzanie")
+    interval = models.PositiveSmallIntegerField(default=1, verbose_name="Co ile jednostek")
+    start_date = models.DateField(verbose_name="Pierwszy termin")
+    end_date = models.DateField(null=True, blank=True, verbose_name="Ostatni możliwy termin")
+    is_active = models.BooleanField(default=True, verbose_name="Aktywna")
+    generated_until = models.DateField(null=True, blank=True, editable=False, verbose_name="Wystąpienia utworzone do")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Operator")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        ordering = ['start_date', 'pk']
+        verbose_name = "Zadanie cykliczne"
+        verbose_name_plural = "Zadania cykliczne"
+    def __str__(self):
+        return f"{self.title} ({self.get_frequency_display().lower()}, co {self.interval})"
+
+
+# === PODSUMOWANIE STADA (utrzymywane przyrostowo przez sygnały, patrz cows/summaries.py) ===
+class HerdSummary(models.Model):
+    """Liczniki stada bez skanowania krów: zapis krowy zmienia tylko różnicę (F() += delta) w jednym-dwóch wierszach."""
+    herd = models.OneToOneField(Herd, on_delete=models.CASCADE, primary_key=True, related_name='summary', verbose_name="Stado")
+    total = models.PositiveIntegerField(default=0, verbose_name="Wszystkie krowy")
+    active = models.PositiveIntegerField(default=0, verbose_name="Aktywne")
+    sold = models.PositiveIntegerField(default=0, verbose_name="Sprzedane")
+    archived = models.PositiveIntegerField(default=0, verbose_name="Zarchiwizowane")
+    females = models.PositiveIntegerField(default=0, verbose_name="Aktywne samice")
+    males = models.PositiveIntegerField(default=0, verbose_name="Aktywne samce")
+    pregnant = models.PositiveIntegerField(default=0, verbose_name="Cielne (aktywne)")
+    pregnancy_possible = models.PositiveIntegerField(default=0, verbose_name="Mogące być cielne (aktywne)")
+    sales_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Suma sprzedaży")
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        verbose_name = "Podsumowanie stada"
+        verbose_name_plural = "Podsumowania stad"
+    def __str__(self):
+        return f"{self.herd}: {self.active}/{self.total}"
+
+
+# === WAŻENIA (szereg czasowy, przyrosty liczy cows/growth.py) ===
+class WeightMeasurement(models.Model):
+    SOURCE_CHOICES = [('SCALE', 'Waga elektroniczna'), ('IMPORT', 'Import z pliku'), ('MANUAL', 'Wpisane ręcznie')]
+    cow = models.ForeignKey(Cow, on_delete=models.CASCADE, related_name='weights', verbose_name="Krowa")
+    date = models.DateField(verbose_name="Data ważenia")
+    weight = models.FloatField(verbose_name="Waga (kg)")
+    daily_gain = models.FloatField(null=True, blank=True, editable=False, verbose_name="Przyrost/dzień od poprzedniego ważenia")
+    rolling_gain = models.FloatField(null=True, blank=True, editable=False, verbose_name="Średni przyrost/dzień (okno)")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='MANUAL', verbose_name="Źródło")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Operator")
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        ordering = ['cow', 'date']
+        verbose_name = "Ważenie"
+        verbose_name_plural = "Ważenia"
+        # Jedno ważenie na dzień - ponowny import tego samego pliku nadpisuje zamiast dublować
+        constraints = [models.UniqueConstraint(fields=['cow', 'date'], name='unique_weight_per_day')]
+    def __str__(self):
+        return f"{self.cow_id}: {self.weight} kg ({self.date})"
+
+class HerdGrowthSummary(models.Model):
+    """Percentyle przyrostów i wag aktywnych krów stada - przeliczane po zmianie ważeń, odczyt bez liczenia."""
+    herd = models.OneToOneField(Herd, on_delete=models.CASCADE, primary_key=True, related_name='growth_summary', verbose_name="Stado")
+    animals = models.PositiveIntegerField(default=0, verbose_name="Krowy z przyrostem")
+    summary = models.JSONField(default=dict, verbose_name="Podsumowanie")
+    computed_at = models.DateTimeField(verbose_name="Przeliczono")
+    class Meta:
+        verbose_name = "Przyrosty stada"
+        verbose_name_plural = "Przyrosty stad"
+    def __str__(self):
+        return f"{self.herd} ({self.computed_at})"
+
+
+# === SYNCHRONIZACJA PRZYROSTOWA ===
+class SyncTombstone(models.Model):
+    """Ślad po usuniętym rekordzie - pozwala klientom offline usunąć go z lokalnej bazy (Dexie)."""
+    ENTITY_CHOICES = [
+        ('cows', 'Krowy'), ('events', 'Zdarzenia'), ('tasks', 'Zadania'),
+        ('documents', 'Dokumenty'), ('herds', 'Stada'),
+    ]
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES, verbose_name="Typ obiektu")
+    object_id = models.BigIntegerField(verbose_name="ID obiektu")
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Usunięto")
+    class Meta:
+        ordering = ['deleted_at']
+        verbose_name = "Usunięty obiekt (sync)"
+        verbose_name_plural = "Usunięte obiekty (sync)"
+    def __str__(self):
+        return f"{self.entity}#{self.object_id} ({self.deleted_at})"
+
+class SyncReceipt(models.Model):
+    """Wynik zadania z kolejki offline (klucz: użytkownik + urządzenie + queueId).
+    Ponownie wysłane zadanie dostaje zapisany wynik bez ponownego zapisu do bazy."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sync_receipts', verbose_name="Użytkownik")
+    device_id = models.CharField(max_length=64, blank=True, default='', verbose_name="Urządzenie")
+    queue_id = models.CharField(max_length=64, verbose_name="ID w kolejce")
+    fingerprint = models.CharField(max_length=40, verbose_name="Skrót zadania")
+    result = models.JSONField(verbose_name="Wynik")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'device_id', 'queue_id'], name='unique_sync_receipt')]
+        verbose_name = "Potwierdzenie synchronizacji"
+        verbose_name_plural = "Potwierdzenia synchronizacji"
+    def __str__(self):
+        return f"{self.user} / {self.device_id or '-'} / {self.queue_id}"
+
+
+# === INDEKS WYSZUKIWANIA ===
+class SearchEntry(models.Model):
+    """Zdenormalizowany wpis wyszukiwarki (krowa, zdarzenie, zadanie), utrzymywany przez sygnały.
+    Na SQLite przeszukuje go tabela FTS5, na PostgreSQL kolumna tsvector z indeksem GIN (patrz cows/search.py)."""
+    ENTITY_CHOICES = [('cow', 'Krowa'), ('event', 'Zdarzenie'), ('task', 'Zadanie')]
+    entity = models.CharField(max_length=10, choices=ENTITY_CHOICES, verbose_name="Typ obiektu")
+    object_id = models.BigIntegerField(verbose_name="ID obiektu")
+    cow_id = models.BigIntegerField(null=True, blank=True, db_index=True, verbose_name="ID krowy")
+    title = models.CharField(max_length=255, verbose_name="Tytuł")
+    subtitle = models.CharField(max_length=255, blank=True, default='', verbose_name="Opis")
+    tags = models.CharField(max_length=255, blank=True, default='', verbose_name="Numery ARiMR") # wyżej w rankingu
+    text = models.TextField(blank=True, default='', verbose_name="Treść")
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['entity', 'object_id'], name='unique_search_entry')]
+        verbose_name = "Wpis wyszukiwarki"
+        verbose_name_plural = "Wpisy wyszukiwarki"
+    def __str__(self):
+        return f"{self.entity}#{self.object_id}: {self.title}"
+
+
+# === IMPORT W TLE ===
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('PENDING', 'Oczekuje'), ('RUNNING', 'W trakcie'), ('DONE', 'Zakończony'), ('FAILED', 'Błąd'),
+    ]
+    file = models.FileField(upload_to='imports/', verbose_name="Plik")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING', db_index=True, verbose_name="Status")
+    total_rows = models.PositiveIntegerField(default=0, verbose_name="Liczba wierszy")
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name="Przetworzone wiersze")
+    created_count = models.PositiveIntegerField(default=0, verbose_name="Utworzone")
+    updated_count = models.PositiveIntegerField(default=0, verbose_name="Zaktualizowane")
+    errors = models.JSONField(default=list, blank=True, verbose_name="Błędy")
+    timings = models.JSONField(default=dict, blank=True, verbose_name="Czasy etapów (ms)")
+    message = models.TextField(blank=True, null=True, verbose_name="Błąd krytyczny")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Zlecił")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Ostatni znak życia wątku importu (każda porcja wierszy) - po restarcie serwera zadanie bez niego jest martwe
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Import Excel"
+        verbose_name_plural = "Importy Excel"
+    def __str__(self):
+        return f"Import #{self.pk} ({self.status})"
+    @property
+    def eta_seconds(self):
+        """Szacowany czas do końca na podstawie dotychczasowego tempa (None, gdy brak danych)."""
+        if self.status != 'RUNNING' or not self.started_at or not self.processed_rows: return None
+        elapsed = (timezone.now() - self.started_at).total_seconds()
+        return round(elapsed / self.processed_rows * (self.total_rows - self.processed_rows), 1)
@@ -0,0 +1,128 @@
+# cows/pagination.py
+
+import base64
+import json
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginacja po kluczu (keyset): kolejna strona to WHERE (klucz) > (ostatni wiersz) z LIMIT, bez COUNT(*)
+    i OFFSET - koszt strony nie zależy od tego, jak daleko jest w tabeli. Klucz to pola `ordering`
+    (ostatnie musi być unikalne); `?ordering=` z OrderingFilter też działa, także po polach z NULL
+    (zawsze na końcu listy) i kolumnach doklejonych w querysecie (np. `age`)."""
+    ordering = ('id',)
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    optional = False # True: bez ?cursor/?page_size lista zwracana w całości (dotychczasowi klienci)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.page_queryset(queryset, request, view)
+        return None if page is None else self.page_rows(list(page))
+
+    def page_queryset(self, queryset, request, view=None):
+        """Zapytanie o stronę (bez wykonania) albo None - widoki async pobierają je same i wołają page_rows."""
+        params = request.query_params
+        if self.optional and self.cursor_query_param not in params and self.page_size_query_param not in params: return None
+        self.request = request; self.fields = self.get_ordering(queryset.model, request, view)
+        self.key_fields = {field: self.key_field(queryset, field.lstrip('-')) for field in self.fields}
+        # F() zamiast nazw: NULL zawsze na końcu, a klucz obcy sortowany po id (bez domyślnego sortowania modelu)
+        queryset = queryset.order_by(*(
+            F(field.lstrip('-')).desc(nulls_last=True) if field.startswith('-') else F(field).asc(nulls_last=True) for field in self.fields
+        ))
+        cursor = params.get(self.cursor_query_param)
+        if cursor: queryset = queryset.filter(self.after(self.decode_cursor(cursor)))
+        self.limit = self.get_page_size(request)
+        return queryset[:self.limit + 1] # jeden wiersz więcej mówi, czy jest następna strona
+
+    def page_rows(self, rows):
+        page_size = self.limit
+        self.next_key = [self.key_value(rows[page_size - 1], field) for field in self.fields] if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_ordering(self, model, request, view):
+        ordering = list(self.ordering)
+        ordering_filter = next((backend() for backend in getattr(view, 'filter_backends', []) if hasattr(backend, 'get_ordering') and backend.ordering_param in request.query_params), None)
+        if ordering_filter:
+            requested = list(ordering_filter.get_ordering(request, model._default_manager.none(), view) or [])
+            if requested:
+                if not any(field.lstrip('-') == 'id' for field in requested): requested.append('-id' if requested[-1].startswith('-') else 'id')
+                ordering = requested
+        return ordering
+
+    @staticmethod
+    def key_field(queryset, name):
+        """(pole do to_python, czy może być NULL) - pole modelu albo typ kolumny doklejonej przez annotate()."""
+        try: field = queryset.model._meta.get_field(name); return field, field.null
+        except FieldDoesNotExist: pass
+        if name in queryset.query.annotations: return queryset.query.annotations[name].output_field, True
+        raise ValidationError({'ordering': f"Nie można sortować po '{name}'"})
+
+    def get_page_size(self, request):
+        try: page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError: raise ValidationError({self.page_size_query_param: 'Musi być liczbą całkowitą'})
+        return max(1, min(page_size, self.max_page_size))
+
+    # === KURSOR ===
+    @staticmethod
+    def key_value(obj, field):
+        name = field.lstrip('-')
+        try: return getattr(obj, obj._meta.get_field(name).attname) # klucz obcy jako id, bez zapytania
+        except FieldDoesNotExist: return getattr(obj, name) # kolumna z annotate()
+
+    def encode_cursor(self, values):
+        payload = json.dumps(dict(zip(self.fields, values)), default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            return [(field, self.key_fields[field][0].to_python(values[field]), self.key_fields[field][1]) for field in self.fields]
+        except Exception: raise NotFound('Nieprawidłowy kursor (zmienione sortowanie albo uszkodzony parametr)')
+
+    @staticmethod
+    def after(key):
+        """(a, b, c) > (x, y, z) rozpisane na OR - z osobnym kierunkiem dla każdego pola. NULL jest zawsze
+        na końcu: po NULL-u w danym polu są już tylko NULL-e, a po wartości - większe/mniejsze i NULL-e."""
+        condition = Q(); equal = Q()
+        for field, value, nullable in key:
+            name = field.lstrip('-'); lookup = 'lt' if field.startswith('-') else 'gt'
+            if value is None:
+                equal &= Q(**{f'{name}__isnull': True}); continue
+            further = Q(**{f'{name}__{lookup}': value})
+            if nullable: further |= Q(**{f'{name}__isnull': True})
+            condition |= equal & further; equal &= Q(**{name: value})
+        return condition
+
+    def get_next_link(self):
+        if self.next_key is None: return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_key))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {'type': 'object', 'properties': {'next': {'type': 'string', 'nullable': True}, 'results': schema}}
+
+
+class CowPagination(KeysetPagination):
+    ordering = ('tag_id', 'id'); optional = True
+
+class EventPagination(KeysetPagination):
+    ordering = ('-date', '-created_at', 'id')
+
+class TaskPagination(KeysetPagination):
+    ordering = ('due_date', 'created_at', 'id')
+
+class DocumentPagination(KeysetPagination):
+    ordering = ('-uploaded_at', 'id')
+
+class UserPagination(KeysetPagination):
+    ordering = ('username', 'id')
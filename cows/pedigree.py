@@ -0,0 +1,84 @@
+# cows/pedigree.py
+
+from django.db import connection
+from .models import Cow
+
+DEFAULT_PEDIGREE_DEPTH = 3
+MAX_PEDIGREE_DEPTH = 12
+NODE_FIELDS = ['id', 'tag_id', 'name', 'gender', 'status', 'birth_date', 'dam_id', 'sire_id']
+
+# Przodkowie i potomkowie w jednym zapytaniu. UNION (nie UNION ALL) zbija duplikaty (id, pokolenie),
+# więc krowa osiągalna wieloma ścieżkami (chów wsobny) nie mnoży wierszy, a limit pokoleń
+# przerywa rekurencję także przy pętli w danych (np. krowa wpisana jako własny przodek po złym imporcie).
+PEDIGREE_SQL = """
+WITH RECURSIVE
+ancestors(id, generation) AS (
+    SELECT id, 0 FROM {table} WHERE id = %s
+    UNION
+    SELECT parent.id, a.generation + 1
+    FROM ancestors a
+    JOIN {table} child ON child.id = a.id
+    JOIN {table} parent ON parent.id = child.dam_id OR parent.id = child.sire_id
+    WHERE a.generation < %s
+),
+descendants(id, generation) AS (
+    SELECT id, 0 FROM {table} WHERE id = %s
+    UNION
+    SELECT child.id, d.generation + 1
+    FROM descendants d
+    JOIN {table} child ON child.dam_id = d.id OR child.sire_id = d.id
+    WHERE d.generation < %s
+),
+tree(id, generation) AS (
+    SELECT id, -MIN(generation) FROM ancestors GROUP BY id
+    UNION ALL
+    SELECT id, MIN(generation) FROM descendants WHERE generation > 0 GROUP BY id
+)
+SELECT tree.generation, {columns}
+FROM tree JOIN {table} n ON n.id = tree.id
+ORDER BY tree.generation, n.tag_id
+"""
+
+
+def parse_depth(value, default=DEFAULT_PEDIGREE_DEPTH):
+    try: depth = int(value)
+    except (TypeError, ValueError): return default
+    return max(1, min(depth, MAX_PEDIGREE_DEPTH))
+
+
+def fetch_pedigree(cow_id, depth=DEFAULT_PEDIGREE_DEPTH):
+    """Drzewo rodowodowe jako płaska lista węzłów i krawędzi (rodzic -> dziecko).
+    generation < 0 to przodkowie, 0 - sama krowa, > 0 - potomkowie."""
+    table = connection.ops.quote_name(Cow._meta.db_table)
+    columns = ', '.join(f'n.{connection.ops.quote_name(field)}' for field in NODE_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(PEDIGREE_SQL.format(table=table, columns=columns), [cow_id, depth, cow_id, depth])
+        rows = cursor.fetchall()
+
+    nodes = {}
+    for generation, *values in rows:
+        node = dict(zip(NODE_FIELDS, values))
+        # Ta sama krowa po obu stronach drzewa oznacza pętlę - zostawiamy pierwsze wystąpienie (przodek)
+        if node['id'] in nodes: continue
+        node['generation'] = generation
+        if node['birth_date']: node['birth_date'] = str(node['birth_date'])
+        nodes[node['id']] = node
+    edges = [
+        {'from': node[field], 'to': node['id'], 'relation': relation}
+        for node in nodes.values() for field, relation in (('dam_id', 'dam'), ('sire_id', 'sire')) if node[field] in nodes
+    ]
+    return {'root': cow_id, 'depth': depth, 'cycle': has_cycle(nodes, edges), 'nodes': list(nodes.values()), 'edges': edges}
+
+
+def has_cycle(nodes, edges):
+    """Sortowanie topologiczne (Kahn) - jeśli nie da się ułożyć wszystkich węzłów, w danych jest pętla."""
+    incoming = dict.fromkeys(nodes, 0); children = {}
+    for edge in edges:
+        incoming[edge['to']] += 1; children.setdefault(edge['from'], []).append(edge['to'])
+    ready = [node_id for node_id, count in incoming.items() if not count]; visited = 0
+    while ready:
+        node_id = ready.pop(); visited += 1
+        for child_id in children.get(node_id, ()):
+            incoming[child_id] -= 1
+            if not incoming[child_id]: ready.append(child_id)
+    return visited < len(nodes)
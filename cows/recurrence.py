@@ -0,0 +1,115 @@
+# cows/recurrence.py
+
+import calendar
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from .models import Event, Task, TaskRecurrence
+
+# Wystąpienia zadań cyklicznych są zwykłymi wierszami Task tworzonymi z wyprzedzeniem (TASK_HORIZON_DAYS): kalendarz
+# i pulpit czytają je jednym zapytaniem po indeksie due_date, bez rozwijania reguł przy każdym odczycie.
+# Horyzont przesuwa polecenie generate_task_occurrences (cron) albo lokalny harmonogram w cows/jobs.py.
+DEFAULT_TASK_HORIZON_DAYS = 90
+CALENDAR_MAX_DAYS = 400 # zakres jednego zapytania kalendarza (rok z zapasem)
+
+# Zadania zakładane automatycznie po zdarzeniu: typ zdarzenia -> [(tytuł, typ zadania, po ilu dniach)].
+# Nadpisywane słownikiem TASK_FOLLOW_UPS w ustawieniach.
+DEFAULT_TASK_FOLLOW_UPS = {
+    'WYCIELENIE': [('Kontrola po wycieleniu', 'WETERYNARZ', 14), ('Badanie cielęcia', 'BADANIE', 30)],
+    'LECZENIE': [('Kontrola po leczeniu', 'BADANIE', 7)],
+}
+
+
+def horizon_days():
+    return getattr(settings, 'TASK_HORIZON_DAYS', DEFAULT_TASK_HORIZON_DAYS)
+
+def add_months(day, months):
+    """Ta sama data `months` miesięcy później (31 stycznia -> 28/29 lutego)."""
+    month = day.month - 1 + months; year = day.year + month // 12; month = month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+def occurrence_dates(rule, start, end):
+    """Terminy reguły w przedziale [start, end] - zawsze liczone od start_date, więc bez dryfu przy krótkich miesiącach."""
+    end = min(end, rule.end_date) if rule.end_date else end
+    step = max(rule.interval, 1); index = 0
+    while True:
+        if rule.frequency in ('DAILY', 'WEEKLY'):
+            day = rule.start_date + timedelta(days=index * step * (7 if rule.frequency == 'WEEKLY' else 1))
+        else: day = add_months(rule.start_date, index * step * (12 if rule.frequency == 'YEARLY' else 1))
+        if day > end: return
+        if day >= start: yield day
+        index += 1
+
+
+# === GENEROWANIE WYSTĄPIEŃ ===
+def generate(today=None, rules=None):
+    """Tworzy brakujące wystąpienia aktywnych reguł do dziś + TASK_HORIZON_DAYS jednym bulk_create.
+    Terminy, które minęły, zanim harmonogram się uruchomił, są pomijane. Zwraca liczbę nowych zadań."""
+    from .signals import bulk_changed
+    today = today or date.today(); horizon = today + timedelta(days=horizon_days())
+    rules = TaskRecurrence.objects.all() if rules is None else rules
+    rules = list(rules.filter(is_active=True).filter(Q(generated_until__isnull=True) | Q(generated_until__lt=horizon)))
+    if not rules: return 0
+    started = timezone.now(); tasks = []
+    for rule in rules:
+        start = max(today, rule.generated_until + timedelta(days=1)) if rule.generated_until else today
+        tasks += [
+            Task(cow_id=rule.cow_id, title=rule.title, task_type=rule.task_type, notes=rule.notes, due_date=day, recurrence=rule, user_id=rule.user_id)
+            for day in occurrence_dates(rule, start, horizon)
+        ]
+        rule.generated_until = horizon
+    with transaction.atomic():
+        Task.objects.bulk_create(tasks, batch_size=500, ignore_conflicts=True)
+        TaskRecurrence.objects.bulk_update(rules, ['generated_until'])
+        created = list(Task.objects.filter(recurrence__in=rules, created_at__gte=started).values_list('pk', flat=True))
+        if created: bulk_changed.send(sender=Task, ids=created)
+    return len(created)
+
+def reschedule(rule, today=None):
+    """Po zmianie reguły: otwarte przyszłe wystąpienia są tworzone od nowa (wykonane zostają w historii)."""
+    today = today or date.today()
+    with transaction.atomic():
+        rule.occurrences.filter(is_completed=False, due_date__gte=today).delete()
+        TaskRecurrence.objects.filter(pk=rule.pk).update(generated_until=None); rule.generated_until = None
+        return generate(today, TaskRecurrence.objects.filter(pk=rule.pk))
+
+
+# === ZADANIA PO ZDARZENIACH ===
+def create_follow_ups(event_ids):
+    """Zadania wynikające ze zdarzeń (np. kontrola 14 dni po wycieleniu) - jedno zapytanie o zdarzenia i jeden bulk_create.
+    Tylko dla aktywnych krów i terminów, które jeszcze nie minęły (wpisywanie starej historii nie zaśmieca kalendarza)."""
+    from .signals import bulk_changed
+    follow_ups = getattr(settings, 'TASK_FOLLOW_UPS', DEFAULT_TASK_FOLLOW_UPS)
+    events = Event.objects.filter(pk__in=event_ids, event_type__in=list(follow_ups), cow__status='ACTIVE').values('pk', 'cow_id', 'event_type', 'date', 'user_id')
+    today = date.today(); tasks = []
+    for event in events:
+        for title, task_type, days in follow_ups[event['event_type']]:
+            due_date = event['date'] + timedelta(days=days)
+            if due_date < today: continue
+            tasks.append(Task(cow_id=event['cow_id'], title=title, task_type=task_type, due_date=due_date, source_event_id=event['pk'], user_id=event['user_id']))
+    if not tasks: return 0
+    started = timezone.now()
+    Task.objects.bulk_create(tasks, batch_size=500, ignore_conflicts=True)
+    created = list(Task.objects.filter(source_event__in=event_ids, created_at__gte=started).values_list('pk', flat=True))
+    if created: bulk_changed.send(sender=Task, ids=created)
+    return len(created)
+
+
+# === KALENDARZ ===
+def calendar_range(query_params):
+    """(od, do) z ?from=&to= (daty ISO, domyślnie bieżący miesiąc) albo ValidationError (400)."""
+    today = date.today(); bounds = []
+    for name, default in (('from', today.replace(day=1)), ('to', add_months(today.replace(day=1), 1) - timedelta(days=1))):
+        raw = query_params.get(name)
+        try: value = parse_date(raw) if raw else default
+        except ValueError: value = None
+        if value is None: raise ValidationError({'error': f'Nieprawidłowa data {name}: "{raw}"'})
+        bounds.append(value)
+    start, end = bounds
+    if start > end: raise ValidationError({'error': "Data 'from' jest późniejsza niż 'to'"})
+    if (end - start).days > CALENDAR_MAX_DAYS: raise ValidationError({'error': f'Zakres kalendarza może mieć najwyżej {CALENDAR_MAX_DAYS} dni'})
+    return start, end
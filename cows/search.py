@@ -0,0 +1,195 @@
+# cows/search.py
+
+import re
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from .models import Cow, Event, Task, SearchEntry
+
+# Tabela FTS5 (SQLite) i kolumna tsvector (PostgreSQL) powstają w migracji 0006_search_index
+SQLITE_FTS_TABLE = 'cows_search_fts'
+ENTITIES = ['cow', 'event', 'task']
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+INDEX_BATCH_SIZE = 1000
+
+
+# === BUDOWANIE WPISÓW ===
+# Funkcje zwracają pola wpisu (dict), więc migracja 0006 może ich użyć z modelami historycznymi
+def tag_tokens(tag_id):
+    """Numer ARiMR w całości i bez kodu kraju - "PL005..." i "005..." znajdują się po początku numeru."""
+    digits = re.sub(r'\D', '', tag_id or '')
+    return ' '.join(dict.fromkeys(token for token in (tag_id, digits) if token))
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+def cow_entry(cow):
+    return dict(
+        entity='cow', object_id=cow.pk, cow_id=cow.pk, title=f"{cow.tag_id} - {cow.name}",
+        subtitle=_join(cow.herd.name if cow.herd else None, cow.get_status_display()),
+        tags=_join(tag_tokens(cow.tag_id), cow.passport_number),
+        text=_join(cow.name, cow.breed, cow.color, cow.herd.name if cow.herd else None, cow.notes),
+    )
+
+def event_entry(event):
+    cow = event.cow
+    return dict(
+        entity='event', object_id=event.pk, cow_id=cow.pk, title=f"{event.get_event_type_display()} - {cow.tag_id}",
+        subtitle=_join(event.date, cow.name), tags=tag_tokens(cow.tag_id),
+        text=_join(event.event_type, event.get_event_type_display(), cow.name, event.notes),
+    )
+
+def task_entry(task):
+    cow = task.cow
+    return dict(
+        entity='task', object_id=task.pk, cow_id=cow.pk if cow else None, title=task.title,
+        subtitle=_join(task.due_date, cow.tag_id if cow else None), tags=tag_tokens(cow.tag_id) if cow else '',
+        text=_join(task.title, task.get_task_type_display(), cow.name if cow else None, task.notes),
+    )
+
+INDEXED = {
+    'cow': (lambda: Cow.objects.select_related('herd'), cow_entry),
+    'event': (lambda: Event.objects.select_related('cow'), event_entry),
+    'task': (lambda: Task.objects.select_related('cow'), task_entry),
+}
+
+
+# === AKTUALIZACJA INDEKSU (wołane z sygnałów) ===
+def reindex(entity, ids=None, cow_ids=None):
+    """Przebudowuje wpisy danego typu: wszystkie (ids=None), wybrane obiekty albo obiekty wybranych krów."""
+    get_queryset, build = INDEXED[entity]
+    queryset = get_queryset(); stale = SearchEntry.objects.filter(entity=entity)
+    if ids is not None: queryset = queryset.filter(pk__in=ids); stale = stale.filter(object_id__in=ids)
+    if cow_ids is not None: queryset = queryset.filter(cow_id__in=cow_ids); stale = stale.filter(cow_id__in=cow_ids)
+    stale.delete()
+    batch = []
+    for obj in queryset.order_by().iterator(chunk_size=INDEX_BATCH_SIZE):
+        batch.append(SearchEntry(**build(obj)))
+        if len(batch) >= INDEX_BATCH_SIZE: SearchEntry.objects.bulk_create(batch); batch = []
+    if batch: SearchEntry.objects.bulk_create(batch)
+
+def reindex_cows(ids=None):
+    """Krowy oraz - jeśli zmienił się numer albo imię - ich zdarzenia i zadania (mają je w treści)."""
+    previous = dict(SearchEntry.objects.filter(entity='cow', **({} if ids is None else {'object_id__in': ids})).values_list('object_id', 'title'))
+    reindex('cow', ids)
+    current = SearchEntry.objects.filter(entity='cow', **({} if ids is None else {'object_id__in': ids})).values_list('object_id', 'title')
+    renamed = [cow_id for cow_id, title in current if previous.get(cow_id) not in (None, title)]
+    if renamed:
+        reindex('event', cow_ids=renamed); reindex('task', cow_ids=renamed)
+
+def remove(entity, object_id):
+    SearchEntry.objects.filter(entity=entity, object_id=object_id).delete()
+
+def rebuild():
+    for entity in ENTITIES: reindex(entity)
+    if _backend() == 'sqlite-fts':
+        with connection.cursor() as cursor: cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('optimize')")
+
+
+# === ZAPYTANIA ===
+# Ranking (bm25 / ts_rank) liczymy dla RANK_CANDIDATES najnowszych trafień - przy bardzo ogólnym słowie
+# (np. "kontrola" w dziesiątkach tysięcy zdarzeń) koszt nie rośnie z historią. Krowy i trafienia w numerach
+# (kolumna tags) są kandydatami zawsze: to najlepiej oceniane wyniki, a ich liczba zależy od wielkości stada,
+# nie od liczby zdarzeń - nowsze notatki wspominające krowę nie wypchną jej z wyników.
+RANK_CANDIDATES = 200
+def query_tokens(text):
+    return re.findall(r'\w+', text or '')[:8]
+
+def _backend():
+    backend = getattr(connection, '_cows_search_backend', None) # sprawdzane raz na połączenie
+    if backend is None:
+        if connection.vendor == 'postgresql': backend = 'postgresql'
+        elif connection.vendor == 'sqlite' and SQLITE_FTS_TABLE in connection.introspection.table_names(): backend = 'sqlite-fts'
+        else: backend = 'like'
+        connection._cows_search_backend = backend
+    return backend
+
+def _fts_match(tokens, entities):
+    """Wyrażenie MATCH dla FTS5: każde słowo jako prefiks w numerach/treści, typ jako osobna kolumna."""
+    match = '{tags text}: (' + ' '.join(f'"{token}"*' for token in tokens) + ')'
+    return match + (f" AND entity: ({' OR '.join(entities)})" if entities else '')
+
+def _tsquery(tokens, weight=''):
+    return ' & '.join(f'{token}:*{weight}' for token in tokens)
+
+def search_sql(text, entities=None, limit=DEFAULT_SEARCH_LIMIT):
+    """(sql, params) zapytania rankingowego albo None (puste zapytanie / baza bez indeksu pełnotekstowego)."""
+    tokens = query_tokens(text); backend = _backend()
+    if not tokens or backend == 'like': return None
+    if backend == 'sqlite-fts':
+        # bm25: mniejszy = lepszy; numery ARiMR (kolumna tags) ważą 10x więcej niż treść
+        sql = (f"SELECT e.entity, e.object_id, e.cow_id, e.title, e.subtitle, -m.score FROM ("
+               f"SELECT rowid, bm25({SQLITE_FTS_TABLE}, 10.0, 1.0, 0.0) AS score FROM {SQLITE_FTS_TABLE} "
+               f"WHERE {SQLITE_FTS_TABLE} MATCH %s AND (rowid >= (SELECT COALESCE(MIN(rowid), 0) FROM ("
+               f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s ORDER BY rowid DESC LIMIT {RANK_CANDIDATES})) "
+               f"OR rowid IN (SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s)) "
+               f"ORDER BY score LIMIT %s) m JOIN cows_searchentry e ON e.id = m.rowid ORDER BY m.score")
+        match = _fts_match(tokens, entities)
+        always = match + ' AND (entity: cow OR tags: (' + ' '.join(f'"{token}"*' for token in tokens) + '))'
+        return sql, [match, match, always, limit]
+    entity_filter = f" AND entity IN ({', '.join(['%s'] * len(entities))})" if entities else ''
+    sql = ("SELECT entity, object_id, cow_id, title, subtitle, ts_rank(document, query) AS score FROM ("
+           "SELECT * FROM cows_searchentry, to_tsquery('simple', %s) query WHERE document @@ query" + entity_filter +
+           " AND (id >= (SELECT COALESCE(MIN(id), 0) FROM (SELECT id FROM cows_searchentry WHERE document @@ to_tsquery('simple', %s)" + entity_filter +
+           f" ORDER BY id DESC LIMIT {RANK_CANDIDATES}) newest) OR entity = 'cow' OR document @@ to_tsquery('simple', %s))"
+           ") candidates ORDER BY score DESC, id DESC LIMIT %s")
+    return sql, [_tsquery(tokens), *(entities or []), _tsquery(tokens), *(entities or []), _tsquery(tokens, 'A'), limit]
+
+def search_params(query_params):
+    """(tekst, typy, limit) z parametrów ?q=&types=&limit= albo ValidationError (400)."""
+    text = query_params.get('q', '').strip()
+    if not text: raise ValidationError({'error': 'Brak parametru q'})
+    entities = [e for e in query_params.get('types', '').split(',') if e] or None
+    if entities and set(entities) - set(ENTITIES): raise ValidationError({'error': f"Parametr types: dozwolone {', '.join(ENTITIES)}"})
+    try: limit = max(1, min(int(query_params.get('limit', DEFAULT_SEARCH_LIMIT)), MAX_SEARCH_LIMIT))
+    except ValueError: raise ValidationError({'error': 'Parametr limit musi być liczbą'})
+    return text, entities, limit
+
+def search(text, entities=None, limit=DEFAULT_SEARCH_LIMIT):
+    """Wyniki posortowane wg trafności: [{type, id, cow_id, title, subtitle, rank}].
+    Każde słowo zapytania musi pasować do początku słowa w indeksie (wyszukiwanie prefiksowe)."""
+    tokens = query_tokens(text)
+    if not tokens: return []
+    query = search_sql(text, entities, limit)
+    if query is None: return _search_like(tokens, entities, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(*query)
+        rows = cursor.fetchall()
+    return [
+        {'type': entity, 'id': object_id, 'cow_id': cow_id, 'title': title, 'subtitle': subtitle, 'rank': round(score, 4)}
+        for entity, object_id, cow_id, title, subtitle, score in rows
+    ]
+
+def _like_entries(tokens, entities):
+    queryset = SearchEntry.objects.all()
+    for token in tokens: queryset = queryset.filter(Q(tags__icontains=token) | Q(text__icontains=token))
+    return queryset.filter(entity__in=entities) if entities else queryset
+
+def _search_like(tokens, entities, limit):
+    """Zapasowo (SQLite bez FTS5): LIKE po tabeli wpisów - poprawne, ale bez indeksu."""
+    return [
+        {'type': e.entity, 'id': e.object_id, 'cow_id': e.cow_id, 'title': e.title, 'subtitle': e.subtitle, 'rank': 0}
+        for e in _like_entries(tokens, entities).order_by('entity', 'title')[:limit]
+    ]
+
+def matching_ids(text, entity):
+    """Podzapytanie z id wszystkich pasujących obiektów danego typu (dla ?search= na listach, bez rankingu)."""
+    tokens = query_tokens(text); backend = _backend()
+    if backend == 'sqlite-fts':
+        return RawSQL(f"SELECT e.object_id FROM {SQLITE_FTS_TABLE} JOIN cows_searchentry e ON e.id = {SQLITE_FTS_TABLE}.rowid "
+                      f"WHERE {SQLITE_FTS_TABLE} MATCH %s", [_fts_match(tokens, [entity])])
+    if backend == 'postgresql':
+        return RawSQL("SELECT object_id FROM cows_searchentry WHERE entity = %s AND document @@ to_tsquery('simple', %s)", [entity, _tsquery(tokens)])
+    return _like_entries(tokens, [entity]).values('object_id')
+
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """?search= na listach przez indeks wyszukiwania (prefiksy słów) zamiast icontains po każdym wierszu.
+    Widok podaje typ wpisów w atrybucie `search_entity`."""
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        if not query_tokens(text): return queryset
+        return queryset.filter(pk__in=matching_ids(text, view.search_entity))
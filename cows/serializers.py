@@ -1,7 +1,8 @@
 # cows/serializers.py
 
 from rest_framework import serializers
-from .models import Cow, Event, CowDocument, Task, Herd 
+from .models import Cow, Event, CowDocument, Task, TaskRecurrence, Herd, HerdSummary, ImportJob
+from .thumbnails import srcset, thumb_url
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User 
 
@@ -26,15 +27,60 @@ class UserPasswordUpdateSerializer(serializers.Serializer):
     def update(self, instance, validated_data):
         instance.set_password(validated_data['password']); instance.save(); return instance
 
+# === Pole relacji z podpowiedzią (pakiety synchronizacji) ===
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, który najpierw szuka obiektu w context['prefetched'][nazwa_pola]
+    (słownik pk -> obiekt z jednego in_bulk), zamiast robić osobne zapytanie dla każdego rekordu."""
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.field_name)
+        if prefetched is None: return super().to_internal_value(data)
+        if isinstance(data, bool): self.fail('incorrect_type', data_type=type(data).__name__)
+        try: pk = int(data)
+        except (TypeError, ValueError): self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in prefetched: self.fail('does_not_exist', pk_value=data)
+        return prefetched[pk]
+
+# === Wybór pól (?fields=id,tag_id,name) ===
+class SparseFieldsMixin:
+    """Przy odczycie (GET) zostawia tylko pola wymienione w ?fields= - mniejsze odpowiedzi dla aplikacji mobilnej.
+    Nieznane nazwy są pomijane; bez parametru serializer zwraca wszystkie pola."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not request.query_params.get('fields'): return
+        requested = {name.strip() for name in request.query_params['fields'].split(',')}
+        if not requested & self.fields.keys(): return
+        for name in list(self.fields):
+            if name not in requested: self.fields.pop(name)
+
+# === Miniatury zdjęć (cows/thumbnails.py) ===
+class PhotoThumbnailsMixin:
+    """photo_thumb - JPEG do <img src>, photo_srcset - WebP do <source srcset>. None, dopóki miniatury się robią."""
+    def get_photo_thumb(self, obj):
+        return thumb_url(obj.photo_thumbs, self.context.get('request')) if obj.photo else None
+    def get_photo_srcset(self, obj):
+        return srcset(obj.photo_thumbs, self.context.get('request')) if obj.photo else None
+
 # === Herd Serializer ===
 class HerdSerializer(serializers.ModelSerializer):
     class Meta:
         model = Herd
         fields = ['id', 'name', 'description']
 
+class HerdSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HerdSummary
+        fields = ['total', 'active', 'sold', 'archived', 'females', 'males', 'pregnant', 'pregnancy_possible', 'sales_total', 'updated_at']
+
+class HerdWithSummarySerializer(HerdSerializer):
+    summary = HerdSummarySerializer(read_only=True)
+    class Meta(HerdSerializer.Meta):
+        fields = HerdSerializer.Meta.fields + ['summary']
+
 # === Serwery Krów (ZE WSZYSTKIMI POLAMI) ===
-class CowSerializer(serializers.ModelSerializer):
+class CowSerializer(SparseFieldsMixin, PhotoThumbnailsMixin, serializers.ModelSerializer):
     age = serializers.SerializerMethodField(); photo = serializers.SerializerMethodField() 
+    photo_thumb = serializers.SerializerMethodField(); photo_srcset = serializers.SerializerMethodField()
     dam_name = serializers.CharField(source='dam.name', read_only=True, allow_null=True)
     sire_name = serializers.CharField(source='sire.name', read_only=True, allow_null=True)
     herd_name = serializers.CharField(source='herd.name', read_only=True, allow_null=True)
@@ -44,14 +90,15 @@ class CowSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'tag_id', 'name', 'birth_date', 'gender', 'breed', 'color', 'passport_number', 'business_number',
             'status', 'dam', 'sire', 'exit_date', 'exit_reason', 'sale_price', 
-            'meat_delivery_date', 'notes', 'photo', 'herd', 
-            'weight', 'daily_weight_gain', 'pregnancy_duration', 'is_pregnancy_possible',
+            'meat_delivery_date', 'notes', 'photo', 'photo_thumb', 'photo_srcset', 'herd', 
+            'weight', 'weight_date', 'daily_weight_gain', 'pregnancy_duration', 'is_pregnancy_possible',
             'relocation_status', 'duplicates_to_make', 'duplicates_to_order', 'relocation_after_drive',
             'age', 'dam_name', 'sire_name', 'herd_name', 'created_at', 'updated_at'
         ] 
-        read_only_fields = ['created_at', 'updated_at', 'age', 'dam_name', 'sire_name', 'herd_name']
+        read_only_fields = ['created_at', 'updated_at', 'weight_date', 'age', 'dam_name', 'sire_name', 'herd_name', 'photo_thumb', 'photo_srcset']
     
     def get_age(self, obj):
+        if hasattr(obj, 'age'): return obj.age # policzone w bazie (Cow.objects.with_age())
         if not obj.birth_date: return None
         from datetime import date
         today = date.today(); age = today.year - obj.birth_date.year - ((today.month, today.day) < (obj.birth_date.month, obj.birth_date.day)); return age
@@ -61,9 +108,9 @@ class CowSerializer(serializers.ModelSerializer):
         return None
 
 class CowCreateUpdateSerializer(serializers.ModelSerializer):
-    dam = serializers.PrimaryKeyRelatedField(queryset=Cow.objects.all(), allow_null=True, required=False)
-    sire = serializers.PrimaryKeyRelatedField(queryset=Cow.objects.all(), allow_null=True, required=False)
-    herd = serializers.PrimaryKeyRelatedField(queryset=Herd.objects.all(), allow_null=True, required=False)
+    dam = PrefetchedPrimaryKeyRelatedField(queryset=Cow.objects.all(), allow_null=True, required=False)
+    sire = PrefetchedPrimaryKeyRelatedField(queryset=Cow.objects.all(), allow_null=True, required=False)
+    herd = PrefetchedPrimaryKeyRelatedField(queryset=Herd.objects.all(), allow_null=True, required=False)
 
     class Meta:
         model = Cow
@@ -74,12 +121,15 @@ class CowCreateUpdateSerializer(serializers.ModelSerializer):
             'weight', 'daily_weight_gain', 'pregnancy_duration', 'is_pregnancy_possible',
             'relocation_status', 'duplicates_to_make', 'duplicates_to_order', 'relocation_after_drive'
         ]
-        extra_kwargs = {'photo': {'required': False, 'allow_null': True, 'read_only': True} }
+        # Unikalność tag_id sprawdza validate_tag_id (w pakietach sync bez zapytania na rekord)
+        extra_kwargs = {'photo': {'required': False, 'allow_null': True, 'read_only': True}, 'tag_id': {'validators': []} }
     
     def validate_tag_id(self, value):
         instance = getattr(self, 'instance', None)
         if instance and instance.tag_id == value: return value
-        if Cow.objects.filter(tag_id=value).exists(): raise serializers.ValidationError(f"Krowa z tag_id '{value}' już istnieje")
+        taken = self.context.get('taken_tag_ids') # zbiór zajętych numerów pobrany raz dla całego pakietu
+        exists = value in taken if taken is not None else Cow.objects.filter(tag_id=value).exists()
+        if exists: raise serializers.ValidationError(f"Krowa z tag_id '{value}' już istnieje", code='unique')
         return value
     
     def validate_birth_date(self, value):
@@ -95,8 +145,9 @@ class CowCreateUpdateSerializer(serializers.ModelSerializer):
             if data.get('sire') == instance: raise serializers.ValidationError("Krowa nie może być własnym ojcem.")
         return data
 
-class CowListSerializer(serializers.ModelSerializer): 
+class CowListSerializer(SparseFieldsMixin, PhotoThumbnailsMixin, serializers.ModelSerializer): 
     age = serializers.SerializerMethodField(); photo = serializers.SerializerMethodField()
+    photo_thumb = serializers.SerializerMethodField(); photo_srcset = serializers.SerializerMethodField()
     dam_name = serializers.CharField(source='dam.name', read_only=True, allow_null=True)
     sire_name = serializers.CharField(source='sire.name', read_only=True, allow_null=True)
     herd_name = serializers.CharField(source='herd.name', read_only=True, allow_null=True)
@@ -106,12 +157,13 @@ class CowListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'tag_id', 'name', 'birth_date', 'gender', 'age', 'status', 
             'dam_name', 'sire_name', 'herd', 'herd_name', 'passport_number',
-            'photo',
+            'photo', 'photo_thumb', 'photo_srcset',
             # Dodajemy kluczowe pola do listy
             'weight', 'pregnancy_duration', 'is_pregnancy_possible' 
         ] 
     
     def get_age(self, obj):
+        if hasattr(obj, 'age'): return obj.age # policzone w bazie (Cow.objects.with_age())
         if not obj.birth_date: return None
         from datetime import date
         today = date.today(); age = today.year - obj.birth_date.year - ((today.month, today.day) < (obj.birth_date.month, obj.birth_date.day)); return age
@@ -136,8 +188,8 @@ class CowOffspringSerializer(serializers.ModelSerializer):
     class Meta: model = Cow; fields = ['id', 'name', 'tag_id', 'gender', 'status']
 
 # === Serializer Event ===
-class EventSerializer(serializers.ModelSerializer):
-    user = serializers.StringRelatedField(read_only=True); cow = serializers.PrimaryKeyRelatedField(queryset=Cow.objects.all())
+class EventSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    user = serializers.StringRelatedField(read_only=True); cow = PrefetchedPrimaryKeyRelatedField(queryset=Cow.objects.all())
     class Meta:
         model = Event; fields = ['id', 'cow', 'event_type', 'date', 'notes', 'user', 'created_at']; read_only_fields = ['user', 'created_at'] 
     def create(self, validated_data):
@@ -146,8 +198,8 @@ class EventSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 # === SERIALIZER DOKUMENTU ===
-class CowDocumentSerializer(serializers.ModelSerializer):
-    user = serializers.StringRelatedField(read_only=True); filename = serializers.CharField(source='filename', read_only=True); file_url = serializers.SerializerMethodField()
+class CowDocumentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    user = serializers.StringRelatedField(read_only=True); filename = serializers.CharField(read_only=True); file_url = serializers.SerializerMethodField()
     class Meta:
         model = CowDocument; fields = ['id', 'cow', 'title', 'file', 'file_url', 'filename', 'uploaded_at', 'user']; read_only_fields = ['user', 'uploaded_at', 'filename', 'file_url']; extra_kwargs = {'file': {'write_only': True, 'required': True}}
     def get_file_url(self, obj):
@@ -160,12 +212,37 @@ class CowDocumentSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 # === Serializer Task ===
-class TaskSerializer(serializers.ModelSerializer):
-    user = serializers.StringRelatedField(read_only=True); cow = serializers.PrimaryKeyRelatedField(queryset=Cow.objects.filter(status='ACTIVE'), allow_null=True, required=False)
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    user = serializers.StringRelatedField(read_only=True); cow = PrefetchedPrimaryKeyRelatedField(queryset=Cow.objects.filter(status='ACTIVE'), allow_null=True, required=False)
     cow_name = serializers.CharField(source='cow.name', read_only=True, allow_null=True); cow_tag_id = serializers.CharField(source='cow.tag_id', read_only=True, allow_null=True)
     class Meta:
-        model = Task; fields = ['id', 'cow', 'cow_name', 'cow_tag_id', 'title', 'task_type', 'due_date', 'notes', 'is_completed', 'user', 'created_at']; read_only_fields = ['user', 'created_at', 'cow_name', 'cow_tag_id']
+        model = Task; fields = ['id', 'cow', 'cow_name', 'cow_tag_id', 'title', 'task_type', 'due_date', 'notes', 'is_completed', 'recurrence', 'source_event', 'user', 'created_at']; read_only_fields = ['user', 'created_at', 'cow_name', 'cow_tag_id', 'recurrence', 'source_event']
     def create(self, validated_data):
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated: validated_data['user'] = request.user
         return super().create(validated_data)
+
+# === Serializer zadania cyklicznego ===
+class TaskRecurrenceSerializer(serializers.ModelSerializer):
+    user = serializers.StringRelatedField(read_only=True); cow = serializers.PrimaryKeyRelatedField(queryset=Cow.objects.filter(status='ACTIVE'), allow_null=True, required=False)
+    class Meta:
+        model = TaskRecurrence; fields = ['id', 'cow', 'title', 'task_type', 'notes', 'frequency', 'interval', 'start_date', 'end_date', 'is_active', 'generated_until', 'user', 'created_at']; read_only_fields = ['generated_until', 'user', 'created_at']
+    def validate(self, data):
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None)); end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        if end_date and start_date and end_date < start_date: raise serializers.ValidationError({'end_date': 'Ostatni termin nie może być przed pierwszym'})
+        if data.get('interval') == 0: raise serializers.ValidationError({'interval': 'Odstęp musi być co najmniej 1'})
+        return data
+    def create(self, validated_data):
+        request = self.context.get('request')
+        if request and hasattr(request, 'user') and request.user.is_authenticated: validated_data['user'] = request.user
+        return super().create(validated_data)
+
+# === Serializer importu w tle ===
+class ImportJobSerializer(serializers.ModelSerializer):
+    eta_seconds = serializers.FloatField(read_only=True); progress = serializers.SerializerMethodField()
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'status', 'total_rows', 'processed_rows', 'progress', 'created_count', 'updated_count', 'errors', 'timings', 'message', 'eta_seconds', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+    def get_progress(self, obj):
+        return round(obj.processed_rows * 100 / obj.total_rows, 1) if obj.total_rows else (100.0 if obj.status == 'DONE' else 0.0)
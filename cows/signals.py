@@ -0,0 +1,174 @@
+# cows/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from .models import Cow, Event, CowDocument, Task, TaskRecurrence, Herd, SyncTombstone, WeightMeasurement
+from .stats import invalidate_stats
+from .inbreeding import invalidate_pedigree, parents_changed
+from .lookup import invalidate_tag_lookup
+from . import growth, recurrence, search, summaries
+
+# Zapisy zbiorcze (bulk_create, bulk_update, QuerySet.update) nie wysyłają post_save.
+# Kod, który ich używa, wysyła ten sygnał: bulk_changed.send(sender=Model, ids=[...] albo None, fields=[...] albo None).
+# fields - zmienione pola (jak update_fields); bez nich odbiorcy zakładają, że zmieniło się wszystko.
+bulk_changed = Signal()
+
+# Pola krowy, od których zależą odbiorcy poniżej (nazwy bez "_id")
+STATS_FIELDS = {'status', 'gender', 'birth_date', 'herd'}
+PEDIGREE_FIELDS = {'dam', 'sire'}
+SEARCH_FIELDS = {'tag_id', 'name', 'passport_number', 'breed', 'color', 'herd', 'notes', 'status'}
+
+def touches(fields, relevant):
+    return fields is None or any(field.removesuffix('_id') in relevant for field in fields)
+
+# Model -> nazwa kolekcji w odpowiedzi /api/sync/changes/ (i w tabelach Dexie)
+SYNC_ENTITY_NAMES = {
+    Cow: 'cows', Event: 'events', Task: 'tasks', CowDocument: 'documents', Herd: 'herds',
+}
+
+# === TOMBSTONES DLA SYNCHRONIZACJI PRZYROSTOWEJ ===
+@receiver(post_delete, sender=Cow)
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=CowDocument)
+@receiver(post_delete, sender=Herd)
+def record_sync_tombstone(sender, instance, **kwargs):
+    from .sync import prune_tombstones # sync importuje bulk_changed z tego modułu
+    SyncTombstone.objects.create(entity=SYNC_ENTITY_NAMES[sender], object_id=instance.pk)
+    prune_tombstones()
+
+
+# === UNIEWAŻNIANIE CACHE STATYSTYK ===
+@receiver(post_save, sender=Cow)
+@receiver(post_delete, sender=Cow)
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_stats_on_change(sender, **kwargs):
+    invalidate_stats()
+
+@receiver(bulk_changed)
+def invalidate_stats_on_bulk_change(sender, fields=None, **kwargs):
+    if sender is Task or (sender is Cow and touches(fields, STATS_FIELDS)): invalidate_stats()
+
+
+# === CACHE KART DLA SKANERA ===
+# Karta pokazuje też imiona rodziców i nazwę stada, więc zmiana dowolnej krowy/stada unieważnia wszystkie karty
+@receiver(post_save, sender=Cow)
+@receiver(post_delete, sender=Cow)
+@receiver(post_save, sender=Herd)
+@receiver(post_delete, sender=Herd)
+def invalidate_tag_lookup_on_change(sender, **kwargs):
+    invalidate_tag_lookup()
+
+@receiver(bulk_changed)
+def invalidate_tag_lookup_on_bulk_change(sender, **kwargs):
+    if sender in (Cow, Herd): invalidate_tag_lookup()
+
+
+# === GRAF RODOWODU (inbred) ===
+@receiver(post_save, sender=Cow)
+def update_pedigree_graph(sender, instance, created, **kwargs):
+    parents_changed(instance.pk, instance.dam_id, instance.sire_id, created=created)
+
+@receiver(post_delete, sender=Cow)
+def invalidate_pedigree_on_delete(sender, **kwargs):
+    invalidate_pedigree()
+
+@receiver(bulk_changed)
+def invalidate_pedigree_on_bulk_change(sender, fields=None, **kwargs):
+    if sender is Cow and touches(fields, PEDIGREE_FIELDS): invalidate_pedigree()
+
+
+# === INDEKS WYSZUKIWANIA ===
+SEARCH_ENTITIES = {Cow: 'cow', Event: 'event', Task: 'task'}
+
+@receiver(post_save, sender=Cow)
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Task)
+def update_search_index(sender, instance, **kwargs):
+    if sender is Cow: search.reindex_cows([instance.pk])
+    else: search.reindex(SEARCH_ENTITIES[sender], [instance.pk])
+
+@receiver(post_delete, sender=Cow)
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Task)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove(SEARCH_ENTITIES[sender], instance.pk)
+
+@receiver(bulk_changed)
+def update_search_index_on_bulk_change(sender, ids=None, fields=None, **kwargs):
+    if sender is Cow:
+        if touches(fields, SEARCH_FIELDS): search.reindex_cows(ids)
+    elif sender in SEARCH_ENTITIES: search.reindex(SEARCH_ENTITIES[sender], ids)
+
+
+# === WAŻENIA I PRZYROSTY ===
+# Zmieniona WAGA krowy (formularz, synchronizacja offline, import) zapisuje się jako dzisiejsze ważenie;
+# przeliczenie ustawia na krowie tę samą wagę, więc ponowny bulk_changed już niczego nie dopisuje.
+@receiver(post_save, sender=Cow)
+def record_weight_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or instance.weight is None or (update_fields is not None and 'weight' not in update_fields): return
+    growth.record_current_weights([instance.pk])
+
+@receiver(bulk_changed)
+def record_weight_on_bulk_change(sender, ids=None, fields=None, **kwargs):
+    # growth.recompute sam ustawia wagi z ważeń (fields=growth.COW_FIELDS) - nie ma czego dopisywać
+    if sender is Cow and ids and touches(fields, {'weight'}) and fields != growth.COW_FIELDS: growth.record_current_weights(ids)
+
+@receiver(post_save, sender=WeightMeasurement)
+@receiver(post_delete, sender=WeightMeasurement)
+def recompute_growth_on_change(sender, instance, **kwargs):
+    growth.recompute([instance.cow_id])
+
+
+# === PODSUMOWANIA STAD (HerdSummary) ===
+# Pojedynczy zapis zmienia liczniki o różnicę stanu przed i po; zapisy zbiorcze nie znają stanu "przed",
+# więc przeliczają jednym GROUP BY stada zmienionych krów i stada, z których je przeniesiono (herd_ids w sygnale).
+@receiver(pre_save, sender=Cow)
+def remember_herd_summary_state(sender, instance, raw=False, **kwargs):
+    before = None
+    if instance.pk and not instance._state.adding:
+        before = Cow.objects.filter(pk=instance.pk).values(*summaries.TRACKED_FIELDS).first()
+    instance._summary_before = before
+
+@receiver(post_save, sender=Cow)
+def update_herd_summary(sender, instance, update_fields=None, **kwargs):
+    before = getattr(instance, '_summary_before', None); after = summaries.snapshot(instance)
+    if before is not None and update_fields is not None: # pozostałe pola w pamięci mogą być nieaktualne
+        after = {**before, **{field: after[field] for field in summaries.TRACKED_FIELDS if field.removesuffix('_id') in update_fields or field in update_fields}}
+    summaries.apply_change(before, after)
+
+@receiver(post_delete, sender=Cow)
+def update_herd_summary_on_delete(sender, instance, **kwargs):
+    summaries.apply_change(summaries.snapshot(instance), None)
+
+@receiver(post_save, sender=Herd)
+def create_herd_summary(sender, instance, created, **kwargs):
+    if created: summaries.rebuild([instance.pk])
+
+@receiver(bulk_changed)
+def rebuild_herd_summaries_on_bulk_change(sender, ids=None, fields=None, herd_ids=(), **kwargs):
+    """Przebudowa tylko stad zmienionych krów; herd_ids - stada, z których krowy przeniesiono (nadawca zna je sprzed zapisu)."""
+    if sender is not Cow or not touches(fields, {field.removesuffix('_id') for field in summaries.TRACKED_FIELDS}): return
+    if ids is None: summaries.rebuild(); return
+    herds = set(herd_ids) | set(Cow.objects.filter(pk__in=ids).values_list('herd_id', flat=True).distinct())
+    herds.discard(None)
+    if herds: summaries.rebuild(herds)
+
+
+# === ZADANIA CYKLICZNE I ZADANIA PO ZDARZENIACH (cows/recurrence.py) ===
+@receiver(post_save, sender=TaskRecurrence)
+def reschedule_on_rule_change(sender, instance, raw=False, **kwargs):
+    if not raw: recurrence.reschedule(instance)
+
+@receiver(pre_delete, sender=TaskRecurrence)
+def remove_open_occurrences(sender, instance, **kwargs):
+    instance.occurrences.filter(is_completed=False).delete() # wykonane zostają w historii (recurrence -> NULL)
+
+@receiver(post_save, sender=Event)
+def create_follow_ups_on_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw: recurrence.create_follow_ups([instance.pk])
+
+@receiver(bulk_changed)
+def create_follow_ups_on_bulk_change(sender, ids=None, **kwargs):
+    if sender is Event and ids: recurrence.create_follow_ups(ids)
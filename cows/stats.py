@@ -0,0 +1,119 @@
+# cows/stats.py
+
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from rest_framework.exceptions import ValidationError
+from .models import Cow, Task, age_expression, years_ago
+from .serializers import TaskSerializer
+
+# Przedziały wieku na wykresie: (etykieta, wiek od, wiek do) w pełnych latach, włącznie
+AGE_BUCKETS = [('0-1 lat', None, 1), ('1-2 lat', 2, 2), ('2-5 lat', 3, 5), ('5-8 lat', 6, 8), ('8+ lat', 9, None)]
+UPCOMING_DAYS = 7
+
+
+def age_bucket_filter(today, min_age, max_age):
+    condition = Q(birth_date__isnull=False)
+    if min_age is not None: condition &= Q(birth_date__lte=years_ago(today, min_age))
+    if max_age is not None: condition &= Q(birth_date__gt=years_ago(today, max_age + 1))
+    return condition
+
+
+def herd_param(query_params):
+    """?herd= jako liczba (None - całe gospodarstwo)."""
+    herd_id = query_params.get('herd')
+    if herd_id is not None and not herd_id.isdigit(): raise ValidationError({'error': 'Parametr herd musi być liczbą'})
+    return int(herd_id) if herd_id else None
+
+def stats_queries(herd_id, today):
+    """(krowy, agregaty, najbliższe zadania) - dwa zapytania pulpitu (całe gospodarstwo albo jedno stado)."""
+    cows = Cow.objects.filter(status='ACTIVE'); tasks = Task.objects.select_related('cow', 'user')
+    if herd_id is not None: cows = cows.filter(herd_id=herd_id); tasks = tasks.filter(cow__herd_id=herd_id)
+    aggregates = {'total': Count('id'), 'age_sum': Sum(age_expression(today), filter=Q(birth_date__isnull=False))}
+    for index, (_, min_age, max_age) in enumerate(AGE_BUCKETS):
+        aggregates[f'bucket_{index}'] = Count('id', filter=age_bucket_filter(today, min_age, max_age))
+    for gender, _ in Cow.GENDER_CHOICES:
+        aggregates[f'gender_{gender}'] = Count('id', filter=Q(gender=gender))
+    upcoming_tasks_qs = tasks.filter(
+        is_completed=False, due_date__gte=today, due_date__lte=today + timedelta(days=UPCOMING_DAYS)
+    ).order_by('due_date')
+    return cows, aggregates, upcoming_tasks_qs
+
+def stats_payload(result, upcoming_tasks, request):
+    total = result['total']
+    # Średnia liczona względem wszystkich aktywnych (także bez daty urodzenia) - jak dotychczas
+    avg_age = (result['age_sum'] or 0) / total if total > 0 else 0
+    by_gender = [{'gender': gender, 'count': result[f'gender_{gender}']} for gender, _ in Cow.GENDER_CHOICES if result[f'gender_{gender}']]
+    age_histogram_data = [{"name": label, "ilość": result[f'bucket_{index}']} for index, (label, _, _) in enumerate(AGE_BUCKETS)]
+    upcoming_tasks_data = TaskSerializer(upcoming_tasks, many=True, context={'request': request}).data
+    return {
+        'total_active': total, 'by_gender': by_gender, 'average_age': round(avg_age, 1),
+        'age_histogram': age_histogram_data, 'upcoming_events': upcoming_tasks_data
+    }
+
+def compute_stats(request, herd_id=None, today=None):
+    """Statystyki pulpitu w dwóch zapytaniach: jedna agregacja po krowach i lista najbliższych zadań."""
+    cows, aggregates, upcoming_tasks_qs = stats_queries(herd_id, today or date.today())
+    return stats_payload(cows.aggregate(**aggregates), upcoming_tasks_qs, request)
+
+async def acompute_stats(request, herd_id=None, today=None):
+    cows, aggregates, upcoming_tasks_qs = stats_queries(herd_id, today or date.today())
+    return stats_payload(await cows.aaggregate(**aggregates), [task async for task in upcoming_tasks_qs], request)
+
+
+# === CACHE STATYSTYK ===
+# Klucz zawiera numer generacji (podbijany przy każdej zmianie krów/zadań) i dzisiejszą datę,
+# więc po zmianie danych albo o północy (wiek, okno zadań) wpis po prostu przestaje być używany.
+STATS_CACHE_PREFIX = 'cows:stats'
+DEFAULT_STATS_CACHE_TTL = 300
+
+def _incr(name, initial):
+    key = f'{STATS_CACHE_PREFIX}:{name}'
+    try: return cache.incr(key)
+    except ValueError: cache.set(key, initial, None); return initial
+
+async def _aincr(name, initial):
+    key = f'{STATS_CACHE_PREFIX}:{name}'
+    try: return await cache.aincr(key)
+    except ValueError: await cache.aset(key, initial, None); return initial
+
+def _generation():
+    return cache.get_or_set(f'{STATS_CACHE_PREFIX}:generation', 1, None)
+
+def invalidate_stats():
+    """Unieważnia wszystkie zapisane statystyki (globalne i per stado) po zatwierdzeniu transakcji."""
+    transaction.on_commit(lambda: _incr('generation', 2))
+
+def _cache_key(generation, today, herd_id):
+    return f"{STATS_CACHE_PREFIX}:{generation}:{today.isoformat()}:{herd_id or 'all'}"
+
+def get_stats(request, herd_id=None):
+    """Zwraca (statystyki, czy_z_cache)."""
+    today = date.today()
+    key = _cache_key(_generation(), today, herd_id)
+    data = cache.get(key)
+    if data is not None: _incr('hits', 1); return data, True
+    _incr('misses', 1)
+    data = compute_stats(request, herd_id=herd_id, today=today)
+    cache.set(key, data, getattr(settings, 'STATS_CACHE_TTL', DEFAULT_STATS_CACHE_TTL))
+    return data, False
+
+async def aget_stats(request, herd_id=None):
+    """To samo co get_stats, przez asynchroniczne API cache i ORM."""
+    today = date.today()
+    key = _cache_key(await cache.aget_or_set(f'{STATS_CACHE_PREFIX}:generation', 1, None), today, herd_id)
+    data = await cache.aget(key)
+    if data is not None: await _aincr('hits', 1); return data, True
+    await _aincr('misses', 1)
+    data = await acompute_stats(request, herd_id=herd_id, today=today)
+    await cache.aset(key, data, getattr(settings, 'STATS_CACHE_TTL', DEFAULT_STATS_CACHE_TTL))
+    return data, False
+
+def stats_cache_info():
+    keys = ['hits', 'misses', 'generation']
+    values = cache.get_many([f'{STATS_CACHE_PREFIX}:{k}' for k in keys])
+    info = {k: values.get(f'{STATS_CACHE_PREFIX}:{k}', 0) for k in keys}
+    info['ttl'] = getattr(settings, 'STATS_CACHE_TTL', DEFAULT_STATS_CACHE_TTL)
+    return info
@@ -0,0 +1,82 @@
+# cows/summaries.py
+
+from decimal import Decimal
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Cow, Herd, HerdSummary
+
+# Liczniki HerdSummary: warunek w SQL (przebudowa) i ten sam w Pythonie (przyrost przy zapisie krowy) - muszą się zgadzać.
+TRACKED_FIELDS = ['herd_id', 'status', 'gender', 'pregnancy_duration', 'is_pregnancy_possible', 'sale_price']
+ACTIVE = Q(status='ACTIVE'); SOLD = Q(status='SOLD')
+COUNTERS = {
+    'total': (Q(), lambda cow: True),
+    'active': (ACTIVE, lambda cow: cow['status'] == 'ACTIVE'),
+    'sold': (SOLD, lambda cow: cow['status'] == 'SOLD'),
+    'archived': (Q(status='ARCHIVED'), lambda cow: cow['status'] == 'ARCHIVED'),
+    'females': (ACTIVE & Q(gender='F'), lambda cow: cow['status'] == 'ACTIVE' and cow['gender'] == 'F'),
+    'males': (ACTIVE & Q(gender='M'), lambda cow: cow['status'] == 'ACTIVE' and cow['gender'] == 'M'),
+    # Kolumny z arkusza ARiMR są tekstowe: cielna = wpisana długość ciąży, "możliwa" = cokolwiek poza pustym/"NIE"
+    'pregnant': (
+        ACTIVE & Q(pregnancy_duration__isnull=False) & ~Q(pregnancy_duration=''),
+        lambda cow: cow['status'] == 'ACTIVE' and bool(cow['pregnancy_duration']),
+    ),
+    'pregnancy_possible': (
+        ACTIVE & Q(is_pregnancy_possible__isnull=False) & ~Q(is_pregnancy_possible='') & ~Q(is_pregnancy_possible__iexact='nie'),
+        lambda cow: cow['status'] == 'ACTIVE' and bool(cow['is_pregnancy_possible']) and cow['is_pregnancy_possible'].lower() != 'nie',
+    ),
+}
+
+
+def contribution(cow):
+    """Wkład jednej krowy (słownik pól TRACKED_FIELDS) w liczniki jej stada."""
+    counts = {name: int(test(cow)) for name, (_, test) in COUNTERS.items()}
+    counts['sales_total'] = Decimal(cow['sale_price'] or 0) if cow['status'] == 'SOLD' else Decimal(0)
+    return counts
+
+def snapshot(cow):
+    return {field: getattr(cow, field) for field in TRACKED_FIELDS}
+
+
+# === ZMIANA PRZYROSTOWA (zapis/usunięcie pojedynczej krowy) ===
+def apply_change(before, after):
+    """before/after: snapshot krowy przed i po zapisie (None - nie istniała). Zmienia tylko różnice,
+    atomowo w bazie (F() + delta), więc równoległe zapisy w tym samym stadzie nie gubią się."""
+    deltas = {}
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None or state['herd_id'] is None: continue
+        herd_delta = deltas.setdefault(state['herd_id'], {})
+        for name, value in contribution(state).items(): herd_delta[name] = herd_delta.get(name, 0) + sign * value
+    now = timezone.now()
+    for herd_id, delta in deltas.items():
+        changes = {name: F(name) + value for name, value in delta.items() if value}
+        if not changes: continue
+        if not HerdSummary.objects.filter(herd_id=herd_id).update(**changes, updated_at=now): rebuild([herd_id])
+
+
+# === PRZEBUDOWA (zapisy zbiorcze, polecenie rebuild_herd_summaries) ===
+def aggregate(herd_ids=None):
+    """{herd_id: {licznik: wartość}} jednym GROUP BY po krowach."""
+    cows = Cow.objects.filter(herd__isnull=False)
+    if herd_ids is not None: cows = cows.filter(herd_id__in=herd_ids)
+    aggregates = {name: Count('id', filter=condition) if condition else Count('id') for name, (condition, _) in COUNTERS.items()}
+    aggregates['sales_total'] = Coalesce(Sum('sale_price', filter=SOLD), Value(0), output_field=DecimalField(max_digits=14, decimal_places=2))
+    return {row.pop('herd_id'): row for row in cows.order_by().values('herd_id').annotate(**aggregates)}
+
+def rebuild(herd_ids=None):
+    """Przelicza podsumowania podanych (albo wszystkich) stad od zera; stada bez krów dostają zera."""
+    herds = Herd.objects.all() if herd_ids is None else Herd.objects.filter(pk__in=herd_ids)
+    rows = aggregate(herd_ids); now = timezone.now()
+    summaries = [HerdSummary(herd_id=herd_id, updated_at=now, **rows.get(herd_id, {})) for herd_id in herds.values_list('id', flat=True)]
+    HerdSummary.objects.bulk_create(summaries, update_conflicts=True, unique_fields=['herd'], update_fields=[*COUNTERS, 'sales_total', 'updated_at'])
+    return len(summaries)
+
+def drift():
+    """Stada, których zapisane liczniki różnią się od policzonych z krów: {herd_id: {licznik: (zapisane, policzone)}}."""
+    rows = aggregate(); fields = [*COUNTERS, 'sales_total']; result = {}
+    stored = {row.pop('herd_id'): row for row in HerdSummary.objects.values('herd_id', *fields)}
+    for herd_id in Herd.objects.values_list('id', flat=True):
+        actual = rows.get(herd_id, {}); saved = stored.get(herd_id, {})
+        diff = {name: (saved.get(name), actual.get(name, 0)) for name in fields if saved.get(name) != actual.get(name, 0)}
+        if diff: result[herd_id] = diff
+    return result
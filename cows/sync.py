@@ -0,0 +1,416 @@
+# cows/sync.py
+
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from .models import Cow, Event, CowDocument, Task, Herd, SyncTombstone, SyncReceipt
+from .signals import bulk_changed
+from .bulk import records_for_cows
+from .serializers import (
+    CowListSerializer, CowCreateUpdateSerializer, EventSerializer, CowDocumentSerializer,
+    TaskSerializer, HerdSerializer
+)
+
+logger = logging.getLogger(__name__)
+
+# === KANAŁ ZMIAN (GET /api/sync/changes/?since=<cursor>) ===
+# Kolejność ma znaczenie dla klienta: stada i krowy przed rekordami, które się do nich odwołują.
+SYNC_FEED = [
+    ('herds', lambda: Herd.objects.all(), HerdSerializer),
+    ('cows', lambda: Cow.objects.select_related('dam', 'sire', 'herd'), CowListSerializer),
+    ('events', lambda: Event.objects.select_related('user'), EventSerializer),
+    ('tasks', lambda: Task.objects.select_related('cow', 'user'), TaskSerializer),
+    ('documents', lambda: CowDocument.objects.select_related('user'), CowDocumentSerializer),
+]
+
+# Zapas czasu na transakcje, które zaczęły się przed wydaniem kursora, a zatwierdziły po nim.
+# Powtórzone rekordy są nieszkodliwe - klient robi bulkPut.
+DEFAULT_CURSOR_OVERLAP = timedelta(seconds=30)
+# Jak długo pamiętamy wyniki zadań (ponowienia po zerwanym połączeniu)
+DEFAULT_RECEIPT_RETENTION = timedelta(days=30)
+RECEIPT_PRUNE_CACHE_KEY = 'cows:sync:receipts-pruned'
+# Jak długo trzymamy ślady usuniętych rekordów. Klient z kursorem starszym niż to okno mógł nie dostać części
+# usunięć, więc zamiast paczki zmian dostaje pełny zrzut (full: true) i odbudowuje lokalną bazę.
+DEFAULT_TOMBSTONE_RETENTION = timedelta(days=90)
+TOMBSTONE_PRUNE_CACHE_KEY = 'cows:sync:tombstones-pruned'
+
+
+def format_cursor(moment):
+    """Kursor to znacznik czasu UTC w ISO 8601 z 'Z' (bez '+', który psuje się w query stringu)."""
+    return moment.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def parse_cursor(value):
+    """Zwraca datetime (aware) albo None, jeśli kursor jest nieprawidłowy."""
+    try: moment = parse_datetime(value.strip().replace(' ', '+'))
+    except ValueError: return None
+    if moment is None: return None
+    if timezone.is_naive(moment): moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def since_param(query_params):
+    """Kursor z ?since= (None - pełny zrzut) albo ValidationError (400)."""
+    since_raw = query_params.get('since')
+    if not since_raw: return None
+    since = parse_cursor(since_raw)
+    if since is None: raise ValidationError({'error': f'Nieprawidłowy kursor: "{since_raw}"'})
+    return since
+
+def tombstone_retention():
+    return getattr(settings, 'SYNC_TOMBSTONE_RETENTION', DEFAULT_TOMBSTONE_RETENTION)
+
+def prune_tombstones():
+    """Usuwa tombstones starsze niż SYNC_TOMBSTONE_RETENTION - najwyżej raz na godzinę, bo wołane przy każdym usunięciu."""
+    if not cache.add(TOMBSTONE_PRUNE_CACHE_KEY, True, 3600): return 0
+    return SyncTombstone.objects.filter(deleted_at__lt=timezone.now() - tombstone_retention()).delete()[0]
+
+def prune_receipts():
+    """Usuwa wyniki starsze niż SYNC_RECEIPT_RETENTION - najwyżej raz na godzinę, bo wołane przy każdym pakiecie."""
+    if not cache.add(RECEIPT_PRUNE_CACHE_KEY, True, 3600): return 0
+    retention = getattr(settings, 'SYNC_RECEIPT_RETENTION', DEFAULT_RECEIPT_RETENTION)
+    return SyncReceipt.objects.filter(created_at__lt=timezone.now() - retention).delete()[0]
+
+def change_feeds(since):
+    """Querysety paczki zmian od kursora `since`: [(nazwa, queryset, serializer)] i tombstones (None = pełny zrzut)."""
+    if since is not None:
+        since = since - getattr(settings, 'SYNC_CURSOR_OVERLAP', DEFAULT_CURSOR_OVERLAP)
+        if since < timezone.now() - tombstone_retention(): since = None # część tombstones z tego okresu już usunięta
+    feeds = []
+    for name, get_queryset, serializer_class in SYNC_FEED:
+        qs = get_queryset()
+        if since is not None: qs = qs.filter(updated_at__gte=since)
+        feeds.append((name, qs.order_by('updated_at', 'pk'), serializer_class))
+    tombstones = None if since is None else SyncTombstone.objects.filter(deleted_at__gte=since).values_list('entity', 'object_id')
+    return feeds, tombstones
+
+def changes_payload(cursor, feeds, rows, tombstones, request):
+    """Odpowiedź kanału zmian z pobranych już wierszy (wspólne dla widoku synchronicznego i async)."""
+    context = {'request': request}
+    changes = {name: serializer_class(rows[name], many=True, context=context).data for name, _, serializer_class in feeds}
+    deleted = {name: [] for name, _, _ in feeds}
+    for entity, object_id in tombstones or (): deleted[entity].append(object_id)
+    return {'cursor': format_cursor(cursor), 'full': tombstones is None, 'changes': changes, 'deleted': deleted}
+
+def build_changes(since, request):
+    """Buduje paczkę zmian od kursora `since` (None = pełny zrzut danych)."""
+    cursor = timezone.now(); feeds, tombstones = change_feeds(since)
+    rows = {name: list(qs) for name, qs, _ in feeds}
+    return changes_payload(cursor, feeds, rows, None if tombstones is None else list(tombstones.iterator()), request)
+
+
+# === WYKONANIE PAKIETU ZADAŃ (POST /api/sync/) ===
+class SyncBatch:
+    """Wykonuje zadania z kolejki offline zbiorczo: grupuje je wg akcji, pobiera powiązane obiekty
+    jednym in_bulk na pole i zapisuje przez bulk_create/bulk_update. Wynik każdego zadania
+    (status, realId, error) oraz mapowanie tempId -> id są takie same jak przy obsłudze pojedynczej.
+    Zapisy idą w savepointach, a wyniki trafiają do rejestru SyncReceipt, więc ponowione
+    (już wykonane) zadania zwracają zapisany wynik z flagą "replayed"."""
+
+    # Kolejność faz: najpierw nowe krowy (pozostałe zadania mogą wskazywać ich tempId).
+    PHASES = [
+        ('createCow', '_create_cows'), ('updateCow', '_update_cows'), ('deleteCow', '_archive_cows'),
+        ('createEvent', '_create_events'), ('bulkCreateEvent', '_bulk_create_events'), ('createTask', '_create_tasks'),
+        ('bulkCreateTask', '_bulk_create_tasks'), ('updateTask', '_update_tasks'), ('deleteTask', '_delete_tasks'),
+        ('deleteDocument', '_delete_documents'),
+    ]
+
+    def __init__(self, jobs, request, device_id=''):
+        self.request = request; self.device_id = str(device_id or '')[:64]
+        self.temp_id_map = {}; self.results = []; self.groups = defaultdict(list); self.pending_receipts = []; self.changed = defaultdict(set); self.previous_herds = set()
+        known_actions = {action for action, _ in self.PHASES}
+        receipts = self._receipts(jobs)
+        for job in jobs:
+            action = job.get('action')
+            result = {"queueId": job.get('id'), "tempId": job.get('tempId'), "entityId": job.get('entityId'), "action": action, "status": "pending"}
+            receipt = receipts.get(self._queue_key(job))
+            if receipt is not None and receipt.fingerprint == self._fingerprint(job):
+                result = {**receipt.result, "replayed": True}; self.results.append(result)
+                if result.get('realId') is not None: self.temp_id_map[result.get('tempId') or result.get('entityId')] = result['realId']
+                continue
+            self.results.append(result)
+            if action in known_actions: self.groups[action].append((job, result))
+            else: self._fail(job, result, Exception(f"Nieznana akcja: {action}"))
+            if self._queue_key(job) is not None: self.pending_receipts.append((job, result))
+
+    def run(self):
+        for action, handler in self.PHASES:
+            if self.groups[action]: getattr(self, handler)(self.groups[action])
+        self._store_receipts()
+        for model, ids in self.changed.items():
+            bulk_changed.send(sender=model, ids=sorted(ids), **({'herd_ids': self.previous_herds} if model is Cow else {}))
+        return self.results
+
+    # --- Rejestr wykonanych zadań (idempotentne ponowienia) ---
+    @staticmethod
+    def _queue_key(job):
+        return str(job['id'])[:64] if job.get('id') is not None else None
+
+    @staticmethod
+    def _fingerprint(job):
+        # queueId z Dexie może się powtórzyć po wyczyszczeniu bazy przeglądarki - porównujemy też treść zadania
+        body = {k: job.get(k) for k in ('action', 'tempId', 'entityId', 'payload')}
+        return hashlib.sha1(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _ledger(self):
+        user = self._author()
+        return SyncReceipt.objects.filter(user=user, device_id=self.device_id) if user is not None else None
+
+    def _receipts(self, jobs):
+        ledger = self._ledger()
+        if ledger is None: return {}
+        prune_receipts()
+        keys = {self._queue_key(job) for job in jobs} - {None}
+        return {r.queue_id: r for r in ledger.filter(queue_id__in=keys)} if keys else {}
+
+    def _store_receipts(self):
+        """Zapamiętuje wyniki udanych zadań (w tej samej transakcji co ich zapis). Błędy nie są
+        zapamiętywane - ponowione zadanie z błędem zostanie wykonane jeszcze raz."""
+        ledger = self._ledger()
+        done = [(job, result) for job, result in self.pending_receipts if result['status'] in ("ok", "merged")]
+        if ledger is None or not done: return
+        ledger.filter(queue_id__in=[self._queue_key(job) for job, _ in done]).delete()
+        SyncReceipt.objects.bulk_create([
+            SyncReceipt(user=self._author(), device_id=self.device_id, queue_id=self._queue_key(job), fingerprint=self._fingerprint(job), result=result)
+            for job, result in done
+        ])
+
+    # --- Pomocnicze ---
+    @staticmethod
+    def _pk(value):
+        if isinstance(value, bool): return None
+        try: return int(value)
+        except (TypeError, ValueError): return None
+
+    def _resolve(self, value):
+        return self._pk(self.temp_id_map.get(value, value))
+
+    def _fail(self, job, result, exc):
+        if isinstance(exc, IntegrityError): logger.warning(f"Błąd walidacji {job}: {str(exc)}"); result.update(status="error", error=f"Błąd walidacji: {str(exc)}")
+        elif isinstance(exc, (Cow.DoesNotExist, CowDocument.DoesNotExist, Task.DoesNotExist)):
+            logger.warning(f"Nie znaleziono obiektu {job}: {str(exc)}"); result.update(status="error", error=str(exc))
+        else: logger.error(f"Błąd przetwarzania zadania {job}: {str(exc)}"); result.update(status="error", error=str(exc))
+
+    def _payload(self, job, *fk_fields):
+        """Kopia payloadu z podmienionymi tempId w polach FK."""
+        payload = dict(job.get('payload') or {}); payload.pop('id', None)
+        for field in fk_fields:
+            if payload.get(field) in self.temp_id_map: payload[field] = self.temp_id_map[payload[field]]
+        return payload
+
+    def _prefetch(self, serializer_class, payloads, field_names):
+        """Jedno in_bulk na pole FK, po querysecie zdefiniowanym w serializerze (te same reguły walidacji)."""
+        fields = serializer_class().fields; prefetched = {}
+        for name in field_names:
+            ids = {self._pk(p.get(name)) for p in payloads} - {None}
+            prefetched[name] = fields[name].queryset.in_bulk(ids) if ids else {}
+        return prefetched
+
+    def _context(self, serializer_class, payloads, field_names, **extra):
+        return {'request': self.request, 'prefetched': self._prefetch(serializer_class, payloads, field_names), **extra}
+
+    def _taken_tag_ids(self, payloads):
+        tags = {str(p['tag_id']).strip() for p in payloads if p.get('tag_id')}
+        return set(Cow.objects.filter(tag_id__in=tags).values_list('tag_id', flat=True)) if tags else set()
+
+    def _author(self):
+        user = getattr(self.request, 'user', None)
+        return user if user is not None and user.is_authenticated else None
+
+    def _load(self, model, entries, merge_temp):
+        """Rozwiązuje entityId zadań i pobiera obiekty jednym in_bulk. Zwraca [(job, result, obj)]."""
+        resolved = []
+        for job, result in entries:
+            real_id = self._resolve(job.get('entityId'))
+            if real_id is not None and real_id < 0 and merge_temp: result.update(status="merged", realId=real_id); continue
+            resolved.append((job, result, real_id))
+        objects = model.objects.in_bulk({real_id for _, _, real_id in resolved} - {None})
+        loaded = []
+        for job, result, real_id in resolved:
+            obj = objects.get(real_id)
+            if obj is None: self._fail(job, result, model.DoesNotExist(f"{model.__name__} matching query does not exist.")); continue
+            loaded.append((job, result, obj))
+        return loaded
+
+    def _validate_updates(self, serializer_class, loaded, payloads, context):
+        """Waliduje kolejne zmiany i nanosi je na obiekty w pamięci. Zwraca ([(job, result, obj)], zmienione pola)."""
+        valid = []; fields = set()
+        for (job, result, obj), payload in zip(loaded, payloads):
+            serializer = serializer_class(obj, data=payload, partial=True, context=context)
+            try: serializer.is_valid(raise_exception=True)
+            except Exception as e: self._fail(job, result, e); continue
+            for field, value in serializer.validated_data.items(): setattr(obj, field, value)
+            fields.update(serializer.validated_data); valid.append((job, result, obj))
+        return valid, fields
+
+    def _existing(self, model, entries):
+        """Zadania usuwające: [(job, result, id)] tylko dla istniejących obiektów (jedno zapytanie)."""
+        ids = []
+        for job, result in entries:
+            real_id = self._resolve(job.get('entityId'))
+            if real_id is not None and real_id > 0: ids.append((job, result, real_id))
+            else: result.update(status="ok", realId=real_id)
+        existing = set(model.objects.filter(id__in=[real_id for _, _, real_id in ids]).values_list('id', flat=True))
+        found = []
+        for job, result, real_id in ids:
+            if real_id in existing: found.append((job, result, real_id))
+            else: self._fail(job, result, model.DoesNotExist(f"{model.__name__} matching query does not exist."))
+        return found
+
+    def _write(self, items, bulk, single, model=None):
+        """Jak _write_items, ale zapamiętuje zmienione rekordy (obiekty albo id obiektów `model`) dla bulk_changed."""
+        written = self._write_items(items, bulk, single)
+        for _, _, obj in written:
+            if isinstance(obj, int): self.changed[model].add(obj)
+            else: self.changed[type(obj)].add(obj.pk)
+        return written
+
+    def _write_items(self, items, bulk, single):
+        """Zapis zbiorczy w savepoincie. Jeśli się nie powiedzie, każde zadanie zapisuje się osobno
+        w swoim savepoincie - błędny rekord nie psuje zewnętrznej transakcji ani reszty pakietu.
+        items: [(job, result, obj)]; zwraca te, które zapisano."""
+        if not items: return []
+        try:
+            with transaction.atomic(): bulk(list({id(obj): obj for _, _, obj in items}.values()))
+            return items
+        except DatabaseError as e:
+            logger.warning(f"Zapis zbiorczy nie powiódł się ({str(e)}), zapisuję zadania pojedynczo")
+        written = []
+        for job, result, obj in items:
+            try:
+                with transaction.atomic(): single(obj)
+                written.append((job, result, obj))
+            except Exception as e: self._fail(job, result, e)
+        return written
+
+    def _insert(self, model, items):
+        def single(obj):
+            obj.pk = None; obj._state.adding = True # pk mógł zostać nadany przez wycofany bulk_create
+            obj.save(force_insert=True)
+        return self._write(items, model.objects.bulk_create, single)
+
+    def _save_changes(self, model, items, fields):
+        if not items or not fields: return items
+        fields = sorted(fields | {'updated_at'}); now = timezone.now()
+        for _, _, obj in items: obj.updated_at = now
+        return self._write(items, lambda objs: model.objects.bulk_update(objs, fields), lambda obj: obj.save(update_fields=fields))
+
+    def _delete(self, model, entries):
+        items = self._existing(model, entries)
+        written = self._write(items, lambda ids: model.objects.filter(id__in=ids).delete(), lambda pk: model.objects.filter(id=pk).delete(), model)
+        for _, result, real_id in written: result.update(status="ok", realId=real_id)
+
+    # --- Krowy ---
+    def _create_cows(self, entries):
+        batch_temp_ids = {job.get('tempId') for job, _ in entries if job.get('tempId') is not None}
+        prepared = []
+        for job, result in entries:
+            payload = self._payload(job, 'dam', 'sire'); links = {}
+            # Rodzic tworzony w tym samym pakiecie - łączymy po wstawieniu (jeszcze nie ma id)
+            for field in ('dam', 'sire'):
+                if payload.get(field) in batch_temp_ids: links[field] = payload[field]; payload[field] = None
+            prepared.append((job, result, payload, links))
+        payloads = [payload for _, _, payload, _ in prepared]
+        context = self._context(CowCreateUpdateSerializer, payloads, ['dam', 'sire', 'herd'], taken_tag_ids=self._taken_tag_ids(payloads))
+        valid = []; links_by_job = {}
+        for job, result, payload, links in prepared:
+            serializer = CowCreateUpdateSerializer(data=payload, context=context)
+            try: serializer.is_valid(raise_exception=True)
+            except Exception as e: self._fail(job, result, e); continue
+            context['taken_tag_ids'].add(serializer.validated_data['tag_id'])
+            valid.append((job, result, Cow(**serializer.validated_data))); links_by_job[id(job)] = links
+        written = self._insert(Cow, valid)
+        for job, result, cow in written:
+            self.temp_id_map[job.get('tempId') or job.get('entityId')] = cow.id; result.update(status="ok", realId=cow.id)
+        linked = []
+        for job, result, cow in written:
+            links = links_by_job[id(job)]
+            for field, temp_id in links.items():
+                if temp_id in self.temp_id_map: setattr(cow, f'{field}_id', self.temp_id_map[temp_id])
+            if links: linked.append((job, result, cow))
+        self._write(linked, lambda cows: Cow.objects.bulk_update(cows, ['dam', 'sire']), lambda cow: cow.save(update_fields=['dam', 'sire']))
+
+    def _update_cows(self, entries):
+        loaded = self._load(Cow, entries, merge_temp=True)
+        self.previous_herds.update(cow.herd_id for _, _, cow in loaded if cow.herd_id) # przed zmianą stada
+        payloads = [self._payload(job, 'dam', 'sire') for job, _, _ in loaded]
+        context = self._context(CowCreateUpdateSerializer, payloads, ['dam', 'sire', 'herd'], taken_tag_ids=self._taken_tag_ids(payloads))
+        valid, fields = self._validate_updates(CowCreateUpdateSerializer, loaded, payloads, context)
+        for job, result, cow in self._save_changes(Cow, valid, fields):
+            self.temp_id_map[job.get('tempId') or job.get('entityId')] = cow.id; result.update(status="ok", realId=cow.id)
+
+    def _archive_cows(self, entries):
+        items = self._existing(Cow, entries)
+        archive = lambda ids: Cow.objects.filter(id__in=ids).update(status='ARCHIVED', updated_at=timezone.now())
+        for _, result, real_id in self._write(items, archive, lambda pk: archive([pk]), Cow):
+            result.update(status="ok", realId=real_id)
+
+    # --- Zdarzenia ---
+    def _create_events(self, entries):
+        payloads = [self._payload(job, 'cow') for job, _ in entries]
+        context = self._context(EventSerializer, payloads, ['cow'])
+        author = self._author(); valid = []
+        for (job, result), payload in zip(entries, payloads):
+            serializer = EventSerializer(data=payload, context=context)
+            try: serializer.is_valid(raise_exception=True)
+            except Exception as e: self._fail(job, result, e); continue
+            valid.append((job, result, Event(**serializer.validated_data, user=author)))
+        for job, result, event in self._insert(Event, valid):
+            self.temp_id_map[job.get('tempId')] = event.id; result.update(status="ok", realId=event.id)
+
+    # --- Zapisy dla wielu krów (sesja szczepień offline = jedno zadanie, patrz cows/bulk.py) ---
+    def _bulk_create(self, model, serializer_class, entries, active_only=False):
+        """payload zadania: {"ids": [...] (także tempId krów z tego pakietu) albo "filter": {...}, "payload": {...}}.
+        Wynik: realIds utworzonych rekordów w kolejności krów."""
+        author = self._author()
+        for job, result in entries:
+            data = dict(job.get('payload') or {}); data.pop('dry_run', None)
+            if isinstance(data.get('ids'), list): data['ids'] = [self.temp_id_map.get(pk, pk) for pk in data['ids']]
+            try:
+                records, summary = records_for_cows(model, serializer_class, data, author, active_only)
+                with transaction.atomic(): records = model.objects.bulk_create(records, batch_size=500)
+            except Exception as e: self._fail(job, result, e); continue
+            real_ids = [record.pk for record in records]; self.changed[model].update(real_ids)
+            result.update(status="ok", realIds=real_ids, matched=summary['matched'])
+
+    def _bulk_create_events(self, entries):
+        self._bulk_create(Event, EventSerializer, entries)
+
+    def _bulk_create_tasks(self, entries):
+        self._bulk_create(Task, TaskSerializer, entries, active_only=True)
+
+    # --- Zadania (kalendarz) ---
+    def _create_tasks(self, entries):
+        payloads = [self._payload(job, 'cow') for job, _ in entries]
+        context = self._context(TaskSerializer, payloads, ['cow'])
+        author = self._author(); valid = []
+        for (job, result), payload in zip(entries, payloads):
+            serializer = TaskSerializer(data=payload, context=context)
+            try: serializer.is_valid(raise_exception=True)
+            except Exception as e: self._fail(job, result, e); continue
+            valid.append((job, result, Task(**serializer.validated_data, user=author)))
+        for job, result, task in self._insert(Task, valid):
+            self.temp_id_map[job.get('tempId')] = task.id; result.update(status="ok", realId=task.id)
+
+    def _update_tasks(self, entries):
+        loaded = self._load(Task, entries, merge_temp=True)
+        payloads = [self._payload(job, 'cow') for job, _, _ in loaded]
+        context = self._context(TaskSerializer, payloads, ['cow'])
+        valid, fields = self._validate_updates(TaskSerializer, loaded, payloads, context)
+        for job, result, task in self._save_changes(Task, valid, fields):
+            result.update(status="ok", realId=task.id)
+
+    def _delete_tasks(self, entries):
+        self._delete(Task, entries)
+
+    # --- Dokumenty ---
+    def _delete_documents(self, entries):
+        self._delete(CowDocument, entries)
@@ -1,3 +1,801 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import pandas as pd
+from PIL import Image
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from . import async_views
+from .exporter import write_workbook
+from .importer import import_workbook
+from .media import resign
+from .jobs import recover_stale_imports, run_import_job, run_thumbnails
+from . import search as search_index, uploads
+from .summaries import drift
+from .recurrence import add_months, generate
+from .models import Cow, CowDocument, DocumentUpload, Event, ImportJob, SyncReceipt, SyncTombstone, Task, TaskRecurrence, Herd, HerdSummary
+from .sync import format_cursor
 
-# Create your tests here.
+
+class QueryCountTestCase(APITestCase):
+    """Sprawdza, że liczba zapytań SQL endpointu nie rośnie razem z liczbą rekordów (brak N+1)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('operator', password='haslo12345')
+        self.client.force_authenticate(self.user)
+        self.herd = Herd.objects.create(name='GÓRNE')
+        self.counter = 0
+
+    def make_cow(self, **kwargs):
+        self.counter += 1
+        dam = Cow.objects.create(tag_id=f'PLD{self.counter:06d}', name=f'Matka {self.counter}', gender='F', herd=self.herd)
+        sire = Cow.objects.create(tag_id=f'PLS{self.counter:06d}', name=f'Ojciec {self.counter}', gender='M')
+        cow = Cow.objects.create(
+            tag_id=f'PL{self.counter:06d}', name=f'Krowa {self.counter}', gender='F', herd=self.herd,
+            dam=dam, sire=sire, birth_date=date(2020, 1, 1), **kwargs
+        )
+        Event.objects.create(cow=cow, date=date.today(), event_type='KONTROLA', user=self.user)
+        Task.objects.create(cow=cow, title='Korekcja racic', due_date=date.today() + timedelta(days=1), user=self.user)
+        return cow
+
+    def count_queries(self, url, params=None):
+        cache.clear() # mierzymy ścieżkę bez cache (np. statystyki)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return len(ctx.captured_queries)
+
+    def assertQueriesDoNotGrow(self, url, params=None, extra_rows=5):
+        self.make_cow()
+        baseline = self.count_queries(url, params)
+        for _ in range(extra_rows): self.make_cow()
+        self.assertEqual(self.count_queries(url, params), baseline, f"{url}: liczba zapytań rośnie z liczbą rekordów")
+        return baseline
+
+
+class MediaTestCase(APITestCase):
+    """Pliki zapisywane w testach trafiają do tymczasowego MEDIA_ROOT, usuwanego po każdym teście."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory(); self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name); settings_override.enable(); self.addCleanup(settings_override.disable)
+
+
+class CowEndpointQueryTests(QueryCountTestCase):
+    def test_cow_list(self):
+        self.assertEqual(self.assertQueriesDoNotGrow('/api/cows/'), 1)
+
+    def test_cow_detail(self):
+        cow = self.make_cow()
+        self.assertEqual(self.count_queries(f'/api/cows/{cow.id}/'), 1)
+
+    def test_cow_search_by_tag(self):
+        cow = self.make_cow()
+        self.assertEqual(self.count_queries('/api/cows/search/', {'tag_id': cow.tag_id}), 1)
+
+    def test_stats(self):
+        self.assertQueriesDoNotGrow('/api/cows/stats/')
+
+    def test_sync_changes(self):
+        self.assertQueriesDoNotGrow('/api/sync/changes/')
+
+
+class EventTaskEndpointQueryTests(QueryCountTestCase):
+    def test_event_list(self):
+        self.assertQueriesDoNotGrow('/api/events/')
+
+    def test_task_list(self):
+        self.assertQueriesDoNotGrow('/api/tasks/')
+
+
+class StatsCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+
+    def test_second_request_is_served_from_cache(self):
+        Cow.objects.create(tag_id='PL000001', name='Krowa', gender='F')
+        self.assertEqual(self.client.get('/api/cows/stats/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/cows/stats/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['total_active'], 1)
+
+    def test_cow_change_invalidates_cache(self):
+        self.client.get('/api/cows/stats/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Cow.objects.create(tag_id='PL000002', name='Krowa', gender='M')
+        response = self.client.get('/api/cows/stats/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['total_active'], 1)
+
+
+class PedigreeTests(QueryCountTestCase):
+    def make_line(self, generations):
+        """Linia matka -> córka przez kilka pokoleń; zwraca krowy od najstarszej."""
+        line = []
+        for n in range(generations):
+            line.append(Cow.objects.create(tag_id=f'PLP{n:04d}', name=f'Pokolenie {n}', gender='F', dam=line[-1] if line else None))
+        return line
+
+    def test_deep_tree_in_one_query(self):
+        line = self.make_line(7); root = line[3]
+        self.assertEqual(self.count_queries(f'/api/cows/{root.id}/pedigree/', {'depth': 5}), 2) # krowa + CTE
+        data = self.client.get(f'/api/cows/{root.id}/pedigree/', {'depth': 5}).data
+        self.assertEqual({n['id']: n['generation'] for n in data['nodes']}, {cow.id: i - 3 for i, cow in enumerate(line)})
+        self.assertEqual(len(data['edges']), 6)
+        self.assertFalse(data['cycle'])
+
+    def test_cycle_is_reported(self):
+        line = self.make_line(3)
+        Cow.objects.filter(pk=line[0].pk).update(dam=line[2]) # zły import: praprzodek jest własnym potomkiem
+        data = self.client.get(f'/api/cows/{line[1].id}/pedigree/', {'depth': 10}).data
+        self.assertTrue(data['cycle'])
+        self.assertEqual(len(data['nodes']), 3)
+
+
+class InbreedingTests(APITestCase):
+    def setUp(self):
+        cache.clear() # nowa generacja rodowodu - graf z poprzednich testów nie jest używany
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+        self.sire = Cow.objects.create(tag_id='PLS0001', name='Byk', gender='M')
+        self.daughters = [
+            Cow.objects.create(tag_id=f'PLC000{n}', name=f'Córka {n}', gender='F', sire=self.sire,
+                               dam=Cow.objects.create(tag_id=f'PLD000{n}', name=f'Matka {n}', gender='F'))
+            for n in range(2)
+        ]
+
+    def test_half_sibs_mating_check(self):
+        response = self.client.post('/api/cows/mating-check/', {'dam': self.daughters[0].id, 'sire': self.daughters[1].id}, format='json')
+        self.assertEqual(response.data['results'][0]['offspring_inbreeding'], 0.125)
+        self.assertTrue(response.data['results'][0]['warning'])
+
+    def test_parent_change_updates_graph_incrementally(self):
+        self.assertEqual(self.client.get(f'/api/cows/{self.daughters[1].id}/inbreeding/').data['inbreeding'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            calf = Cow.objects.create(tag_id='PLK0001', name='Cielę', gender='F', dam=self.daughters[0], sire=self.sire)
+        with self.assertNumQueries(1): # tylko sama krowa - graf nie jest przebudowywany
+            self.assertEqual(self.client.get(f'/api/cows/{calf.id}/inbreeding/').data['inbreeding'], 0.25)
+
+
+class KeysetPaginationTests(QueryCountTestCase):
+    def collect(self, url, params):
+        items = []; pages = 0
+        while url:
+            response = self.client.get(url, params); params = None; pages += 1
+            items += response.data['results']; url = response.data['next']
+        return items, pages
+
+    def test_events_pages_cover_all_rows_once(self):
+        cow = self.make_cow()
+        for n in range(6): Event.objects.create(cow=cow, date=date(2024, 1, 1 + n % 2), event_type='KONTROLA')
+        events, pages = self.collect('/api/events/', {'page_size': 3})
+        self.assertEqual(pages, 3)
+        self.assertEqual(len({e['id'] for e in events}), 7)
+        self.assertEqual([e['date'] for e in events], sorted((e['date'] for e in events), reverse=True))
+
+    def test_cows_paginated_only_on_request_with_sparse_fields(self):
+        for _ in range(2): self.make_cow()
+        self.assertEqual(len(self.client.get('/api/cows/').data), 6)
+        cows, pages = self.collect('/api/cows/', {'page_size': 4, 'fields': 'id,tag_id'})
+        self.assertEqual(pages, 2)
+        self.assertEqual([c['tag_id'] for c in cows], sorted(c['tag_id'] for c in cows))
+        self.assertEqual(set(cows[0]), {'id', 'tag_id'})
+
+    def test_cows_ordered_by_nullable_and_annotated_fields(self):
+        other_herd = Herd.objects.create(name='DOLNE')
+        for n, (birth, herd) in enumerate([(date(2019, 5, 1), self.herd), (None, None), (date(2021, 2, 1), other_herd), (None, self.herd),
+                                           (date(2019, 5, 1), None), (date(2015, 1, 1), other_herd), (None, other_herd)]):
+            Cow.objects.create(tag_id=f'PL1{n:05d}', name=f'Krowa {n}', gender='F', birth_date=birth, herd=herd)
+        everything = list(Cow.objects.with_age().values('id', 'birth_date', 'herd_id', 'age'))
+        for ordering, key in [('age', 'age'), ('-age', 'age'), ('birth_date', 'birth_date'), ('-birth_date', 'birth_date'), ('herd', 'herd_id'), ('-herd', 'herd_id')]:
+            cows, pages = self.collect('/api/cows/', {'page_size': 2, 'ordering': ordering, 'fields': 'id'})
+            self.assertEqual(pages, 4, ordering)
+            rows = {row['id']: row for row in everything}; ids = [c['id'] for c in cows]
+            self.assertEqual(sorted(ids), sorted(rows), ordering) # każda krowa dokładnie raz
+            values = [rows[pk][key] for pk in ids]; present = [v for v in values if v is not None]
+            self.assertEqual(values, present + [None] * (len(values) - len(present)), ordering) # NULL na końcu
+            self.assertEqual(present, sorted(present, reverse=ordering.startswith('-')), ordering)
+
+    def test_users_keep_username_order(self):
+        self.user.is_staff = True; self.user.save()
+        for name in ('zenon', 'adam', 'marta', 'bogdan'): User.objects.create_user(name, password='haslo12345')
+        users, pages = self.collect('/api/users/', {'page_size': 2})
+        self.assertEqual(pages, 3)
+        self.assertEqual([u['username'] for u in users], ['adam', 'bogdan', 'marta', 'operator', 'zenon'])
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+        self.cow = Cow.objects.create(tag_id='PL005123456789', name='Krasula', gender='F')
+        Cow.objects.create(tag_id='PL009999999999', name='Mućka', gender='F')
+        Task.objects.create(cow=self.cow, title='Szczepienie', due_date=date.today())
+
+    def test_prefix_on_tag_number_and_name(self):
+        for query in ['PL00512', '0051234', 'kras']:
+            results = self.client.get('/api/search/', {'q': query, 'types': 'cow'}).data['results']
+            self.assertEqual([r['id'] for r in results], [self.cow.id], query)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'mucka'}).data['results'][0]['title'], 'PL009999999999 - Mućka')
+
+    def test_rename_reindexes_tasks_and_list_search(self):
+        self.cow.name = 'Malina'; self.cow.save()
+        results = self.client.get('/api/search/', {'q': 'malina szczep'}).data['results']
+        self.assertEqual([(r['type'], r['cow_id']) for r in results], [('task', self.cow.id)])
+        self.assertEqual([c['id'] for c in self.client.get('/api/cows/', {'search': 'mal'}).data], [self.cow.id])
+
+    def test_best_match_survives_many_newer_hits(self):
+        other = Cow.objects.get(tag_id='PL009999999999')
+        Event.objects.bulk_create([Event(cow=other, date=date(2024, 1, 1), event_type='INNE', notes=f'Obok stała Krasula ({n})') for n in range(250)])
+        search_index.reindex('event')
+        results = self.client.get('/api/search/', {'q': 'Krasula'}).data['results']
+        self.assertEqual((len(results), results[0]['type'], results[0]['id']), (20, 'cow', self.cow.id))
+        results = self.client.get('/api/search/', {'q': '005123'}).data['results'] # numer krowy - też spoza najnowszych trafień
+        self.assertEqual((results[0]['type'], results[0]['id']), ('cow', self.cow.id))
+
+
+class TagLookupTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+        self.cow = Cow.objects.create(tag_id='PL005123456789', name='Krasula', gender='F')
+
+    def test_any_tag_format_hits_cache_until_cow_changes(self):
+        self.assertEqual(self.client.get('/api/cows/search/', {'tag_id': 'pl 0051-2345 6789'})['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/cows/search/', {'tag_id': '616005123456789'})
+        self.assertEqual((response['X-Cache'], response.data['id']), ('HIT', self.cow.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cow.name = 'Malina'; self.cow.save()
+        response = self.client.get('/api/cows/search/', {'tag_id': '005123456789'})
+        self.assertEqual((response['X-Cache'], response.data['name']), ('MISS', 'Malina'))
+
+    def test_batch_lookup_in_one_query(self):
+        other = Cow.objects.create(tag_id='PL009999999999', name='Mućka', gender='F')
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/cows/lookup/', {'tags': ['PL005123456789', '009999999999', 'PL000']}, format='json')
+        self.assertEqual(response.data['results']['009999999999']['id'], other.id)
+        self.assertEqual(response.data['missing'], ['PL000'])
+
+
+class AsyncViewTests(QueryCountTestCase):
+    def call(self, view, url, params=None, token=None, **kwargs):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return async_to_sync(view)(AsyncRequestFactory().get(url, params or {}, headers=headers), **kwargs)
+
+    @staticmethod
+    def comparable(data):
+        # kursor i czas wyszukiwania zależą od chwili wywołania
+        return {k: v for k, v in data.items() if k not in ('cursor', 'took_ms')} if isinstance(data, dict) else data
+
+    def test_async_views_match_drf(self):
+        cow = self.make_cow(); token = str(AccessToken.for_user(self.user))
+        for view, url, params, kwargs in [
+            (async_views.cow_list, '/api/cows/', {}, {}),
+            (async_views.cow_list, '/api/cows/', {'page_size': 2, 'fields': 'id,tag_id', 'status': 'ACTIVE'}, {}),
+            (async_views.cow_stats, '/api/cows/stats/', {}, {}),
+            (async_views.cow_pedigree, f'/api/cows/{cow.id}/pedigree/', {'depth': 2}, {'pk': cow.id}),
+            (async_views.search_view, '/api/search/', {'q': 'krowa'}, {}),
+            (async_views.sync_changes, '/api/sync/changes/', {}, {}),
+        ]:
+            response = self.call(view, url, params, token, **kwargs)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(self.comparable(json.loads(response.content)), self.comparable(self.client.get(url, params).json()), url)
+
+    def test_errors_and_authentication(self):
+        self.assertEqual(self.call(async_views.cow_list, '/api/cows/').status_code, 401)
+        response = self.call(async_views.sync_changes, '/api/sync/changes/', {'since': 'wczoraj'}, str(AccessToken.for_user(self.user)))
+        self.assertEqual((response.status_code, json.loads(response.content)), (400, {'error': 'Nieprawidłowy kursor: "wczoraj"'}))
+
+
+class PhotoThumbnailTests(MediaTestCase):
+    def test_upload_generates_thumbnails_without_exif(self):
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+        cow = Cow.objects.create(tag_id='PL000001', name='Krasula', gender='F')
+        exif = Image.Exif(); exif[0x0112] = 6 # orientacja: obrót o 90 stopni (zdjęcie z telefonu w pionie)
+        buffer = io.BytesIO(); Image.new('RGB', (1200, 800), 'brown').save(buffer, 'JPEG', exif=exif)
+        self.client.post(f'/api/cows/{cow.id}/upload_photo/', {'photo': SimpleUploadedFile('krowa.jpg', buffer.getvalue())})
+        with mock.patch('cows.signals.invalidate_pedigree') as invalidate, mock.patch('cows.signals.invalidate_tag_lookup') as lookup, CaptureQueriesContext(connection) as ctx:
+            run_thumbnails(cow.id, Cow.objects.get(pk=cow.id).photo.name)
+        self.assertEqual((invalidate.called, lookup.called), (False, True))
+        self.assertFalse([q for q in ctx.captured_queries if 'cows_herdsummary' in q['sql'] or 'cows_searchentry' in q['sql']])
+        cow.refresh_from_db()
+        self.assertEqual(sorted(cow.photo_thumbs, key=int), ['160', '320', '640'])
+        with default_storage.open(cow.photo_thumbs['320']['webp']) as file, Image.open(file) as thumb, Image.open(cow.photo.path) as original:
+            self.assertEqual(thumb.size, (320, 480))
+            self.assertEqual((dict(thumb.getexif()), dict(original.getexif())), ({}, {}))
+        row = self.client.get('/api/cows/').data[0]
+        self.assertTrue(row['photo_thumb'].endswith('_320.jpg'))
+        self.assertEqual(row['photo_srcset'].count('.webp'), 3)
+
+
+class ChunkedUploadTests(MediaTestCase):
+    def test_resumed_upload_creates_document(self):
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+        cow = Cow.objects.create(tag_id='PL000001', name='Krasula', gender='F')
+        content = bytes(range(256)) * 40
+        upload = self.client.post('/api/documents/uploads/', {'cow': cow.id, 'title': 'Paszport', 'filename': 'paszport.pdf', 'size': len(content)}, format='json').data
+        url = f"/api/documents/uploads/{upload['id']}/"
+        put = lambda offset, data: self.client.generic('PUT', url + 'chunk/', data, content_type='application/octet-stream', headers={'Upload-Offset': str(offset)})
+        self.assertEqual(put(0, content[:4000]).data['offset'], 4000)
+        stale = put(0, content[:4000]) # ponowiony kawałek po zgubionej odpowiedzi
+        self.assertEqual((stale.status_code, stale.data['offset']), (409, 4000))
+        self.assertEqual(self.client.get(url).data['offset'], 4000)
+        put(4000, content[4000:])
+        missing = self.client.post(url + 'finalize/', {}, format='json') # brak sumy nie kasuje kompletnego pliku
+        self.assertEqual((missing.status_code, self.client.get(url).data['offset']), (400, len(content)))
+        response = self.client.post(url + 'finalize/', {'sha256': hashlib.sha256(content).hexdigest()}, format='json')
+        self.assertEqual(response.status_code, 201)
+        with CowDocument.objects.get(pk=response.data['id']).file.open('rb') as file: self.assertEqual(file.read(), content)
+        again = self.client.post(url + 'finalize/', {'sha256': 'x'}, format='json')
+        self.assertEqual((again.status_code, again.data['id']), (200, response.data['id']))
+        # Równoległa finalizacja, która przegrała wyścig o plik części, zwraca dokument zwycięzcy
+        with mock.patch('cows.uploads._finish_locked', side_effect=FileNotFoundError):
+            document, created = uploads.finish(DocumentUpload.objects.get(pk=upload['id']), 'x')
+        self.assertEqual((document.pk, created), (response.data['id'], False))
+
+    def test_checksum_mismatch_restarts_upload(self):
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+        cow = Cow.objects.create(tag_id='PL000001', name='Krasula', gender='F')
+        upload = self.client.post('/api/documents/uploads/', {'cow': cow.id, 'filename': 'skan.pdf', 'size': 10}, format='json').data
+        url = f"/api/documents/uploads/{upload['id']}/"
+        self.client.generic('PUT', url + 'chunk/', b'0123456789', content_type='application/octet-stream', headers={'Upload-Offset': '0'})
+        response = self.client.post(url + 'finalize/', {'sha256': hashlib.sha256(b'inne bajty').hexdigest()}, format='json')
+        self.assertEqual((response.status_code, int(response.data['offset']), self.client.get(url).data['offset']), (400, 0, 0))
+
+
+class ProtectedMediaTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.name = default_storage.save('documents/paszport.pdf', io.BytesIO(bytes(range(256)) * 4))
+        self.user = User.objects.create_user('operator', password='haslo12345')
+        self.cow = Cow.objects.create(tag_id='PL000001', name='Krasula', gender='F')
+        CowDocument.objects.create(cow=self.cow, title='Paszport', file=self.name)
+
+    def file_url(self, user):
+        self.client.force_authenticate(user)
+        url = self.client.get('/api/documents/', {'cow': self.cow.id}).data['results'][0]['file_url']
+        self.client.force_authenticate(None); return url
+
+    def test_signed_url_supports_conditional_and_range_requests(self):
+        url = self.file_url(self.user) # bez nagłówka Authorization - uprawnieniem jest podpis
+        response = self.client.get(url)
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, bytes(range(256)) * 4))
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+        partial = self.client.get(url, headers={'Range': 'bytes=1020-'})
+        self.assertEqual((partial.status_code, partial['Content-Range'], b''.join(partial.streaming_content)), (206, 'bytes 1020-1023/1024', bytes(range(252, 256))))
+        self.assertEqual(self.client.get(url, headers={'Range': 'bytes=5000-'}).status_code, 416)
+        self.assertEqual(self.client.get(url.replace('paszport', 'inny')).status_code, 404)
+        with override_settings(MEDIA_SERVER='nginx'):
+            self.assertEqual(self.client.get(url)['X-Accel-Redirect'], '/protected-media/documents/paszport.pdf')
+
+    def test_url_is_bound_to_an_active_user(self):
+        url = self.file_url(self.user); other = User.objects.create_user('pomocnik', password='haslo12345')
+        self.assertEqual(self.client.get(url.replace(f'/media/{self.user.id}/', f'/media/{other.id}/')).status_code, 404)
+        self.assertEqual(self.client.get(self.file_url(other)).status_code, 200)
+        self.assertEqual(resign(url), default_storage.url(self.name)) # karty skanera z cache podpisywane dla każdego od nowa
+        self.assertEqual(self.client.get(default_storage.url(self.name)).status_code, 404) # poza żądaniem - bez użytkownika
+        self.user.is_active = False; self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class GrowthTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+        self.herd = Herd.objects.create(name='GÓRNE')
+        self.cows = [Cow.objects.create(tag_id=f'PL00512345678{i}', name=f'Krowa {i}', gender='F', herd=self.herd) for i in range(3)]
+
+    def test_bulk_weights_materialize_gains_and_herd_summary(self):
+        today = date.today(); measurements = []
+        for i, cow in enumerate(self.cows):
+            for days_ago, weight in ((40, 300), (20, 320 + 10 * i), (0, 340 + 20 * i)):
+                measurements.append({'tag': f'pl 0051 2345 678{i}', 'date': (today - timedelta(days=days_ago)).isoformat(), 'weight': weight})
+        measurements.append({'tag': 'PL999', 'weight': 100})
+        response = self.client.post('/api/cows/weights/', {'measurements': measurements, 'source': 'SCALE'}, format='json')
+        self.assertEqual((response.data['saved'], len(response.data['errors'])), (9, 1))
+        growth = self.client.get(f'/api/cows/{self.cows[1].id}/growth/').data
+        self.assertEqual([m['daily_gain'] for m in growth['measurements']], [None, 1.5, 1.5])
+        self.assertEqual((growth['weight'], growth['weight_date'], growth['daily_weight_gain']), (360, today, 1.5))
+        summary = self.client.get(f'/api/herds/{self.herd.id}/growth-summary/').data
+        self.assertEqual((summary['animals'], summary['daily_gain']['percentiles']['p50']), (3, 1.5))
+        # WAGA zmieniona w formularzu to dzisiejsze ważenie (nadpisuje dzisiejsze z wagi)
+        self.client.patch(f'/api/cows/{self.cows[0].id}/', {'weight': 350}, format='json')
+        self.assertEqual(self.client.get(f'/api/cows/{self.cows[0].id}/growth/').data['measurements'][-1]['weight'], 350)
+
+    def test_weight_change_does_not_fan_out(self):
+        cow = self.cows[0]
+        with mock.patch('cows.signals.invalidate_pedigree') as invalidate, CaptureQueriesContext(connection) as ctx:
+            cow.weight = 310; cow.save()
+        self.assertFalse(invalidate.called)
+        self.assertFalse([q for q in ctx.captured_queries if 'cows_herdsummary' in q['sql']]) # bez przebudowy podsumowań stad
+        self.assertEqual(Cow.objects.get(pk=cow.pk).weight_date, date.today())
+
+
+class HerdSummaryTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+
+    def test_summary_follows_cow_changes_without_scanning_cows(self):
+        upper, lower = Herd.objects.create(name='GÓRNE'), Herd.objects.create(name='DOLNE')
+        cows = [Cow.objects.create(tag_id=f'PL{i:06d}', name=f'Krowa {i}', gender='F', herd=upper, pregnancy_duration='5 mies.' if i < 2 else '') for i in range(4)]
+        cows[0].herd = lower; cows[0].save() # przeniesienie razem z ciążą
+        cows[1].status = 'SOLD'; cows[1].sale_price = '4200.50'; cows[1].save(update_fields=['status', 'sale_price'])
+        cows[2].delete()
+        Cow.objects.filter(pk=cows[3].pk).update(gender='M') # z pominięciem sygnałów - naprawi przebudowa
+        self.assertEqual(list(drift()), [upper.id])
+        with CaptureQueriesContext(connection) as ctx: rows = self.client.get('/api/herds/', {'with_summary': 1}).data
+        self.assertEqual(len(ctx.captured_queries), 2) # stada bez podsumowania + lista z JOIN
+        summary = {row['name']: row['summary'] for row in rows}
+        self.assertEqual((summary['DOLNE']['active'], summary['DOLNE']['pregnant']), (1, 1))
+        self.assertEqual((summary['GÓRNE']['total'], summary['GÓRNE']['sold'], summary['GÓRNE']['sales_total']), (2, 1, '4200.50'))
+        call_command('rebuild_herd_summaries', stdout=io.StringIO())
+        self.assertEqual((drift(), HerdSummary.objects.get(herd=upper).males), ({}, 1))
+
+    def test_bulk_moves_rebuild_only_affected_herds(self):
+        upper, lower, other = (Herd.objects.create(name=name) for name in ('GÓRNE', 'DOLNE', 'INNE'))
+        cows = [Cow.objects.create(tag_id=f'PL{i:06d}', name=f'Krowa {i}', gender='F', herd=upper) for i in range(3)]
+        HerdSummary.objects.filter(herd=other).update(total=99) # celowa rozbieżność - nie powinna zostać naprawiona
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/api/cows/bulk/', {'ids': [cows[0].id, cows[1].id], 'patch': {'herd': lower.id}, 'event': False}, format='json')
+        aggregate = [q['sql'] for q in ctx.captured_queries if 'GROUP BY' in q['sql'] and 'cows_cow' in q['sql']]
+        self.assertEqual(len(aggregate), 1); self.assertIn('IN', aggregate[0])
+        jobs = [{'id': 1, 'action': 'updateCow', 'entityId': cows[2].id, 'payload': {'herd': lower.id}}]
+        self.client.post('/api/sync/', {'jobs': jobs}, format='json')
+        self.assertEqual(list(drift()), [other.id])
+        self.assertEqual((HerdSummary.objects.get(herd=upper).total, HerdSummary.objects.get(herd=lower).total), (0, 3))
+        with CaptureQueriesContext(connection) as ctx: # tylko pola spoza liczników - bez przebudowy
+            self.client.post('/api/cows/bulk/', {'ids': [cows[0].id], 'patch': {'relocation_status': 'X'}, 'event': False}, format='json')
+        self.assertFalse([q for q in ctx.captured_queries if 'cows_herdsummary' in q['sql']])
+
+
+class BulkCowTests(QueryCountTestCase):
+    def test_bulk_sale_updates_cows_and_adds_events_in_constant_queries(self):
+        cows = [self.make_cow() for _ in range(3)]
+        lower = Herd.objects.create(name='DOLNE')
+        payload = {'filter': {'herd': self.herd.id, 'gender': 'F'}, 'ids': [c.id for c in cows], 'patch': {'status': 'SOLD', 'sale_price': '3100.00', 'exit_date': str(date.today()), 'herd': lower.id}}
+        self.assertEqual(self.client.post('/api/cows/bulk/', {**payload, 'dry_run': True}, format='json').data['updated'], 0)
+        with CaptureQueriesContext(connection) as small: self.client.post('/api/cows/bulk/', payload, format='json')
+        more = [self.make_cow() for _ in range(5)]
+        payload['ids'] = [c.id for c in more]
+        with CaptureQueriesContext(connection) as large: response = self.client.post('/api/cows/bulk/', payload, format='json')
+        self.assertEqual((response.data['matched'], response.data['updated'], response.data['events']), (5, 5, 5))
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries)) # liczba zapytań nie zależy od liczby krów
+        self.assertEqual(Cow.objects.filter(herd=lower, status='SOLD').count(), 8)
+        self.assertIn('Sprzedana', Event.objects.filter(cow=more[0]).latest('created_at').notes)
+        response = self.client.post('/api/cows/bulk/', {'ids': [cows[0].id], 'patch': {'status': 'ARCHIVED'}, 'event': False}, format='json')
+        self.assertEqual((response.data['updated'], response.data['events']), (1, 0))
+        self.assertEqual(self.client.post('/api/cows/bulk/', {'patch': {'tag_id': 'X'}, 'ids': [1]}, format='json').status_code, 400)
+
+
+class BulkEventTaskTests(QueryCountTestCase):
+    def test_herd_vaccination_and_follow_up_tasks(self):
+        cows = [self.make_cow() for _ in range(3)]; sold = self.make_cow(status='SOLD')
+        vaccination = {'filter': {'herd': self.herd.id, 'gender': 'F'}, 'payload': {'event_type': 'SZCZEPIENIE', 'date': str(date.today()), 'notes': 'IBR'}}
+        with CaptureQueriesContext(connection) as small: response = self.client.post('/api/events/bulk/', vaccination, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], Cow.objects.filter(herd=self.herd, gender='F').count())
+        for _ in range(5): self.make_cow()
+        with CaptureQueriesContext(connection) as large: self.client.post('/api/events/bulk/', vaccination, format='json')
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        follow_up = {'ids': [cow.id for cow in cows] + [sold.id], 'payload': {'title': 'Dawka przypominająca', 'task_type': 'SZCZEPIENIE', 'due_date': str(date.today() + timedelta(days=21))}}
+        response = self.client.post('/api/tasks/bulk/', follow_up, format='json')
+        self.assertEqual(sorted(Task.objects.filter(pk__in=response.data['created_ids']).values_list('cow_id', flat=True)), [cow.id for cow in cows]) # bez sprzedanej
+        self.assertEqual(self.client.post('/api/tasks/bulk/', {**follow_up, 'payload': {'task_type': 'SZCZEPIENIE'}}, format='json').status_code, 400)
+
+    def test_offline_session_is_one_sync_job(self):
+        cow = self.make_cow()
+        jobs = [
+            {'id': 1, 'action': 'createCow', 'tempId': -5, 'payload': {'tag_id': 'PL000777', 'name': 'Nowa', 'gender': 'F'}},
+            {'id': 2, 'action': 'bulkCreateEvent', 'payload': {'ids': [cow.id, -5], 'payload': {'event_type': 'SZCZEPIENIE', 'date': str(date.today())}}},
+        ]
+        response = self.client.post('/api/sync/', {'jobs': jobs, 'deviceId': 'tablet'}, format='json')
+        result = response.data['results'][1]
+        self.assertEqual((result['status'], len(result['realIds'])), ('ok', 2), result)
+        self.assertEqual(Event.objects.filter(event_type='SZCZEPIENIE', cow__tag_id='PL000777').count(), 1)
+        replay = self.client.post('/api/sync/', {'jobs': jobs, 'deviceId': 'tablet'}, format='json').data['results'][1]
+        self.assertTrue(replay['replayed']); self.assertEqual(Event.objects.filter(event_type='SZCZEPIENIE').count(), 2)
+
+
+
+class RecurringTaskTests(QueryCountTestCase):
+    def test_rule_materializes_occurrences_for_calendar(self):
+        cow = self.make_cow(); today = date.today()
+        response = self.client.post('/api/task-recurrences/', {'cow': cow.id, 'title': 'Korekcja racic', 'task_type': 'PIELĘGNACJA', 'frequency': 'WEEKLY', 'interval': 2, 'start_date': str(today)}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        rule = TaskRecurrence.objects.get(); occurrences = list(rule.occurrences.values_list('due_date', flat=True))
+        self.assertEqual(occurrences, [today + timedelta(days=14 * n) for n in range(len(occurrences))])
+        self.assertEqual(occurrences[-1], today + timedelta(days=(90 // 14) * 14))
+        self.assertEqual(generate(), 0) # horyzont już pokryty - nic nie dubluje
+        self.assertEqual(generate(today + timedelta(days=14)), 1) # przesunięty horyzont dokłada tylko nowe terminy
+        params = {'from': str(today), 'to': str(today + timedelta(days=30))}
+        with CaptureQueriesContext(connection) as ctx: response = self.client.get('/api/tasks/calendar/', params)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'cows_task' in q['sql']]), 1)
+        self.assertEqual([t['due_date'] for t in response.data['tasks'] if t['recurrence'] == rule.id], [str(d) for d in occurrences if d <= today + timedelta(days=30)])
+        self.assertEqual(self.client.get('/api/tasks/calendar/', {'from': str(today), 'to': str(today - timedelta(days=1))}).status_code, 400)
+        self.client.patch(f'/api/task-recurrences/{rule.id}/', {'frequency': 'MONTHLY', 'interval': 1}, format='json')
+        self.assertEqual(rule.occurrences.filter(due_date__gt=today).first().due_date, add_months(today, 1))
+        self.client.delete(f'/api/task-recurrences/{rule.id}/')
+        self.assertEqual(Task.objects.filter(title='Korekcja racic').count(), 1) # zostało tylko zadanie z make_cow
+
+    def test_month_end_and_event_follow_ups(self):
+        self.assertEqual(add_months(date(2024, 1, 31), 1), date(2024, 2, 29))
+        cow = self.make_cow()
+        self.client.post('/api/events/', {'cow': cow.id, 'event_type': 'WYCIELENIE', 'date': str(date.today())}, format='json')
+        self.assertEqual(sorted(cow.tasks.exclude(source_event=None).values_list('title', 'due_date')), [
+            ('Badanie cielęcia', date.today() + timedelta(days=30)), ('Kontrola po wycieleniu', date.today() + timedelta(days=14)),
+        ])
+        self.client.post('/api/events/', {'cow': cow.id, 'event_type': 'WYCIELENIE', 'date': str(date.today() - timedelta(days=365))}, format='json')
+        self.assertEqual(cow.tasks.exclude(source_event=None).count(), 2) # stara historia nie tworzy zaległych zadań
+
+
+class ExportRoundTripTests(APITestCase):
+    def test_export_then_import_keeps_herds_and_values(self):
+        north, north_dup = Herd.objects.create(name='Stado Północ'), Herd.objects.create(name='Stado_Północ') # ten sam tytuł arkusza
+        dam = Cow.objects.create(tag_id='PL000001', name='Matka', gender='F', herd=north, birth_date=date(2018, 3, 1))
+        Cow.objects.create(tag_id='PL000002', name='Córka', gender='F', herd=north, dam=dam, status='SOLD', sale_price='3100.00', weight=420.5)
+        Cow.objects.create(tag_id='PL000003', name='Byk', gender='M', herd=north_dup)
+        Cow.objects.create(tag_id='PL000004', name='Bez stada', gender='F')
+        Cow.objects.create(tag_id='PL000005', name='Inna', gender='F', herd=north, status='OTHER')
+        Cow.objects.create(tag_id='PL000006', name='Padła', gender='F', herd=north, status='ARCHIVED')
+        before = list(Cow.objects.order_by('tag_id').values_list('tag_id', 'name', 'gender', 'status', 'herd_id', 'dam_id', 'birth_date', 'sale_price', 'weight'))
+        with write_workbook(Cow.objects.all()) as workbook: summary = import_workbook(workbook)
+        self.assertEqual((summary['created'], summary['updated'], summary['errors']), (0, 6, []))
+        self.assertEqual(Herd.objects.count(), 2)
+        self.assertEqual(list(Cow.objects.order_by('tag_id').values_list('tag_id', 'name', 'gender', 'status', 'herd_id', 'dam_id', 'birth_date', 'sale_price', 'weight')), before)
+
+    def test_sheet_name_matches_existing_herd_case_insensitively(self):
+        herd = Herd.objects.create(name='Południe')
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer) as writer: pd.DataFrame({'NR ARIMR': ['PL000009'], 'PŁEĆ': ['SAMICA']}).to_excel(writer, sheet_name='POŁUDNIE', index=False)
+        buffer.seek(0); import_workbook(buffer)
+        self.assertEqual((Herd.objects.count(), Cow.objects.get(tag_id='PL000009').herd_id), (1, herd.id))
+
+
+class ImportJobTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+
+    def make_job(self, content=None, **kwargs):
+        if content is None:
+            buffer = io.BytesIO()
+            with pd.ExcelWriter(buffer) as writer:
+                pd.DataFrame({'NR ARIMR': [f'PL00000{i}' for i in range(1, 6)], 'PŁEĆ': ['SAMICA'] * 5}).to_excel(writer, sheet_name='GÓRNE', index=False)
+            content = buffer.getvalue()
+        return ImportJob.objects.create(file=SimpleUploadedFile('stado.xlsx', content), **kwargs)
+
+    def test_job_runs_from_pending_to_done_with_progress(self):
+        job = self.make_job(); path = job.file.name
+        with override_settings(IMPORT_CHUNK_SIZE=2), CaptureQueriesContext(connection) as ctx: run_import_job(job.pk)
+        progress = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "cows_importjob"') and '"processed_rows"' in q['sql']]
+        self.assertEqual(len(progress), 4) # start (znany total) + porcje 2 + 2 + 1
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_rows, job.total_rows, job.created_count, job.errors), ('DONE', 5, 5, 5, []))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual((job.file.name, default_storage.exists(path)), ('', False))
+        self.assertEqual(Cow.objects.count(), 5)
+        run_import_job(job.pk) # ponowne zgłoszenie nie uruchamia zakończonego zadania
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).status, 'DONE')
+
+    def test_broken_file_fails_and_is_deleted(self):
+        job = self.make_job(b'to nie jest arkusz'); path = job.file.name
+        run_import_job(job.pk); job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED'); self.assertTrue(job.message)
+        self.assertEqual((job.file.name, default_storage.exists(path)), ('', False))
+
+    def test_polling_recovers_jobs_lost_by_restart(self):
+        stale = timezone.now() - timedelta(hours=1)
+        running = self.make_job(status='RUNNING'); ImportJob.objects.filter(pk=running.pk).update(heartbeat_at=stale)
+        pending = self.make_job(); ImportJob.objects.filter(pk=pending.pk).update(created_at=stale)
+        fresh = self.make_job()
+        with mock.patch('cows.jobs.get_executor') as executor:
+            response = self.client.get(f'/api/cows/import-jobs/{running.pk}/')
+        self.assertEqual(response.data['status'], 'FAILED')
+        self.assertFalse(default_storage.exists(running.file.name))
+        executor.return_value.submit.assert_called_once_with(run_import_job, pending.pk)
+        self.assertEqual(ImportJob.objects.get(pk=fresh.pk).status, 'PENDING')
+        with mock.patch('cows.jobs.get_executor') as executor: recover_stale_imports() # znak życia odświeżony - bez podwójnego zgłoszenia
+        executor.return_value.submit.assert_not_called()
+
+
+class SyncReceiptTests(QueryCountTestCase):
+    def sync(self, *jobs):
+        response = self.client.post('/api/sync/', {'deviceId': 'tablet-1', 'jobs': list(jobs)}, format='json')
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response.data['results']
+
+    def create_cow(self, queue_id, tag_id, **payload):
+        return {'id': queue_id, 'action': 'createCow', 'tempId': -queue_id, 'payload': {'tag_id': tag_id, 'name': 'Krasula', 'gender': 'F', **payload}}
+
+    def test_replayed_job_returns_stored_result_without_writing(self):
+        first, = self.sync(self.create_cow(1, 'PL000001'))
+        with CaptureQueriesContext(connection) as ctx: replayed, = self.sync(self.create_cow(1, 'PL000001'))
+        self.assertEqual(replayed, {**first, 'replayed': True})
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))])
+        self.assertEqual(Cow.objects.count(), 1)
+
+    def test_expired_receipts_are_pruned_at_most_hourly(self):
+        cache.clear(); self.sync(self.create_cow(1, 'PL000001'))
+        SyncReceipt.objects.update(created_at=timezone.now() - timedelta(days=40))
+        with CaptureQueriesContext(connection) as ctx: self.sync(self.create_cow(2, 'PL000002'))
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('DELETE') and '"created_at" <' in q['sql']]) # w tej godzinie już sprzątano
+        cache.clear(); self.sync(self.create_cow(3, 'PL000003'))
+        self.assertEqual(sorted(SyncReceipt.objects.values_list('queue_id', flat=True)), ['2', '3'])
+
+    def test_same_queue_id_with_other_payload_runs_again(self):
+        first, = self.sync(self.create_cow(1, 'PL000001'))
+        second, = self.sync(self.create_cow(1, 'PL000002')) # np. po wyczyszczeniu bazy przeglądarki
+        self.assertNotIn('replayed', second)
+        self.assertEqual(second['status'], 'ok'); self.assertNotEqual(second['realId'], first['realId'])
+        self.assertEqual(Cow.objects.count(), 2)
+        replayed, = self.sync(self.create_cow(1, 'PL000002'))
+        self.assertEqual((replayed['replayed'], replayed['realId']), (True, second['realId']))
+
+    def test_failed_job_leaves_others_committed_and_is_retried(self):
+        ok, duplicate, missing = self.sync(
+            self.create_cow(1, 'PL000001'), self.create_cow(2, 'PL000001'),
+            {'id': 3, 'action': 'updateTask', 'entityId': 999999, 'payload': {'title': 'Nowy tytuł'}},
+        )
+        self.assertEqual([r['status'] for r in (ok, duplicate, missing)], ['ok', 'error', 'error'])
+        self.assertIn('PL000001', duplicate['error'])
+        self.assertEqual(list(Cow.objects.values_list('pk', flat=True)), [ok['realId']])
+        retried, = self.sync(self.create_cow(2, 'PL000001')) # błędy nie trafiają do rejestru - ponowienie wykonuje się od nowa
+        self.assertEqual((retried['status'], 'replayed' in retried), ('error', False))
+
+
+class SyncBatchTests(QueryCountTestCase):
+    def sync(self, jobs):
+        response = self.client.post('/api/sync/', {'deviceId': 'tablet-1', 'jobs': jobs}, format='json')
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return response.data['results']
+
+    def mixed_jobs(self, count, start=1):
+        jobs = []
+        for n in range(start, start + count):
+            temp_id = -n
+            jobs += [
+                {'id': f'{n}-1', 'action': 'updateCow', 'entityId': temp_id, 'payload': {'name': f'Krasula {n}'}},
+                {'id': f'{n}-2', 'action': 'createEvent', 'tempId': temp_id * 1000, 'payload': {'cow': temp_id, 'event_type': 'KONTROLA', 'date': '2024-05-01'}},
+                {'id': f'{n}-3', 'action': 'createTask', 'tempId': temp_id * 1000 - 1, 'payload': {'cow': temp_id, 'title': 'Szczepienie', 'due_date': '2030-05-01'}},
+                {'id': f'{n}-4', 'action': 'createCow', 'tempId': temp_id, 'payload': {'tag_id': f'PL{n:06d}', 'name': 'Nowa', 'gender': 'F', 'herd': self.herd.id}},
+            ]
+        return jobs
+
+    def test_temp_ids_resolve_across_phases(self):
+        jobs = self.mixed_jobs(1) + [{'id': 'calf', 'action': 'createCow', 'tempId': -7, 'payload': {'tag_id': 'PL000099', 'name': 'Cielę', 'gender': 'F', 'dam': -1}}]
+        update, event, task, create, calf = self.sync(jobs)
+        self.assertEqual([r['queueId'] for r in (update, event, task, create, calf)], [job['id'] for job in jobs]) # wyniki w kolejności zadań
+        self.assertTrue(all(r['status'] == 'ok' for r in (update, event, task, create, calf)))
+        cow = Cow.objects.get(pk=create['realId'])
+        self.assertEqual((cow.name, update['realId']), ('Krasula 1', cow.pk)) # updateCow na tempId z tego samego pakietu
+        self.assertEqual((Event.objects.get(pk=event['realId']).cow_id, Task.objects.get(pk=task['realId']).cow_id), (cow.pk, cow.pk))
+        self.assertEqual(Cow.objects.get(pk=calf['realId']).dam_id, cow.pk)
+
+    def test_errors_keep_result_shape(self):
+        results = self.sync([
+            {'id': 'a', 'action': 'createEvent', 'tempId': -1, 'payload': {'cow': 999999, 'event_type': 'KONTROLA', 'date': '2024-05-01'}},
+            {'id': 'b', 'action': 'updateCow', 'entityId': 999999, 'payload': {'name': 'X'}},
+            {'id': 'c', 'action': 'teleportCow', 'entityId': 1},
+        ])
+        for result, job_id, action in zip(results, 'abc', ('createEvent', 'updateCow', 'teleportCow')):
+            self.assertEqual(set(result), {'queueId', 'tempId', 'entityId', 'action', 'status', 'error'})
+            self.assertEqual((result['queueId'], result['action'], result['status']), (job_id, action, 'error'))
+        self.assertIn('teleportCow', results[2]['error'])
+
+    def count_sync_queries(self, jobs):
+        with CaptureQueriesContext(connection) as ctx: results = self.sync(jobs)
+        self.assertTrue(all(r['status'] == 'ok' for r in results), results)
+        return len(ctx.captured_queries)
+
+    def test_mixed_batch_runs_in_bounded_queries(self):
+        small = self.count_sync_queries(self.mixed_jobs(2))
+        self.assertEqual(self.count_sync_queries(self.mixed_jobs(20, start=100)), small, "liczba zapytań rośnie z liczbą zadań")
+
+
+class ImporterTests(APITestCase):
+    def workbook(self, sheets):
+        """{nazwa arkusza: [wiersz jako słownik kolumn]} -> plik xlsx w pamięci."""
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer) as writer:
+            for name, rows in sheets.items(): pd.DataFrame(rows).to_excel(writer, sheet_name=name, index=False)
+        buffer.seek(0); return buffer
+
+    def test_creates_then_updates_by_tag(self):
+        summary = import_workbook(self.workbook({'GÓRNE': [
+            {'NR ARIMR': 'PL000001', 'NAZWA': 'Krasula', 'PŁEĆ': 'SAMICA', 'DATA UR': '2020-03-01', 'KWOTA': '1200,50'},
+            {'NR ARIMR': 'PL000002', 'NAZWA': 'Byczek', 'PŁEĆ': 'BYK', 'STATUS': 'SPRZEDANY'},
+        ]}))
+        self.assertEqual((summary['created'], summary['updated'], summary['errors']), (2, 0, []))
+        krasula = Cow.objects.get(tag_id='PL000001')
+        self.assertEqual((krasula.gender, krasula.birth_date, str(krasula.sale_price), krasula.herd.name), ('F', date(2020, 3, 1), '1200.50', 'GÓRNE'))
+        self.assertEqual(Cow.objects.get(tag_id='PL000002').status, 'SOLD')
+        summary = import_workbook(self.workbook({'DOLNE': [{'NR ARIMR': 'PL000001', 'NAZWA': 'Krasula II'}, {'NR ARIMR': 'PL000003', 'PŁEĆ': 'JAŁÓWKA'}]}))
+        self.assertEqual((summary['created'], summary['updated']), (1, 1))
+        krasula.refresh_from_db()
+        self.assertEqual((krasula.name, krasula.herd.name), ('Krasula II', 'DOLNE'))
+        self.assertEqual(Cow.objects.get(tag_id='PL000003').name, 'Krowa PL000003')
+
+    def test_empty_cells_do_not_overwrite(self):
+        Cow.objects.create(tag_id='PL000001', name='Krasula', gender='F', breed='HF', notes='Spokojna', status='SOLD', weight=500)
+        import_workbook(self.workbook({'GÓRNE': [{'NR ARIMR': 'PL000001', 'NAZWA': None, 'RASA': None, 'UWAGI': '', 'WAGA': None, 'MAŚĆ': 'ŁACIATA'}]}))
+        cow = Cow.objects.get(tag_id='PL000001')
+        self.assertEqual((cow.name, cow.breed, cow.notes, cow.weight, cow.color), ('Krasula', 'HF', 'Spokojna', 500, 'ŁACIATA'))
+        self.assertEqual((cow.gender, cow.status), ('M', 'ACTIVE')) # brak kolumny PŁEĆ/STATUS - wartości domyślne, jak przed wektoryzacją
+
+    @override_settings(IMPORT_KEEP_MISSING_COLUMNS=True)
+    def test_missing_columns_can_keep_values(self):
+        Cow.objects.create(tag_id='PL000001', name='Krasula', gender='F', status='SOLD')
+        import_workbook(self.workbook({'GÓRNE': [{'NR ARIMR': 'PL000001', 'RASA': 'HF'}, {'NR ARIMR': 'PL000002', 'RASA': 'HF'}]}))
+        self.assertEqual(list(Cow.objects.order_by('tag_id').values_list('gender', 'status', 'breed')), [('F', 'SOLD', 'HF'), ('M', 'ACTIVE', 'HF')])
+
+    def test_duplicate_tags_merge_later_values(self):
+        summary = import_workbook(self.workbook({
+            'GÓRNE': [{'NR ARIMR': 'PL000001', 'NAZWA': 'Krasula', 'RASA': 'HF'}, {'NR ARIMR': ' PL000001 ', 'NAZWA': 'Mućka', 'RASA': None}],
+            'DOLNE': [{'NR ARIMR': 'PL000001', 'UWAGI': 'Z drugiego arkusza'}, {'NR ARIMR': None, 'NAZWA': 'Bez numeru'}],
+        }))
+        self.assertEqual((summary['created'], Cow.objects.count()), (1, 1))
+        self.assertEqual(summary['errors'], ["Arkus_ DOLNE, Wiersz 3: Brak 'NR ARIMR'"])
+        cow = Cow.objects.get()
+        self.assertEqual((cow.name, cow.breed, cow.notes, cow.herd.name), ('Mućka', 'HF', 'Z drugiego arkusza', 'DOLNE'))
+
+    def test_links_parents_from_file_and_database(self):
+        sire = Cow.objects.create(tag_id='PL000009', name='Byk', gender='M')
+        written = []
+        import_workbook(self.workbook({'GÓRNE': [
+            {'NR ARIMR': 'PL000002', 'NR MATKI': 'PL000001', 'NR OJCA': 'PL000009'}, # matka dopiero niżej w pliku
+            {'NR ARIMR': 'PL000001', 'NR MATKI': 'PL000001', 'NR OJCA': 'PL999999'}, # własna matka i nieznany ojciec są pomijane
+        ]}), progress=lambda *args: written.append(timezone.now()), atomic=False)
+        calf, dam = Cow.objects.get(tag_id='PL000002'), Cow.objects.get(tag_id='PL000001')
+        self.assertEqual((calf.dam_id, calf.sire_id), (dam.id, sire.id))
+        self.assertEqual((dam.dam_id, dam.sire_id), (None, None))
+        # porcje zatwierdzone przed łączeniem rodziców: połączona krowa wraca w kanale zmian, niepołączona nie
+        self.assertEqual((calf.updated_at > written[-1], dam.updated_at > written[-1]), (True, False))
+
+    def test_failed_bulk_write_falls_back_to_rows(self):
+        Cow.objects.create(tag_id='PL000002', name='Dodana w międzyczasie', gender='F')
+        in_bulk = Cow.objects.in_bulk
+        def stale_in_bulk(ids, field_name='pk'): # numer zajęty po odczycie istniejących (równoległy zapis)
+            return {} if field_name == 'tag_id' else in_bulk(ids, field_name=field_name)
+        with mock.patch.object(Cow.objects, 'in_bulk', side_effect=stale_in_bulk):
+            summary = import_workbook(self.workbook({'GÓRNE': [{'NR ARIMR': f'PL00000{i}', 'PŁEĆ': 'SAMICA'} for i in (1, 2, 3)]}))
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(len(summary['errors']), 1)
+        self.assertTrue(summary['errors'][0].startswith('Arkus_ GÓRNE, Wiersz 3 (Tag: PL000002): Błąd zapisu'))
+        self.assertEqual(sorted(Cow.objects.values_list('tag_id', flat=True)), ['PL000001', 'PL000002', 'PL000003'])
+        self.assertEqual(Cow.objects.get(tag_id='PL000002').name, 'Dodana w międzyczasie')
+
+
+class SyncTombstoneTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_user('operator', password='haslo12345'))
+
+    def changes(self, since):
+        response = self.client.get('/api/sync/changes/', {'since': format_cursor(since)})
+        self.assertEqual(response.status_code, 200); return response.data
+
+    def test_old_tombstones_are_pruned_and_stale_cursors_get_full_dump(self):
+        old, recent = Cow.objects.create(tag_id='PL000001', name='Stara', gender='F'), Cow.objects.create(tag_id='PL000002', name='Nowa', gender='F')
+        old_id, recent_id = old.pk, recent.pk
+        old.delete(); SyncTombstone.objects.filter(object_id=old_id).update(deleted_at=timezone.now() - timedelta(days=120))
+        cache.clear(); recent.delete() # kolejne usunięcie sprząta tombstones spoza okna
+        self.assertEqual(list(SyncTombstone.objects.values_list('object_id', flat=True)), [recent_id])
+        data = self.changes(timezone.now() - timedelta(hours=1))
+        self.assertEqual((data['full'], data['deleted']['cows']), (False, [recent_id]))
+        data = self.changes(timezone.now() - timedelta(days=100)) # usunięcie sprzed 120 dni już nie do odtworzenia
+        self.assertEqual((data['full'], data['deleted']['cows']), (True, []))
+        with override_settings(SYNC_TOMBSTONE_RETENTION=timedelta(days=365)):
+            self.assertFalse(self.changes(timezone.now() - timedelta(days=100))['full'])
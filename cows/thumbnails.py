@@ -0,0 +1,94 @@
+# cows/thumbnails.py
+
+import io
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Szerokości miniatur w pikselach: 160 - lista na telefonie, 320 - lista na ekranie o dużej gęstości/karta, 640 - podgląd
+DEFAULT_THUMBNAIL_WIDTHS = (160, 320, 640)
+LIST_THUMBNAIL_WIDTH = 320 # photo_thumb w odpowiedziach
+DEFAULT_PHOTO_MAX_SIZE = 2560 # dłuższy bok oryginału po obróbce
+THUMBNAIL_DIR = 'cows/thumbs'
+FORMATS = {
+    'webp': ('WEBP', '.webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', '.jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def thumbnail_widths():
+    return tuple(sorted(getattr(settings, 'THUMBNAIL_WIDTHS', DEFAULT_THUMBNAIL_WIDTHS)))
+
+
+def open_photo(file, max_size):
+    """Zdjęcie gotowe do skalowania: obrócone wg EXIF (telefony zapisują orientację tylko w metadanych),
+    w RGB (przezroczystość na białym tle). JPEG dekodowany od razu w zmniejszonej skali (draft) -
+    zdjęcie 12 Mpx z telefonu nie jest rozpakowywane w pełnej rozdzielczości."""
+    image = Image.open(file)
+    image.draft('RGB', (max_size, max_size))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA'); background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A')); image = background
+    elif image.mode != 'RGB': image = image.convert('RGB')
+    return image
+
+
+def encode(image, format_name):
+    """Plik bez metadanych - Pillow nie przepisuje EXIF (GPS, model telefonu), jeśli nie poda się go jawnie."""
+    pil_format, _, options = FORMATS[format_name]
+    buffer = io.BytesIO(); image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def render(file, widths=None):
+    """(oryginał bez EXIF jako JPEG, {szerokość: {format: bajty}}). Bez powiększania małych zdjęć."""
+    widths = widths or thumbnail_widths()
+    max_size = getattr(settings, 'PHOTO_MAX_SIZE', DEFAULT_PHOTO_MAX_SIZE)
+    image = open_photo(file, max_size)
+    if max(image.size) > max_size: image.thumbnail((max_size, max_size), Image.LANCZOS)
+    original = encode(image, 'jpeg')
+    thumbs = {}
+    for width in [w for w in widths if w < image.width] or [image.width]:
+        resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        thumbs[width] = {format_name: encode(resized, format_name) for format_name in FORMATS}
+    return original, thumbs
+
+
+def save_photo(name, original, thumbs, storage=default_storage):
+    """Zapisuje oryginał i miniatury obok siebie. Zwraca (nowa nazwa oryginału, {"320": {"webp": ścieżka, ...}})."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    photo_name = storage.save(f'{os.path.dirname(name) or "cows"}/{stem}.jpg', ContentFile(original))
+    paths = {
+        str(width): {
+            format_name: storage.save(f'{THUMBNAIL_DIR}/{stem}_{width}{FORMATS[format_name][1]}', ContentFile(data))
+            for format_name, data in formats.items()
+        }
+        for width, formats in thumbs.items()
+    }
+    return photo_name, paths
+
+
+def delete_thumbnails(thumbs, storage=default_storage):
+    for formats in (thumbs or {}).values():
+        for path in formats.values(): storage.delete(path)
+
+
+# === URL-E DLA SERIALIZERÓW ===
+def _url(path, request):
+    url = default_storage.url(path)
+    return request.build_absolute_uri(url) if request else url
+
+def thumb_url(thumbs, request=None, width=LIST_THUMBNAIL_WIDTH, format_name='jpeg'):
+    """JPEG (działa wszędzie) w szerokości listy albo najbliższej mniejszej; None - miniatur jeszcze nie ma."""
+    if not thumbs: return None
+    widths = sorted(int(w) for w in thumbs)
+    chosen = max([w for w in widths if w <= width] or widths[:1])
+    return _url(thumbs[str(chosen)][format_name], request)
+
+def srcset(thumbs, request=None, format_name='webp'):
+    """"url 160w, url 320w, ..." do <source type="image/webp" srcset=...>."""
+    if not thumbs: return None
+    return ', '.join(f'{_url(thumbs[w][format_name], request)} {w}w' for w in sorted(thumbs, key=int))
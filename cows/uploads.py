@@ -0,0 +1,138 @@
+# cows/uploads.py
+
+import hashlib
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .models import CowDocument, DocumentUpload
+
+try: import fcntl # blokada pliku na czas zapisu kawałka (Linux/macOS)
+except ImportError: fcntl = None
+
+# Protokół (POST /api/documents/uploads/ -> PUT .../<id>/chunk/ z nagłówkiem Upload-Offset -> POST .../<id>/finalize/):
+# kawałki są dopisywane na koniec pliku prosto ze strumienia żądania, bez trzymania całości w pamięci.
+# Przerwany kawałek zostawia to, co zdążyło dojść - GET .../<id>/ mówi, od którego bajtu wznowić.
+DEFAULT_DOCUMENT_MAX_SIZE = 200 * 1024 * 1024
+DEFAULT_UPLOAD_RETENTION = timedelta(days=3)
+RECOMMENDED_CHUNK_SIZE = 2 * 1024 * 1024 # przy słabym zasięgu lepiej wznawiać od kilku MB niż od całego pliku
+COPY_BUFFER = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, offset): self.offset = offset
+
+class ChunkInProgress(Exception):
+    pass
+
+
+def upload_dir():
+    directory = getattr(settings, 'CHUNKED_UPLOAD_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'uploads-partial')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def part_path(upload):
+    return os.path.join(upload_dir(), f'{upload.pk}.part')
+
+def received(upload):
+    try: return os.path.getsize(part_path(upload))
+    except FileNotFoundError: return 0
+
+def status(upload):
+    offset = upload.size if upload.document_id else received(upload)
+    return {
+        'id': str(upload.pk), 'cow': upload.cow_id, 'title': upload.title, 'filename': upload.filename,
+        'size': upload.size, 'offset': offset, 'complete': upload.document_id is not None,
+        'document': upload.document_id, 'chunk_size': RECOMMENDED_CHUNK_SIZE,
+    }
+
+
+# === ETAPY ===
+def start(cow, title, filename, size, user):
+    max_size = getattr(settings, 'DOCUMENT_MAX_SIZE', DEFAULT_DOCUMENT_MAX_SIZE)
+    if size <= 0 or size > max_size: raise ValidationError({'size': f'Rozmiar pliku musi być od 1 do {max_size} bajtów'})
+    purge_stale()
+    upload = DocumentUpload.objects.create(cow=cow, title=title or filename, filename=os.path.basename(filename), size=size, user=user)
+    open(part_path(upload), 'wb').close()
+    return upload
+
+def write_chunk(upload, offset, stream, length):
+    """Dopisuje `length` bajtów ze strumienia, jeśli `offset` to dokładnie obecny koniec pliku.
+    Zwraca nowy offset; gdy połączenie zerwie się w trakcie, zapisane bajty zostają (wznowienie od nich)."""
+    if offset + length > upload.size: raise ValidationError({'error': f'Kawałek wychodzi poza rozmiar pliku ({upload.size} bajtów)'})
+    with open(part_path(upload), 'ab') as file:
+        if fcntl is not None:
+            try: fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError: raise ChunkInProgress()
+        current = file.seek(0, os.SEEK_END)
+        if offset != current: raise OffsetMismatch(current)
+        written = 0
+        try:
+            while written < length:
+                data = stream.read(min(COPY_BUFFER, length - written))
+                if not data: break
+                file.write(data); written += len(data)
+        finally:
+            file.flush()
+    DocumentUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now())
+    return offset + written
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''): digest.update(block)
+    return digest.hexdigest()
+
+
+class PartFile(File):
+    """Plik już leżący na dysku - FileSystemStorage przeniesie go (rename) zamiast kopiować."""
+    def temporary_file_path(self):
+        return self.file.name
+
+def finish(upload, checksum):
+    """Sprawdza rozmiar i SHA-256, przenosi plik do dokumentów i tworzy CowDocument. Zwraca (dokument, utworzony).
+    Wysyłka jest blokowana (select_for_update) na czas przenoszenia, więc równoległa albo ponowiona finalizacja
+    (zgubiona odpowiedź) dostaje już utworzony dokument zamiast błędu."""
+    checksum = str(checksum or '').strip().lower()
+    if not checksum: raise ValidationError({'sha256': 'Brak sumy kontrolnej SHA-256 pliku'}) # plik zostaje - wystarczy ponowić z sumą
+    try: return _finish_locked(upload.pk, checksum)
+    except FileNotFoundError:
+        # SQLite nie blokuje wierszy - plik przeniosła w tej chwili równoległa finalizacja (odczyt już po jej zatwierdzeniu)
+        upload = DocumentUpload.objects.select_related('document').get(pk=upload.pk)
+        if upload.document_id: return upload.document, False
+        raise
+
+def _finish_locked(upload_pk, checksum):
+    with transaction.atomic():
+        upload = DocumentUpload.objects.select_for_update().select_related('document').get(pk=upload_pk)
+        if upload.document_id: return upload.document, False
+        path = part_path(upload)
+        if not os.path.exists(path): raise FileNotFoundError(path)
+        size = received(upload)
+        if size != upload.size: raise ValidationError({'error': f'Plik niekompletny: {size} z {upload.size} bajtów', 'offset': size})
+        if sha256(path) != checksum:
+            os.remove(path); open(path, 'wb').close() # uszkodzony w drodze - wysyłka od zera
+            raise ValidationError({'error': 'Suma kontrolna SHA-256 się nie zgadza - plik trzeba wysłać ponownie', 'offset': 0})
+        field = CowDocument._meta.get_field('file')
+        with open(path, 'rb') as part:
+            name = field.storage.save(field.generate_filename(None, upload.filename), PartFile(part, name=path))
+        try:
+            with transaction.atomic():
+                document = CowDocument.objects.create(cow_id=upload.cow_id, title=upload.title, file=name, user_id=upload.user_id)
+                upload.document = document; upload.save(update_fields=['document', 'updated_at'])
+        except Exception:
+            field.storage.delete(name); raise
+    if os.path.exists(path): os.remove(path) # storage inny niż dysk lokalny skopiował plik
+    return document, True
+
+def abort(upload):
+    if os.path.exists(part_path(upload)): os.remove(part_path(upload))
+    upload.delete()
+
+def purge_stale():
+    """Usuwa porzucone (i dawno zakończone) wysyłki razem z ich plikami częściowymi."""
+    retention = getattr(settings, 'CHUNKED_UPLOAD_RETENTION', DEFAULT_UPLOAD_RETENTION)
+    for upload in DocumentUpload.objects.filter(updated_at__lt=timezone.now() - retention): abort(upload)
@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    CowViewSet, EventViewSet, SyncView, UserViewSet,
-    CowDocumentViewSet, TaskViewSet, HerdViewSet
+    CowViewSet, EventViewSet, SyncView, SyncChangesView, SearchView, UserViewSet,
+    CowDocumentViewSet, TaskViewSet, TaskRecurrenceViewSet, HerdViewSet
 )
+from . import async_views
+from .media import protected_media
 
 # Rejestracja ViewSetów w routerze
 router = DefaultRouter()
@@ -12,6 +15,7 @@ router.register(r'events', EventViewSet, basename='event')
 router.register(r'users', UserViewSet, basename='user')
 router.register(r'documents', CowDocumentViewSet, basename='document')
 router.register(r'tasks', TaskViewSet, basename='task')
+router.register(r'task-recurrences', TaskRecurrenceViewSet, basename='task-recurrence')
 router.register(r'herds', HerdViewSet, basename='herd')
 
 urlpatterns = [
@@ -20,4 +24,19 @@ urlpatterns = [
 
     # Dodatkowe ścieżki niebędące ViewSetami
     path('sync/', SyncView.as_view(), name='sync'),
-]
\ No newline at end of file
+    path('sync/changes/', SyncChangesView.as_view(), name='sync-changes'),
+    path('search/', SearchView.as_view(), name='search'),
+    # Zdjęcia i dokumenty - podpisane adresy z API (patrz cows/media.py)
+    path('media/<int:user_id>/<int:expires>/<str:signature>/<path:path>', protected_media, name='protected-media'),
+]
+
+# Pod ASGI (ASYNC_API=True, patrz highlander_farm/asgi.py) odczyty obciążone przy synchronizacji urządzeń
+# obsługują widoki async z cows/async_views.py - muszą być przed routerem, który ma te same ścieżki
+async_urlpatterns = [
+    path('cows/', async_views.cow_list, name='cow-list-async'),
+    path('cows/stats/', async_views.cow_stats, name='cow-stats-async'),
+    path('cows/<int:pk>/pedigree/', async_views.cow_pedigree, name='cow-pedigree-async'),
+    path('sync/changes/', async_views.sync_changes, name='sync-changes-async'),
+    path('search/', async_views.search_view, name='search-async'),
+]
+if getattr(settings, 'ASYNC_API', False): urlpatterns = async_urlpatterns + urlpatterns
@@ -3,9 +3,11 @@
 from rest_framework import viewsets, status, filters, views
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Cow, Event, CowDocument, Task, Herd 
+from .models import Cow, Event, CowDocument, DocumentUpload, Task, TaskRecurrence, Herd, ImportJob, WeightMeasurement
 from .serializers import (
     CowSerializer, 
     CowCreateUpdateSerializer, 
@@ -13,95 +15,77 @@ from .serializers import (
     EventSerializer,
     CowDocumentSerializer, 
     TaskSerializer, 
+    TaskRecurrenceSerializer,
     HerdSerializer, 
+    HerdWithSummarySerializer,
     UserSerializer, 
     UserCreateSerializer, 
     UserPasswordUpdateSerializer,
     CowPedigreeSerializer,
-    CowOffspringSerializer
+    CowOffspringSerializer,
+    ImportJobSerializer
 )
-from django.db import transaction, IntegrityError
+from django.db import transaction
 import logging
+import time
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from django.contrib.auth.models import User 
-from datetime import date, timedelta
-from django.db.models import Count, Q 
-import pandas as pd 
+from django.db.models import Q
+
+from .sync import SyncBatch, build_changes, since_param
+from .importer import import_workbook
+from .bulk import bulk_update_cows, create_events, create_tasks
+from .summaries import rebuild as rebuild_herd_summaries
+from .growth import cow_growth, herd_growth_summary, read_file as read_weights_file, resolve_rows, save_measurements
+from .stats import get_stats, herd_param, stats_cache_info
+from .jobs import enqueue_import, enqueue_thumbnails, recover_stale_imports, schedule_occurrences
+from .recurrence import calendar_range
+from .thumbnails import delete_thumbnails
+from . import uploads
+from .exporter import XLSX_CONTENT_TYPE, stream_csv, write_workbook
+from .pedigree import fetch_pedigree, parse_depth
+from .inbreeding import DEFAULT_INBREEDING_WARNING, get_graph
+from .pagination import CowPagination, DocumentPagination, EventPagination, TaskPagination, UserPagination
+from .lookup import MAX_LOOKUP_TAGS, lookup_tag, lookup_tags
+from .search import IndexedSearchFilter, search, search_params
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
 
 logger = logging.getLogger(__name__)
 
-# === WIDOK SYNCHRONIZACJI (BEZ ZMIAN) ===
+# === WIDOK SYNCHRONIZACJI ===
 class SyncView(views.APIView):
     parser_classes = [JSONParser]
     permission_classes = [IsAuthenticated] 
     def post(self, request, *args, **kwargs):
         jobs = request.data.get('jobs', [])
-        results = []
-        temp_id_map = {} 
         try:
             with transaction.atomic():
-                for job in jobs:
-                    action = job.get('action'); payload = job.get('payload', {}); temp_id = job.get('tempId'); entity_id = job.get('entityId'); queue_id = job.get('id') 
-                    job_result = {"queueId": queue_id, "tempId": temp_id, "entityId": entity_id, "action": action, "status": "pending"}
-                    try:
-                        if action == 'createCow' or action == 'updateCow':
-                            if 'dam' in payload and payload['dam'] in temp_id_map: payload['dam'] = temp_id_map[payload['dam']]
-                            if 'sire' in payload and payload['sire'] in temp_id_map: payload['sire'] = temp_id_map[payload['sire']]
-                            if action == 'createCow':
-                                payload.pop('id', None); serializer = CowCreateUpdateSerializer(data=payload)
-                            else: 
-                                real_id = temp_id_map.get(entity_id, entity_id) 
-                                if real_id < 0: job_result.update(status="merged", realId=real_id); continue
-                                cow = Cow.objects.get(id=real_id); serializer = CowCreateUpdateSerializer(cow, data=payload, partial=True)
-                            if serializer.is_valid(raise_exception=True):
-                                saved_cow = serializer.save(); temp_id_map[temp_id or entity_id] = saved_cow.id; job_result.update(status="ok", realId=saved_cow.id)
-                        elif action == 'deleteCow': # Archiwizacja
-                            real_id = temp_id_map.get(entity_id, entity_id)
-                            if real_id > 0: cow = Cow.objects.get(id=real_id); cow.status = 'ARCHIVED'; cow.save()
-                            job_result.update(status="ok", realId=real_id)
-                        elif action == 'createEvent':
-                            payload.pop('id', None); cow_id = payload.get('cow')
-                            if cow_id in temp_id_map: payload['cow'] = temp_id_map[payload['cow']]
-                            serializer = EventSerializer(data=payload, context={'request': request})
-                            if serializer.is_valid(raise_exception=True):
-                                new_event = serializer.save(); temp_id_map[temp_id] = new_event.id; job_result.update(status="ok", realId=new_event.id)
-                        elif action == 'deleteDocument':
-                            real_id = temp_id_map.get(entity_id, entity_id)
-                            if real_id > 0: CowDocument.objects.get(id=real_id).delete()
-                            job_result.update(status="ok", realId=real_id)
-                        elif action == 'createTask':
-                            payload.pop('id', None); cow_id = payload.get('cow')
-                            if cow_id and cow_id in temp_id_map: payload['cow'] = temp_id_map[cow_id]
-                            serializer = TaskSerializer(data=payload, context={'request': request})
-                            if serializer.is_valid(raise_exception=True):
-                                new_task = serializer.save(); temp_id_map[temp_id] = new_task.id; job_result.update(status="ok", realId=new_task.id)
-                        elif action == 'updateTask':
-                            real_id = temp_id_map.get(entity_id, entity_id)
-                            if real_id < 0: job_result.update(status="merged", realId=real_id)
-                            else:
-                                cow_id = payload.get('cow');
-                                if cow_id and cow_id in temp_id_map: payload['cow'] = temp_id_map[cow_id]
-                                task = Task.objects.get(id=real_id); serializer = TaskSerializer(task, data=payload, partial=True)
-                                if serializer.is_valid(raise_exception=True): serializer.save(); job_result.update(status="ok", realId=real_id)
-                        elif action == 'deleteTask':
-                            real_id = temp_id_map.get(entity_id, entity_id)
-                            if real_id > 0: Task.objects.get(id=real_id).delete()
-                            job_result.update(status="ok", realId=real_id)
-                        else: raise Exception(f"Nieznana akcja: {action}")
-                    except IntegrityError as e: logger.warning(f"Błąd walidacji {job}: {str(e)}"); job_result.update(status="error", error=f"Błąd walidacji: {str(e)}")
-                    except (Cow.DoesNotExist, CowDocument.DoesNotExist, Task.DoesNotExist) as e: 
-                        logger.warning(f"Nie znaleziono obiektu {job}: {str(e)}"); job_result.update(status="error", error=str(e))
-                    except Exception as e: logger.error(f"Błąd przetwarzania zadania {job}: {str(e)}"); job_result.update(status="error", error=str(e))
-                    results.append(job_result)
+                results = SyncBatch(jobs, request, device_id=request.data.get('deviceId', '')).run()
             return Response({"status": "ok", "results": results}, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Krytyczny błąd transakcji: {str(e)}")
             return Response({"status": "error", "message": f"Transakcja nie powiodła się: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
+# === KANAŁ ZMIAN DLA KLIENTÓW OFFLINE ===
+class SyncChangesView(views.APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request, *args, **kwargs):
+        return Response(build_changes(since_param(request.query_params), request))
+
+# === WYSZUKIWARKA (krowy, zdarzenia, zadania - patrz cows/search.py) ===
+class SearchView(views.APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request, *args, **kwargs):
+        text, entities, limit = search_params(request.query_params)
+        started = time.perf_counter(); results = search(text, entities=entities, limit=limit)
+        return Response({'query': text, 'results': results, 'took_ms': round((time.perf_counter() - started) * 1000, 2)})
+
 # === UserViewSet (BEZ ZMIAN) ===
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('username')
     permission_classes = [IsAuthenticated, IsAdminUser] 
+    pagination_class = UserPagination # domyślna paginacja sortuje po id
     def get_serializer_class(self):
         if self.action == 'create': return UserCreateSerializer
         if self.action == 'set_password': return UserPasswordUpdateSerializer
@@ -119,19 +103,53 @@ class HerdViewSet(viewsets.ModelViewSet):
     serializer_class = HerdSerializer
     permission_classes = [IsAuthenticated] 
     pagination_class = None
+    # ?with_summary=1 - liczniki z HerdSummary (jeden JOIN, bez skanowania krów)
+    def with_summary(self):
+        return self.action in ('list', 'retrieve') and self.request.query_params.get('with_summary') in ('1', 'true')
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset.select_related('summary') if self.with_summary() else queryset
+    def get_serializer_class(self):
+        return HerdWithSummarySerializer if self.with_summary() else HerdSerializer
+    def list(self, request, *args, **kwargs):
+        if self.with_summary():
+            missing = list(Herd.objects.filter(summary__isnull=True).values_list('id', flat=True))
+            if missing: rebuild_herd_summaries(missing) # stada sprzed wprowadzenia podsumowań
+        return super().list(request, *args, **kwargs)
+    @action(detail=True, methods=['get'], url_path='growth-summary')
+    def growth_summary(self, request, pk=None):
+        return Response(herd_growth_summary(self.get_object()))
 
 # === CowViewSet (POPRAWIONY IMPORT) ===
 class CowViewSet(viewsets.ModelViewSet):
     queryset = Cow.objects.all().order_by('tag_id') 
     permission_classes = [IsAuthenticated] 
-    pagination_class = None 
+    pagination_class = CowPagination # tylko gdy klient poda ?cursor albo ?page_size
     parser_classes = (MultiPartParser, FormParser, JSONParser) 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['gender', 'breed', 'status', 'herd'] 
-    search_fields = ['name', 'tag_id', 'passport_number'] 
-    ordering_fields = ['tag_id', 'name', 'birth_date', 'status', 'herd'] 
+    search_entity = 'cow' # ?search= przez indeks (numer ARiMR, imię, paszport, rasa, uwagi)
+    ordering_fields = ['tag_id', 'name', 'birth_date', 'status', 'herd', 'age'] 
     ordering = ['tag_id'] 
     
+    # Kolumny potrzebne CowListSerializer (razem z nazwami matki/ojca/stada z JOIN-a)
+    LIST_COLUMNS = [
+        'id', 'tag_id', 'name', 'birth_date', 'gender', 'status', 'herd', 'passport_number', 'photo', 'photo_thumbs',
+        'weight', 'pregnancy_duration', 'is_pregnancy_possible', 'dam__name', 'sire__name', 'herd__name',
+    ]
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['export_excel', 'export_csv']: return queryset # eksport sam wybiera kolumny (values_list)
+        if self.action == 'pedigree': return queryset.select_related('dam__dam', 'dam__sire', 'sire__dam', 'sire__sire')
+        queryset = queryset.select_related('dam', 'sire', 'herd').with_age()
+        if self.action == 'list':
+            queryset = queryset.only(*self.LIST_COLUMNS)
+            try:
+                min_age = self.request.query_params.get('age_min'); max_age = self.request.query_params.get('age_max')
+                queryset = queryset.age_between(int(min_age) if min_age else None, int(max_age) if max_age else None)
+            except ValueError: raise ValidationError({'age': 'Parametry age_min/age_max muszą być liczbami całkowitymi'})
+        return queryset
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']: return CowCreateUpdateSerializer
         if self.action == 'list': return CowListSerializer
@@ -160,198 +178,159 @@ class CowViewSet(viewsets.ModelViewSet):
     def search(self, request):
         tag_id = request.query_params.get('tag_id', None)
         if not tag_id: return Response({'error': 'Brak parametru tag_id'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            cow = Cow.objects.get(tag_id=tag_id); serializer = CowSerializer(cow, context=self.get_serializer_context()); return Response(serializer.data)
-        except Cow.DoesNotExist:
-            return Response({'error': f'Krowa z tag_id "{tag_id}" nie została znaleziona'}, status=status.HTTP_404_NOT_FOUND)
+        card, cached = lookup_tag(tag_id, request) # numer w dowolnym formacie (spacje, PL, EID 616...)
+        if card is None: return Response({'error': f'Krowa z tag_id "{tag_id}" nie została znaleziona'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(card, headers={'X-Cache': 'HIT' if cached else 'MISS'})
+    @action(detail=False, methods=['post'])
+    def lookup(self, request):
+        """Wiele numerów naraz (np. kolejka skanów z zagrody): {"tags": [...]} -> karty w jednym zapytaniu."""
+        tags = request.data.get('tags')
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            return Response({'error': 'Oczekiwano {"tags": [lista numerów]}'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(tags) > MAX_LOOKUP_TAGS: return Response({'error': f'Maksymalnie {MAX_LOOKUP_TAGS} numerów w jednym zapytaniu'}, status=status.HTTP_400_BAD_REQUEST)
+        results, hits = lookup_tags(tags, request)
+        return Response({'results': results, 'missing': [tag for tag, card in results.items() if card is None], 'cached': hits})
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        today = date.today(); active_cows = Cow.objects.filter(status='ACTIVE')
-        total = active_cows.count(); by_gender = active_cows.values('gender').annotate(count=Count('id'))
-        age_bins = {'0-1': 0, '1-2': 0, '2-5': 0, '5-8': 0, '8+': 0}; avg_age_sum = 0
-        for cow in active_cows:
-            if not cow.birth_date: continue 
-            age = today.year - cow.birth_date.year - ((today.month, today.day) < (cow.birth_date.month, cow.birth_date.day)); avg_age_sum += age
-            if age <= 1: age_bins['0-1'] += 1
-            elif age <= 2: age_bins['1-2'] += 1
-            elif age <= 5: age_bins['2-5'] += 1
-            elif age <= 8: age_bins['5-8'] += 1
-            else: age_bins['8+'] += 1
-        avg_age = (avg_age_sum / total) if total > 0 else 0
-        age_histogram_data = [ {"name": "0-1 lat", "ilość": age_bins['0-1']}, {"name": "1-2 lat", "ilość": age_bins['1-2']}, {"name": "2-5 lat", "ilość": age_bins['2-5']}, {"name": "5-8 lat", "ilość": age_bins['5-8']}, {"name": "8+ lat", "ilość": age_bins['8+']}, ]
-        next_7_days = today + timedelta(days=7)
-        upcoming_tasks_qs = Task.objects.filter(is_completed=False, due_date__gte=today, due_date__lte=next_7_days).order_by('due_date')
-        upcoming_tasks_data = TaskSerializer(upcoming_tasks_qs, many=True, context={'request': request}).data
-        return Response({
-            'total_active': total, 'by_gender': list(by_gender), 'average_age': round(avg_age, 1),
-            'age_histogram': age_histogram_data, 'upcoming_events': upcoming_tasks_data
-        })
+        schedule_occurrences() # najbliższe zadania na pulpicie obejmują wystąpienia zadań cyklicznych
+        data, cached = get_stats(request, herd_id=herd_param(request.query_params))
+        return Response(data, headers={'X-Cache': 'HIT' if cached else 'MISS'})
+    @action(detail=False, methods=['get'], url_path='stats-cache', permission_classes=[IsAuthenticated, IsAdminUser])
+    def stats_cache(self, request):
+        return Response(stats_cache_info())
     @action(detail=True, methods=['post'], parser_classes=[MultiPartParser, FormParser])
     def upload_photo(self, request, pk=None):
         cow = self.get_object()
         if 'photo' not in request.FILES: return Response({'error': 'Brak pliku photo'}, status=status.HTTP_400_BAD_REQUEST)
         if cow.photo: cow.photo.delete(save=False)
-        cow.photo = request.FILES['file']
-        cow.save()
+        delete_thumbnails(cow.photo_thumbs)
+        cow.photo = request.FILES['photo']; cow.photo_thumbs = {}
+        cow.save(); enqueue_thumbnails(cow) # miniatury i oczyszczony oryginał w tle (cows/jobs.py)
         serializer = CowSerializer(cow, context=self.get_serializer_context())
         return Response(serializer.data)
     @action(detail=True, methods=['get'])
     def pedigree(self, request, pk=None):
         try: cow = self.get_object()
         except Cow.DoesNotExist: return Response({"error": "Krowa nie znaleziona"}, status=status.HTTP_404_NOT_FOUND)
+        # ?depth=N - dowolnie głębokie drzewo jednym zapytaniem (rekurencyjne CTE), płaska lista węzłów i krawędzi
+        if 'depth' in request.query_params: return Response(fetch_pedigree(cow.id, parse_depth(request.query_params['depth'])))
         context = {'request': request} 
         ancestors_serializer = CowPedigreeSerializer(cow, context=context)
         offspring_qs = Cow.objects.filter(Q(dam=cow) | Q(sire=cow)).distinct()
         offspring_serializer = CowOffspringSerializer(offspring_qs, many=True, context=context)
         return Response({ "ancestors": ancestors_serializer.data, "offspring": offspring_serializer.data })
 
-    # === POPRAWIONA AKCJA: IMPORT EXCEL (ZE WSZYSTKIMI POLAMI) ===
+    # === INBRED I KOJARZENIA (graf rodowodu w pamięci, patrz cows/inbreeding.py) ===
+    @action(detail=True, methods=['get'])
+    def inbreeding(self, request, pk=None):
+        cow = self.get_object(); graph = get_graph()
+        value = graph.inbreeding(cow.id)
+        if value is None: value = graph.kinship(cow.dam_id, cow.sire_id) or 0.0 # krowa spoza grafu (np. zapis w toku)
+        return Response({'id': cow.id, 'tag_id': cow.tag_id, 'inbreeding': round(value, 6), 'pedigree_loop': cow.id in graph.looped})
+    @action(detail=False, methods=['post'], url_path='mating-check')
+    def mating_check(self, request):
+        """Oczekiwany inbred potomka dla par {"dam": id, "sire": id} (jedna para albo lista w "pairs")."""
+        pairs = request.data.get('pairs', [request.data])
+        if not isinstance(pairs, list) or not pairs: return Response({'error': 'Podaj parę dam/sire albo listę pairs'}, status=status.HTTP_400_BAD_REQUEST)
+        graph = get_graph(); threshold = getattr(settings, 'INBREEDING_WARNING_THRESHOLD', DEFAULT_INBREEDING_WARNING); results = []
+        for pair in pairs:
+            try: dam_id, sire_id = int(pair['dam']), int(pair['sire'])
+            except (KeyError, TypeError, ValueError): results.append({'error': 'Para musi mieć liczbowe pola dam i sire'}); continue
+            kinship = graph.kinship(dam_id, sire_id)
+            if kinship is None: results.append({'dam': dam_id, 'sire': sire_id, 'error': 'Nie znaleziono krowy'}); continue
+            results.append({'dam': dam_id, 'sire': sire_id, 'offspring_inbreeding': round(kinship, 6), 'warning': kinship >= threshold})
+        return Response({'threshold': threshold, 'results': results})
+
+    # === IMPORT EXCEL (wektorowe czyszczenie + zapis zbiorczy, patrz cows/importer.py) ===
     @action(detail=False, methods=['post'], parser_classes=[MultiPartParser], url_path='import-excel')
     def import_excel(self, request):
         file = request.FILES.get('file')
         if not file:
             return Response({"error": "Brak pliku 'file'."}, status=status.HTTP_400_BAD_REQUEST)
-
-        def clean_date(date_val):
-            if pd.isna(date_val) or pd.isnull(date_val): return None
-            try:
-                dt = pd.to_datetime(date_val, errors='coerce')
-                if pd.isna(dt): return None
-                return dt.date()
-            except Exception: return None
-                
-        def clean_string(str_val):
-            if pd.isna(str_val) or pd.isnull(str_val): return None
-            return str(str_val).strip()
-            
-        def clean_float(float_val):
-            if pd.isna(float_val) or pd.isnull(float_val): return None
-            try:
-                cleaned_val = str(float_val).replace(',', '.')
-                return float(cleaned_val)
-            except: return None
-        
-        def clean_int(int_val):
-            if pd.isna(int_val) or pd.isnull(int_val): return None
-            try: return int(float(int_val)) # Konwertuj na float najpierw
-            except: return None
-
         try:
-            xls = pd.ExcelFile(file)
-            created_count = 0; updated_count = 0; errors = []; parent_link_map = {};
-            with transaction.atomic():
-                for sheet_name in xls.sheet_names:
-                    herd_name = sheet_name.split(' ')[0].strip().upper()
-                    if not herd_name:
-                        errors.append(f"Arkus_ {sheet_name} ma nieprawidłową nazwę.")
-                        continue
-                    
-                    herd, _ = Herd.objects.get_or_create(name=herd_name)
-                    df = pd.read_excel(xls, sheet_name=sheet_name)
-                    df.columns = [str(col).strip().upper() for col in df.columns]
-                    
-                    # === PEŁNA MAPA KOLUMN ===
-                    COLUMN_MAP = {
-                        'NR ARIMR': 'tag_id', 'NAZWA': 'name', 'DATA UR': 'birth_date',
-                        'PŁEĆ': 'gender', 'RASA': 'breed', 'MAŚĆ': 'color',
-                        'NR PASZPORTU': 'passport_number', 'STATUS': 'status', 
-                        'NR MATKI': 'dam_tag', 'NR OJCA': 'sire_tag',
-                        'DATA SPRZEDAŻY/PADNIĘCIA': 'exit_date', 'NABYWCA/PRZYCZYNA': 'exit_reason',
-                        'KWOTA': 'sale_price', 'DOSTAWA MIĘSA': 'meat_delivery_date', 'UWAGI': 'notes',
-                        'WAGA': 'weight', 'PRZYROST/DZIEŃ': 'daily_weight_gain', 
-                        'DŁUGOŚĆ ISTNIEJĄCEJ CIĄŻY': 'pregnancy_duration',
-                        'MOŻLIWOŚĆ BYCIA CIELNĄ WG ZESTAWIENIA': 'is_pregnancy_possible',
-                        'RELOKACJA': 'relocation_status', 
-                        'DUPLIKATY DO ZALOZENIA': 'duplicates_to_make',
-                        'ZAMOWIC KOLCZYKI DUPLIKATY': 'duplicates_to_order',
-                        'RELKOACJA PO PRXEPEDZIE': 'relocation_after_drive',
-                        'NUMER DZIALALNOSCI': 'business_number'
-                    }
-                    df.rename(columns=COLUMN_MAP, inplace=True)
-                    
-                    for index, row in df.iterrows():
-                        tag_id = clean_string(row.get('tag_id'))
-                        if not tag_id:
-                            errors.append(f"Arkus_ {sheet_name}, Wiersz {index + 2}: Brak 'NR ARIMR'")
-                            continue
-                        
-                        gender_raw = clean_string(row.get('gender', '')) or ''
-                        gender = 'F' if 'SAMICA' in gender_raw or 'JAŁÓWKA' in gender_raw else 'M'
-                        status_raw = clean_string(row.get('status', '')) or ''
-                        status = 'SOLD' if 'SPRZEDAN' in status_raw else \
-                                 'ARCHIVED' if 'PADŁ' in status_raw else 'ACTIVE'
-
-                        defaults = {
-                            'herd': herd, 'name': row.get('name', f"Krowa {tag_id}"),
-                            'gender': gender, 'status': status, 'breed': clean_string(row.get('breed')),
-                            'color': clean_string(row.get('color')),
-                            'passport_number': clean_string(row.get('passport_number')),
-                            'business_number': clean_string(row.get('business_number')),
-                            'exit_reason': clean_string(row.get('exit_reason')), 'notes': clean_string(row.get('notes')),
-                            'birth_date': clean_date(row.get('birth_date')), 'exit_date': clean_date(row.get('exit_date')),
-                            'meat_delivery_date': clean_date(row.get('meat_delivery_date')),
-                            'sale_price': clean_float(row.get('sale_price')),
-                            'weight': clean_float(row.get('weight')),
-                            'daily_weight_gain': clean_float(row.get('daily_weight_gain')),
-                            'pregnancy_duration': clean_string(row.get('pregnancy_duration')),
-                            'is_pregnancy_possible': clean_string(row.get('is_pregnancy_possible')),
-                            'relocation_status': clean_string(row.get('relocation_status')),
-                            'duplicates_to_make': clean_string(row.get('duplicates_to_make')),
-                            'duplicates_to_order': clean_string(row.get('duplicates_to_order')),
-                            'relocation_after_drive': clean_string(row.get('relocation_after_drive')),
-                        }
-                        
-                        final_defaults = {k: v for k, v in defaults.items() if v is not None}
-                        
-                        try:
-                            cow, created = Cow.objects.update_or_create(tag_id=tag_id, defaults=final_defaults)
-                            if created: created_count += 1
-                            else: updated_count += 1
-                            parent_link_map[cow.id] = (
-                                clean_string(row.get('dam_tag')), clean_string(row.get('sire_tag'))
-                            )
-                        except Exception as e:
-                            errors.append(f"Arkus_ {sheet_name}, Wiersz {index + 2} (Tag: {tag_id}): Błąd zapisu - {str(e)}")
-
-                logger.info("Import: Rozpoczynam łączenie rodziców...")
-                all_parent_tags = set()
-                for dam_tag, sire_tag in parent_link_map.values():
-                    if dam_tag: all_parent_tags.add(dam_tag)
-                    if sire_tag: all_parent_tags.add(sire_tag)
-                
-                parents_in_db = Cow.objects.in_bulk(list(all_parent_tags), field_name='tag_id')
-                
-                for cow_id, (dam_tag, sire_tag) in parent_link_map.items():
-                    dam = parents_in_db.get(dam_tag)
-                    sire = parents_in_db.get(sire_tag)
-                    if dam or sire:
-                        Cow.objects.filter(id=cow_id).update(dam=dam, sire=sire)
-                        
-            return Response({
-                "status": "ok", "created": created_count, "updated": updated_count, "errors": errors
-            }, status=status.HTTP_200_OK)
-            
+            return Response(import_workbook(file), status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Krytyczny błąd importu Excela: {str(e)}")
             return Response({"error": f"Błąd przetwarzania pliku: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
-# === EventViewSet (BEZ ZMIAN) ===
+    # === EKSPORT (arkusz = stado, kolumny jak w imporcie; filtry jak na liście) ===
+    @action(detail=False, methods=['get'], url_path='export-excel')
+    def export_excel(self, request):
+        output = write_workbook(self.filter_queryset(self.get_queryset()))
+        return FileResponse(output, as_attachment=True, filename='stado_export.xlsx', content_type=XLSX_CONTENT_TYPE)
+    @action(detail=False, methods=['get'], url_path='export-csv')
+    def export_csv(self, request):
+        response = StreamingHttpResponse(stream_csv(self.filter_queryset(self.get_queryset())), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="stado_export.csv"'
+        return response
+
+    # === IMPORT W TLE (duże skoroszyty - klient odpytuje o postęp) ===
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser], url_path='import-jobs')
+    def import_jobs(self, request):
+        file = request.FILES.get('file')
+        if not file:
+            return Response({"error": "Brak pliku 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        job = ImportJob.objects.create(file=file, user=request.user); enqueue_import(job)
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    @action(detail=False, methods=['get'], url_path=r'import-jobs/(?P<job_id>\d+)')
+    def import_job_status(self, request, job_id=None):
+        recover_stale_imports() # zadania zgubione przez restart nie wiszą w nieskończoność
+        try: job = ImportJob.objects.get(pk=job_id)
+        except ImportJob.DoesNotExist: return Response({"error": "Import nie znaleziony"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ImportJobSerializer(job).data)
+
+    # === OPERACJE ZBIORCZE (przepęd, sprzedaż partii, archiwizacja - patrz cows/bulk.py) ===
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser], url_path='bulk')
+    def bulk(self, request):
+        """{"ids": [...] albo "filter": {"herd": 1, "status": "ACTIVE"}, "patch": {"herd": 2}, "event": {...} albo false, "dry_run": false}"""
+        return Response(bulk_update_cows(request.data, request.user))
+
+    # === WAŻENIA I PRZYROSTY (przeliczane przy zapisie ważeń, patrz cows/growth.py) ===
+    @action(detail=True, methods=['get'])
+    def growth(self, request, pk=None):
+        return Response(cow_growth(self.get_object()))
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, MultiPartParser], url_path='weights')
+    def weights(self, request):
+        """Ważenia zbiorczo: JSON {"measurements": [{"tag" albo "cow", "date", "weight"}], "source": "SCALE"}
+        albo plik 'file' (CSV z wagi / Excel) z kolumnami NR ARIMR, DATA, WAGA."""
+        file = request.FILES.get('file')
+        if file:
+            try: records = read_weights_file(file)
+            except Exception as e: return Response({"error": f"Błąd przetwarzania pliku: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+            if records is None: return Response({"error": "Plik musi mieć kolumny NR ARIMR i WAGA"}, status=status.HTTP_400_BAD_REQUEST)
+            source = 'IMPORT'
+        else:
+            records = request.data.get('measurements'); source = request.data.get('source', 'SCALE')
+            if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+                return Response({"error": "Podaj listę 'measurements'"}, status=status.HTTP_400_BAD_REQUEST)
+            if source not in dict(WeightMeasurement.SOURCE_CHOICES): return Response({"error": f"Nieznane źródło '{source}'"}, status=status.HTTP_400_BAD_REQUEST)
+        errors = []
+        with transaction.atomic(): saved = save_measurements(resolve_rows(records, errors), source, request.user)
+        return Response({'saved': saved, 'errors': errors})
+
+# === EventViewSet ===
 class EventViewSet(viewsets.ModelViewSet):
-    queryset = Event.objects.all()
+    queryset = Event.objects.select_related('user')
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticated] 
+    pagination_class = EventPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['cow'] 
     ordering_fields = ['date', 'created_at']
     ordering = ['-date']
     def get_serializer_context(self):
         context = super().get_serializer_context(); context.update({'request': self.request}); return context
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser], url_path='bulk')
+    def bulk(self, request):
+        """To samo zdarzenie (np. SZCZEPIENIE) dla wielu krów: {"ids"/"filter", "payload": {"event_type", "date", "notes"}, "dry_run"}"""
+        return Response(create_events(request.data, request.user), status=status.HTTP_200_OK if request.data.get('dry_run') else status.HTTP_201_CREATED)
 
-# === CowDocumentViewSet (BEZ ZMIAN) ===
+# === CowDocumentViewSet ===
 class CowDocumentViewSet(viewsets.ModelViewSet):
-    queryset = CowDocument.objects.all()
+    queryset = CowDocument.objects.select_related('user')
     serializer_class = CowDocumentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DocumentPagination
     parser_classes = (MultiPartParser, FormParser, JSONParser) 
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['cow']
@@ -367,15 +346,76 @@ class CowDocumentViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
-# === TaskViewSet (BEZ ZMIAN) ===
+    # === WYSYŁANIE W KAWAŁKACH (duże skany i PDF-y przy słabym zasięgu, patrz cows/uploads.py) ===
+    def get_upload(self, upload_id):
+        try: return DocumentUpload.objects.get(pk=upload_id, user=self.request.user)
+        except (DocumentUpload.DoesNotExist, DjangoValidationError): raise NotFound('Nie ma takiej wysyłki')
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser], url_path='uploads')
+    def start_upload(self, request):
+        cow = Cow.objects.filter(pk=request.data.get('cow')).first() if str(request.data.get('cow', '')).isdigit() else None
+        if cow is None: return Response({'error': "Brak albo nieprawidłowe 'cow' ID."}, status=status.HTTP_400_BAD_REQUEST)
+        filename = str(request.data.get('filename') or '').strip()
+        if not filename: return Response({'error': "Brak 'filename'."}, status=status.HTTP_400_BAD_REQUEST)
+        try: size = int(request.data.get('size'))
+        except (TypeError, ValueError): return Response({'error': "Brak albo nieprawidłowe 'size'."}, status=status.HTTP_400_BAD_REQUEST)
+        upload = uploads.start(cow, str(request.data.get('title') or '').strip()[:200], filename, size, request.user)
+        return Response(uploads.status(upload), status=status.HTTP_201_CREATED)
+    @action(detail=False, methods=['get', 'delete'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)')
+    def upload_status(self, request, upload_id=None):
+        upload = self.get_upload(upload_id)
+        if request.method == 'DELETE': uploads.abort(upload); return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(uploads.status(upload))
+    @action(detail=False, methods=['put'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)/chunk')
+    def upload_chunk(self, request, upload_id=None):
+        """Surowe bajty w treści (application/octet-stream), początek w nagłówku Upload-Offset."""
+        upload = self.get_upload(upload_id)
+        if upload.document_id: return Response(uploads.status(upload))
+        try: offset = int(request.headers.get('Upload-Offset', '')); length = int(request.headers.get('Content-Length') or 0)
+        except ValueError: return Response({'error': 'Nagłówek Upload-Offset musi być liczbą'}, status=status.HTTP_400_BAD_REQUEST)
+        try: offset = uploads.write_chunk(upload, offset, request.stream, length) if length else offset
+        except uploads.OffsetMismatch as e: return Response({'error': 'Nieprawidłowy offset', 'offset': e.offset}, status=status.HTTP_409_CONFLICT)
+        except uploads.ChunkInProgress: return Response({'error': 'Trwa zapis innego kawałka tej wysyłki'}, status=status.HTTP_409_CONFLICT)
+        return Response({**uploads.status(upload), 'offset': offset})
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)/finalize')
+    def finalize_upload(self, request, upload_id=None):
+        document, created = uploads.finish(self.get_upload(upload_id), request.data.get('sha256'))
+        serializer = self.get_serializer(document)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+# === TaskViewSet ===
 class TaskViewSet(viewsets.ModelViewSet):
-    queryset = Task.objects.all()
+    queryset = Task.objects.select_related('cow', 'user')
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    pagination_class = TaskPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, IndexedSearchFilter]
     filterset_fields = { 'cow': ['exact'], 'is_completed': ['exact'], 'due_date': ['gte', 'lte'], 'task_type': ['exact'], }
-    search_fields = ['title', 'notes', 'cow__name', 'cow__tag_id']
+    search_entity = 'task' # tytuł, notatki, imię i numer krowy
     ordering_fields = ['due_date', 'created_at']
     ordering = ['due_date'] 
     def get_serializer_context(self):
         context = super().get_serializer_context(); context.update({'request': self.request}); return context
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser], url_path='bulk')
+    def bulk(self, request):
+        """To samo zadanie dla wielu (aktywnych) krów: {"ids"/"filter", "payload": {"title", "task_type", "due_date", "notes"}, "dry_run"}"""
+        return Response(create_tasks(request.data, request.user), status=status.HTTP_200_OK if request.data.get('dry_run') else status.HTTP_201_CREATED)
+    def list(self, request, *args, **kwargs):
+        schedule_occurrences(); return super().list(request, *args, **kwargs)
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """?from=&to= (ISO) - zadania w zakresie, z wystąpieniami zadań cyklicznych, jednym zapytaniem po indeksie due_date.
+        Działają też filtry listy (cow, is_completed, task_type)."""
+        start, end = calendar_range(request.query_params); schedule_occurrences()
+        tasks = self.filter_queryset(self.get_queryset()).filter(due_date__range=(start, end)).order_by('due_date', 'pk')
+        return Response({'from': start, 'to': end, 'tasks': self.get_serializer(tasks, many=True).data})
+
+# === TaskRecurrenceViewSet (zadania cykliczne, wystąpienia tworzy cows/recurrence.py) ===
+class TaskRecurrenceViewSet(viewsets.ModelViewSet):
+    queryset = TaskRecurrence.objects.select_related('cow', 'user')
+    serializer_class = TaskRecurrenceSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['cow', 'is_active', 'task_type']
+    def get_serializer_context(self):
+        context = super().get_serializer_context(); context.update({'request': self.request}); return context
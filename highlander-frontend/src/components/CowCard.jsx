@@ -80,11 +80,16 @@ export function CowCard({ cow, onEdit, onDelete, onAddEvent, onClick, isOffline
       <CardContent className="space-y-3">
         {cow.photo ? (
           <div className="w-full h-48 rounded-lg overflow-hidden bg-muted">
-            <img
-              src={cow.photo}
-              alt={cow.name}
-              className="w-full h-full object-cover"
-            />
+            {/* Miniatury (WebP w srcset, JPEG jako zapas); dopóki serwer ich nie zrobi - oryginał */}
+            <picture className="block w-full h-full">
+              {cow.photo_srcset && <source type="image/webp" srcSet={cow.photo_srcset} sizes="(min-width: 768px) 33vw, 100vw" />}
+              <img
+                src={cow.photo_thumb || cow.photo}
+                alt={cow.name}
+                loading="lazy"
+                className="w-full h-full object-cover"
+              />
+            </picture>
           </div>
         ) : (
           <div className="w-full h-48 rounded-lg bg-gradient-to-br from-amber-100 to-orange-200 flex items-center justify-center">
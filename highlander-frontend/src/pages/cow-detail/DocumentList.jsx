@@ -25,6 +25,7 @@ function DocumentUploadForm({ cowId, onUploadSuccess }) {
   const [file, setFile] = useState(null);
   const [title, setTitle] = useState('');
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState(0);
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -37,9 +38,9 @@ function DocumentUploadForm({ cowId, onUploadSuccess }) {
       return;
     }
     
-    setLoading(true);
+    setLoading(true); setProgress(0);
     try {
-      await repository.uploadDocument(cowId, title || file.name, file);
+      await repository.uploadDocument(cowId, title || file.name, file, setProgress);
       setFile(null);
       setTitle('');
       e.target.reset(); 
@@ -83,7 +84,7 @@ function DocumentUploadForm({ cowId, onUploadSuccess }) {
           </div>
           <Button type="submit" disabled={loading || !file}>
             {loading ? <Loader2 className="w-4 h-4 mr-2 animate-spin" /> : <Upload className="w-4 h-4 mr-2" />}
-            Prześlij plik
+            {loading ? `Przesyłanie ${Math.round(progress * 100)}%` : 'Prześlij plik'}
           </Button>
         </form>
       </CardContent>
@@ -26,6 +26,16 @@ const authedFetch = async (url, options = {}) => {
   return response;
 };
 
+// Stały identyfikator urządzenia - serwer po nim (i queueId) rozpoznaje ponowione zadania synchronizacji
+const getDeviceId = () => {
+  let deviceId = localStorage.getItem('syncDeviceId');
+  if (!deviceId) {
+    deviceId = window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    localStorage.setItem('syncDeviceId', deviceId);
+  }
+  return deviceId;
+};
+
 const handleResponse = async (response) => {
   if (response.ok && response.headers.get('Content-Type')?.includes('spreadsheet')) {
     return response.blob();
@@ -53,28 +63,204 @@ const handleResponse = async (response) => {
   return data.results || data;
 };
 
+// Listy paginowane kursorem: idzie po linkach `next`, aż pobierze wszystkie strony
+const fetchAllPages = async (url) => {
+  const items = [];
+  while (url) {
+    const response = await authedFetch(url);
+    if (!response.ok) return handleResponse(response);
+    const data = await response.json();
+    if (!Array.isArray(data.results)) return data;
+    items.push(...data.results);
+    url = data.next;
+  }
+  return items;
+};
+
+// Dokumenty wysyłane kawałkami (duże skany przy słabym zasięgu): po zerwaniu połączenia wysyłka wznawia się
+// od ostatniego zapisanego bajtu - także po zamknięciu karty, bo id wysyłki jest w localStorage
+const UPLOAD_RETRIES = 5;
+
+const HASH_SLICE = 4 * 1024 * 1024;
+
+// SHA-256 liczony przyrostowo: Web Crypto przyjmuje tylko cały bufor, a 200 MB skanu w pamięci telefonu to za dużo
+const SHA256_K = new Uint32Array([
+  0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+  0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+  0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+  0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+  0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+  0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+  0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+  0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+]);
+const rotr = (x, n) => (x >>> n) | (x << (32 - n));
+
+const createSha256 = () => {
+  const h = new Uint32Array([0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19]);
+  const w = new Uint32Array(64); const pending = new Uint8Array(64);
+  let pendingLength = 0; let total = 0;
+  const compress = (bytes, offset) => {
+    for (let i = 0; i < 16; i++) {
+      const j = offset + i * 4;
+      w[i] = (bytes[j] << 24) | (bytes[j + 1] << 16) | (bytes[j + 2] << 8) | bytes[j + 3];
+    }
+    for (let i = 16; i < 64; i++) {
+      const s0 = rotr(w[i - 15], 7) ^ rotr(w[i - 15], 18) ^ (w[i - 15] >>> 3);
+      const s1 = rotr(w[i - 2], 17) ^ rotr(w[i - 2], 19) ^ (w[i - 2] >>> 10);
+      w[i] = w[i - 16] + s0 + w[i - 7] + s1;
+    }
+    let [a, b, c, d, e, f, g, k] = h;
+    for (let i = 0; i < 64; i++) {
+      const t1 = (k + (rotr(e, 6) ^ rotr(e, 11) ^ rotr(e, 25)) + ((e & f) ^ (~e & g)) + SHA256_K[i] + w[i]) | 0;
+      const t2 = ((rotr(a, 2) ^ rotr(a, 13) ^ rotr(a, 22)) + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+      k = g; g = f; f = e; e = (d + t1) | 0; d = c; c = b; b = a; a = (t1 + t2) | 0;
+    }
+    h[0] += a; h[1] += b; h[2] += c; h[3] += d; h[4] += e; h[5] += f; h[6] += g; h[7] += k;
+  };
+  return {
+    update(bytes) {
+      total += bytes.length; let i = 0;
+      if (pendingLength) {
+        i = Math.min(64 - pendingLength, bytes.length);
+        pending.set(bytes.subarray(0, i), pendingLength); pendingLength += i;
+        if (pendingLength < 64) return;
+        compress(pending, 0); pendingLength = 0;
+      }
+      for (; i + 64 <= bytes.length; i += 64) compress(bytes, i);
+      pending.set(bytes.subarray(i)); pendingLength = bytes.length - i;
+    },
+    hex() {
+      const tail = new Uint8Array(pendingLength + 9 <= 64 ? 64 : 128);
+      tail.set(pending.subarray(0, pendingLength)); tail[pendingLength] = 0x80;
+      const view = new DataView(tail.buffer); const bits = total * 8;
+      view.setUint32(tail.length - 8, Math.floor(bits / 2 ** 32)); view.setUint32(tail.length - 4, bits >>> 0);
+      for (let i = 0; i < tail.length; i += 64) compress(tail, i);
+      return Array.from(h, (x) => x.toString(16).padStart(8, '0')).join('');
+    },
+  };
+};
+
+const sha256Hex = async (file) => {
+  const hash = createSha256();
+  for (let offset = 0; offset < file.size; offset += HASH_SLICE) {
+    hash.update(new Uint8Array(await file.slice(offset, offset + HASH_SLICE).arrayBuffer()));
+  }
+  return hash.hex();
+};
+
+const withRetry = async (fn) => {
+  for (let attempt = 0; ; attempt++) {
+    try { return await fn(); } catch (error) {
+      if (attempt >= UPLOAD_RETRIES || error.fatal) throw error;
+      await new Promise((resolve) => setTimeout(resolve, Math.min(1000 * 2 ** attempt, 30000)));
+    }
+  }
+};
+
+const uploadInChunks = async (cowId, title, file, onProgress) => {
+  const storageKey = `documentUpload:${cowId}:${file.name}:${file.size}:${file.lastModified}`;
+  const base = `${API_BASE_URL}/documents/uploads`;
+  let upload = null;
+  const savedId = localStorage.getItem(storageKey);
+  if (savedId) {
+    const response = await authedFetch(`${base}/${savedId}/`);
+    if (response.ok) upload = await response.json();
+    else if (response.status === 404) localStorage.removeItem(storageKey);
+    else await handleResponse(response); // 5xx - id zostaje, kolejna próba wznowi wysyłkę
+  }
+  if (!upload) {
+    upload = await handleResponse(await authedFetch(`${base}/`, { method: 'POST', body: JSON.stringify({ cow: cowId, title, filename: file.name, size: file.size }) }));
+    localStorage.setItem(storageKey, upload.id);
+  }
+  const checksum = await sha256Hex(file);
+  let offset = upload.offset;
+  while (offset < file.size) {
+    onProgress?.(offset / file.size);
+    offset = await withRetry(async () => {
+      const response = await authedFetch(`${base}/${upload.id}/chunk/`, {
+        method: 'PUT', body: file.slice(offset, offset + upload.chunk_size),
+        headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': String(offset) },
+      }).catch(async (error) => {
+        // Połączenie zerwane w trakcie kawałka - serwer mówi, ile zdążyło dojść
+        const status = await authedFetch(`${base}/${upload.id}/`).then((r) => (r.ok ? r.json() : null)).catch(() => null);
+        if (status) { offset = status.offset; }
+        throw error;
+      });
+      if (response.status === 409) {
+        // Inny offset na serwerze - kontynuacja od niego; bez offsetu trwa jeszcze poprzedni kawałek, więc ponowienie
+        const data = await response.json();
+        if (data.offset !== undefined) return data.offset;
+        throw new Error(data.error);
+      }
+      if (!response.ok) { const error = new Error((await response.json().catch(() => ({}))).error || 'Błąd wysyłania pliku'); error.fatal = response.status < 500; throw error; }
+      return (await response.json()).offset;
+    });
+  }
+  onProgress?.(1);
+  const document = await withRetry(async () => {
+    const response = await authedFetch(`${base}/${upload.id}/finalize/`, { method: 'POST', body: JSON.stringify({ sha256: checksum }) });
+    if (!response.ok) {
+      // Wysyłki już nie ma albo plik doszedł uszkodzony (serwer zaczął od zera) - następna próba zaczyna nową wysyłkę.
+      // 5xx i zerwane połączenie: id zostaje, a finalizacja jest ponawiana (ponowiona zwraca już utworzony dokument)
+      const data = await response.clone().json().catch(() => ({}));
+      if (response.status === 404 || (response.status === 400 && String(data.offset) === '0')) localStorage.removeItem(storageKey);
+      await handleResponse(response).catch((error) => { error.fatal = response.status < 500; throw error; });
+    }
+    return response.json();
+  });
+  localStorage.removeItem(storageKey);
+  return document;
+};
+
 export const networkApi = {
   getStats: async () => handleResponse(await authedFetch(`${API_BASE_URL}/cows/stats/`)),
   getCows: async () => handleResponse(await authedFetch(`${API_BASE_URL}/cows/`)),
   getCow: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/${id}/`)),
-  searchCow: async (tagId) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/search/?tag_id=${tagId}`)),
-  getEventsForCow: async (cowId) => handleResponse(await authedFetch(`${API_BASE_URL}/events/?cow=${cowId}`)),
+  searchCow: async (tagId) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/search/?tag_id=${encodeURIComponent(tagId)}`)),
+  lookupCows: async (tags) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/lookup/`, { method: 'POST', body: JSON.stringify({ tags }) })),
+  getEventsForCow: async (cowId) => fetchAllPages(`${API_BASE_URL}/events/?cow=${cowId}`),
   getTasks: async (filters = {}) => {
     const params = new URLSearchParams();
     if (filters.start) params.append('due_date__gte', filters.start);
     if (filters.end) params.append('due_date__lte', filters.end);
     if (filters.cow) params.append('cow', filters.cow);
     if (filters.is_completed !== undefined) params.append('is_completed', String(filters.is_completed));
-    return handleResponse(await authedFetch(`${API_BASE_URL}/tasks/?${params.toString()}`));
+    return fetchAllPages(`${API_BASE_URL}/tasks/?${params.toString()}`);
   },
-  getPedigree: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/${id}/pedigree/`)),
-  getDocuments: async (cowId) => handleResponse(await authedFetch(`${API_BASE_URL}/documents/?cow=${cowId}`)),
+  getPedigree: async (id, depth) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/${id}/pedigree/${depth ? `?depth=${depth}` : ''}`)),
+  getInbreeding: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/${id}/inbreeding/`)),
+  getGrowth: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/${id}/growth/`)),
+  getHerdGrowthSummary: async (herdId) => handleResponse(await authedFetch(`${API_BASE_URL}/herds/${herdId}/growth-summary/`)),
+  saveWeights: async (measurements, source = 'SCALE') => handleResponse(await authedFetch(`${API_BASE_URL}/cows/weights/`, { method: 'POST', body: JSON.stringify({ measurements, source }) })),
+  importWeights: async (file) => {
+    const formData = new FormData(); formData.append('file', file);
+    return handleResponse(await authedFetch(`${API_BASE_URL}/cows/weights/`, { method: 'POST', body: formData }));
+  },
+  matingCheck: async (pairs) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/mating-check/`, { method: 'POST', body: JSON.stringify({ pairs }) })),
+  search: async (q, types) => {
+    const params = new URLSearchParams({ q });
+    if (types) params.append('types', types);
+    return handleResponse(await authedFetch(`${API_BASE_URL}/search/?${params.toString()}`));
+  },
+  getDocuments: async (cowId) => fetchAllPages(`${API_BASE_URL}/documents/?cow=${cowId}`),
   getHerds: async () => handleResponse(await authedFetch(`${API_BASE_URL}/herds/`)),
+  getHerdsWithSummary: async () => handleResponse(await authedFetch(`${API_BASE_URL}/herds/?with_summary=1`)),
+  getChanges: async (since) => {
+    const params = since ? `?since=${encodeURIComponent(since)}` : '';
+    return handleResponse(await authedFetch(`${API_BASE_URL}/sync/changes/${params}`));
+  },
   importExcel: async (file) => {
     const formData = new FormData();
     formData.append('file', file);
     return handleResponse(await authedFetch(`${API_BASE_URL}/cows/import-excel/`, { method: 'POST', body: formData }));
   },
+  startImportJob: async (file) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    return handleResponse(await authedFetch(`${API_BASE_URL}/cows/import-jobs/`, { method: 'POST', body: formData }));
+  },
+  getImportJob: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/import-jobs/${id}/`)),
   exportExcel: async () => handleResponse(await authedFetch(`${API_BASE_URL}/cows/export-excel/`)),
   createCow: async (data) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/`, { method: 'POST', body: JSON.stringify(data) })),
   updateCow: async (id, data) => handleResponse(await authedFetch(`${API_BASE_URL}/cows/${id}/`, { method: 'PATCH', body: JSON.stringify(data) })),
@@ -88,27 +274,54 @@ export const networkApi = {
     return handleResponse(await authedFetch(`${API_BASE_URL}/cows/${id}/upload_photo/`, { method: 'POST', body: formData }));
   },
   deleteDocument: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/documents/${id}/`, { method: 'DELETE' })),
-  uploadDocument: async (cowId, title, file) => {
-    const formData = new FormData(); formData.append('cow', cowId); formData.append('title', title); formData.append('file', file);
-    return handleResponse(await authedFetch(`${API_BASE_URL}/documents/`, { method: 'POST', body: formData }));
-  },
+  uploadDocument: (cowId, title, file, onProgress) => uploadInChunks(cowId, title, file, onProgress),
   createEvent: async (data) => handleResponse(await authedFetch(`${API_BASE_URL}/events/`, { method: 'POST', body: JSON.stringify(data) })),
   createTask: async (data) => handleResponse(await authedFetch(`${API_BASE_URL}/tasks/`, { method: 'POST', body: JSON.stringify(data) })),
+  // Jeden wpis dla wielu krów: { ids: [...] albo filter: { herd, status }, payload: {...} }
+  bulkCreateEvents: async (data) => handleResponse(await authedFetch(`${API_BASE_URL}/events/bulk/`, { method: 'POST', body: JSON.stringify(data) })),
+  bulkCreateTasks: async (data) => handleResponse(await authedFetch(`${API_BASE_URL}/tasks/bulk/`, { method: 'POST', body: JSON.stringify(data) })),
   updateTask: async (id, data) => handleResponse(await authedFetch(`${API_BASE_URL}/tasks/${id}/`, { method: 'PATCH', body: JSON.stringify(data) })),
+  // Zadania w zakresie dat (z wystąpieniami zadań cyklicznych) - jedno zapytanie zamiast stronicowania całej listy
+  getTaskCalendar: async (from, to) => handleResponse(await authedFetch(`${API_BASE_URL}/tasks/calendar/?from=${from}&to=${to}`)),
+  getTaskRecurrences: async () => handleResponse(await authedFetch(`${API_BASE_URL}/task-recurrences/`)),
+  createTaskRecurrence: async (data) => handleResponse(await authedFetch(`${API_BASE_URL}/task-recurrences/`, { method: 'POST', body: JSON.stringify(data) })),
+  updateTaskRecurrence: async (id, data) => handleResponse(await authedFetch(`${API_BASE_URL}/task-recurrences/${id}/`, { method: 'PATCH', body: JSON.stringify(data) })),
+  deleteTaskRecurrence: async (id) => {
+    const response = await authedFetch(`${API_BASE_URL}/task-recurrences/${id}/`, { method: 'DELETE' });
+    if (!response.ok) throw new Error('Błąd usuwania zadania cyklicznego');
+    return true;
+  },
   deleteTask: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/tasks/${id}/`, { method: 'DELETE' })),
   syncBatch: async (jobs) => {
-    const response = await authedFetch(`${API_BASE_URL}/sync/`, { method: 'POST', body: JSON.stringify({ jobs }) });
+    const response = await authedFetch(`${API_BASE_URL}/sync/`, { method: 'POST', body: JSON.stringify({ jobs, deviceId: getDeviceId() }) });
     const data = await response.json();
     if (!response.ok) { throw new Error(data.message || 'Błąd serwera synchronizacji'); }
     return data;
   },
-  getUsers: async () => handleResponse(await authedFetch(`${API_BASE_URL}/users/`)),
+  getUsers: async () => fetchAllPages(`${API_BASE_URL}/users/`),
   createUser: async (data) => handleResponse(await authedFetch(`${API_BASE_URL}/users/`, { method: 'POST', body: JSON.stringify(data) })),
   updateUser: async (id, data) => handleResponse(await authedFetch(`${API_BASE_URL}/users/${id}/`, { method: 'PATCH', body: JSON.stringify(data) })),
   deleteUser: async (id) => handleResponse(await authedFetch(`${API_BASE_URL}/users/${id}/`, { method: 'DELETE' })),
   setUserPassword: async (id, password) => handleResponse(await authedFetch(`${API_BASE_URL}/users/${id}/set-password/`, { method: 'POST', body: JSON.stringify({ password }) })),
 };
 
+// === SYNCHRONIZACJA PRZYROSTOWA (kanał /sync/changes/) ===
+const SYNC_CURSOR_KEY = 'syncCursor';
+const SYNC_TABLES = ['herds', 'cows', 'events', 'tasks', 'documents'];
+let pendingChanges = null;
+const pullChanges = async () => {
+  const data = await networkApi.getChanges(localStorage.getItem(SYNC_CURSOR_KEY));
+  await db.transaction('rw', db.herds, db.cows, db.events, db.tasks, db.documents, async () => {
+    for (const table of SYNC_TABLES) {
+      // Pełny zrzut zastępuje dane z serwera, ale zostawia rekordy offline (ujemne tempId)
+      if (data.full) await db[table].where('id').above(0).delete();
+      await db[table].bulkDelete(data.deleted[table]);
+      await db[table].bulkPut(data.changes[table]);
+    }
+  });
+  localStorage.setItem(SYNC_CURSOR_KEY, data.cursor);
+};
+
 let isSyncing = false;
 export const syncService = {
   processSyncQueue: async () => {
@@ -199,14 +412,19 @@ export const repository = {
   getPedigree: networkApi.getPedigree,
   getDocumentsQuery: (cowId) => db.documents.where('cow').equals(parseInt(cowId, 10)).sortBy('uploaded_at'),
 
-  syncCows: () => networkApi.getCows().then(d => db.cows.bulkPut(d)).catch(e => console.warn("Sync: Cows offline")),
-  syncHerds: () => networkApi.getHerds().then(d => db.herds.bulkPut(d)).catch(e => console.warn("Sync: Herds offline")),
+  syncChanges: () => {
+    if (!pendingChanges) pendingChanges = pullChanges().finally(() => { pendingChanges = null; });
+    return pendingChanges;
+  },
+  syncCows: () => repository.syncChanges().catch(e => console.warn("Sync: Cows offline")),
+  syncHerds: () => repository.syncChanges().catch(e => console.warn("Sync: Herds offline")),
   syncCow: (id) => networkApi.getCow(id).then(d => db.cows.put(d)).catch(e => console.warn("Sync: Cow offline")),
   syncEvents: (cowId) => networkApi.getEventsForCow(cowId).then(d => db.transaction('rw', db.events, async () => { await db.events.where('cow').equals(cowId).delete(); await db.events.bulkPut(d); })),
   syncTasks: (filters = {}) => networkApi.getTasks(filters).then(d => db.tasks.bulkPut(d)),
   syncDocuments: (cowId) => networkApi.getDocuments(cowId).then(d => db.transaction('rw', db.documents, async () => { await db.documents.where('cow').equals(cowId).delete(); await db.documents.bulkPut(d); })),
 
   searchCow: networkApi.searchCow,
+  lookupCows: networkApi.lookupCows,
 
   createCow: async (data) => {
     const payload = { ...data, dam: data.dam || null, sire: data.sire || null, herd: data.herd || null };
@@ -268,6 +486,15 @@ export const repository = {
       return optimisticTask;
     }
   },
+  // Sesja szczepień offline idzie na serwer jako jedno zadanie kolejki; rekordy wrócą kanałem zmian
+  bulkCreateEvents: async (data) => {
+    if (navigator.onLine) return networkApi.bulkCreateEvents(data);
+    await db.syncQueue.add({ action: 'bulkCreateEvent', payload: data });
+  },
+  bulkCreateTasks: async (data) => {
+    if (navigator.onLine) return networkApi.bulkCreateTasks(data);
+    await db.syncQueue.add({ action: 'bulkCreateTask', payload: data });
+  },
   updateTask: async (id, data) => {
     const payload = { ...data };
     if (payload.is_completed !== undefined) payload.is_completed = payload.is_completed ? 1 : 0;
@@ -291,7 +518,17 @@ export const repository = {
     if (navigator.onLine) await networkApi.deleteDocument(id);
     else if (id > 0) await db.syncQueue.add({ action: 'deleteDocument', entityId: id });
   },
-  importExcel: networkApi.importExcel,
+  // Import w tle: serwer od razu zwraca zadanie, a postęp odpytujemy co kilka sekund
+  importExcel: async (file, onProgress) => {
+    let job = await networkApi.startImportJob(file);
+    while (job.status === 'PENDING' || job.status === 'RUNNING') {
+      if (onProgress) onProgress(job);
+      await new Promise(resolve => setTimeout(resolve, 2000));
+      job = await networkApi.getImportJob(job.id);
+    }
+    if (job.status === 'FAILED') throw new Error(job.message || 'Import nie powiódł się');
+    return { created: job.created_count, updated: job.updated_count, errors: job.errors };
+  },
   exportExcel: async () => {
     const blob = await networkApi.exportExcel();
     const url = window.URL.createObjectURL(blob);
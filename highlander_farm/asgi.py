@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'highlander_farm.settings')
+# Lista krów, statystyki, rodowód, wyszukiwarka i kanał zmian jako widoki async (cows/async_views.py).
+# Uruchomienie: gunicorn highlander_farm.asgi:application -k uvicorn.workers.UvicornWorker
+os.environ.setdefault('ASYNC_API', 'True')
 
 application = get_asgi_application()
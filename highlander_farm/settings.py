@@ -1,20 +1,24 @@
 # highlander_farm/settings.py
 
 from pathlib import Path
-import os
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
+from decouple import Csv, config
+from .database import parse_database_url
 
 # Ścieżka bazowa projektu
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# KLUCZ TAJNY - W produkcji powinien być pobierany ze zmiennych środowiskowych
-SECRET_KEY = 'django-insecure-your-secret-key-change-in-production'
+# Ustawienia z '= config(...)' można nadpisać zmienną środowiskową albo plikiem .env (python-decouple)
+
+# KLUCZ TAJNY - W produkcji ustaw SECRET_KEY w środowisku
+SECRET_KEY = config('SECRET_KEY', default='django-insecure-your-secret-key-change-in-production')
 
 # DEBUG ustawiony na False w produkcji
-DEBUG = True
+DEBUG = config('DEBUG', default=True, cast=bool)
 
 # Konfiguracja hostów - '*' rozwiązuje problem Bad Request (400) przy tunelach
-ALLOWED_HOSTS = ['*']
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='*', cast=Csv())
 
 # Zaufane źródła dla Cloudflare
 CSRF_TRUSTED_ORIGINS = [
@@ -51,6 +55,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'cows.media.media_user_middleware',  # użytkownik w podpisach adresów plików (cows/media.py)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,14 +79,47 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'highlander_farm.wsgi.application'
+# Widoki async dla odczytów (cows/async_views.py) - włączane przez highlander_farm/asgi.py
+ASYNC_API = config('ASYNC_API', default=False, cast=bool)
 
-# Baza danych - SQLite
+# Baza danych - PostgreSQL z DATABASE_URL (docker-compose), bez niej lokalny plik SQLite
+DATABASE_URL = config('DATABASE_URL', default='')
 DATABASES = {
-    'default': {
+    'default': parse_database_url(DATABASE_URL) if DATABASE_URL else {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Połączenie zostaje otwarte między żądaniami (bez kosztu logowania do bazy przy każdym),
+    # a przed ponownym użyciem jest sprawdzane - zerwane po restarcie bazy nie kończy się błędem 500
+    DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    # Pula psycopg 3 w procesie (OPTIONS['pool']) wymaga Django 5.1+ - do czasu aktualizacji połączenia trwałe albo PgBouncer
+    # PgBouncer w trybie transakcyjnym nie obsługuje kursorów po stronie serwera (iterator())
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = config('DB_PGBOUNCER', default=False, cast=bool)
+SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=20000, cast=int)  # ms, pragmy SQLite w database.py
+
+# Cache - statystyki pulpitu (cows/stats.py). LocMem działa w obrębie jednego procesu;
+# przy kilku workerach gunicorna lepiej użyć FileBasedCache, żeby unieważnienie widziały wszystkie.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'highlander-farm',
+    }
+}
+STATS_CACHE_TTL = config('STATS_CACHE_TTL', default=300, cast=int)  # sekundy
+TAG_LOOKUP_CACHE_SIZE = config('TAG_LOOKUP_CACHE_SIZE', default=2048, cast=int)  # karty krów dla skanera w pamięci procesu
+TAG_LOOKUP_SHARED_CACHE = config('TAG_LOOKUP_SHARED_CACHE', default=False, cast=bool)  # drugi poziom w CACHES (np. Redis)
+IMPORT_KEEP_MISSING_COLUMNS = config('IMPORT_KEEP_MISSING_COLUMNS', default=False, cast=bool)  # arkusz bez PŁEĆ/STATUS nie nadpisuje tych pól (cows/importer.py)
+IMPORT_STALE_AFTER = config('IMPORT_STALE_AFTER', default=900, cast=int)  # sekundy bez postępu, po których import w tle uznajemy za przerwany (cows/jobs.py)
+THUMBNAIL_WORKERS = config('THUMBNAIL_WORKERS', default=2, cast=int)  # wątki obróbki zdjęć (cows/jobs.py)
+DOCUMENT_MAX_SIZE = config('DOCUMENT_MAX_SIZE', default=200 * 1024 * 1024, cast=int)  # bajty, wysyłka kawałkami (cows/uploads.py)
+CHUNKED_UPLOAD_DIR = config('CHUNKED_UPLOAD_DIR', default='') or None  # pliki częściowe; domyślnie MEDIA_ROOT/uploads-partial
+BULK_MAX_COWS = config('BULK_MAX_COWS', default=5000, cast=int)  # limit krów w jednej operacji zbiorczej (cows/bulk.py)
+TASK_HORIZON_DAYS = config('TASK_HORIZON_DAYS', default=90, cast=int)  # na ile dni naprzód tworzyć wystąpienia zadań cyklicznych (cows/recurrence.py)
+GROWTH_ROLLING_DAYS = config('GROWTH_ROLLING_DAYS', default=30, cast=int)  # okno średniego przyrostu dziennego (cows/growth.py)
+INBREEDING_WARNING_THRESHOLD = config('INBREEDING_WARNING_THRESHOLD', default=0.0625, cast=float)  # ostrzeżenie przy kojarzeniu
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -100,6 +138,16 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Pliki z MEDIA_ROOT tylko pod podpisanymi adresami /api/media/... (cows/media.py)
+STORAGES = {
+    'default': {'BACKEND': 'cows.media.SignedMediaStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MEDIA_SERVER = config('MEDIA_SERVER', default='django')  # django | nginx (X-Accel-Redirect) | sendfile (X-Sendfile)
+if MEDIA_SERVER not in ('django', 'nginx', 'sendfile'):
+    raise ImproperlyConfigured(f'MEDIA_SERVER={MEDIA_SERVER}: dozwolone django, nginx, sendfile')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')  # location internal w nginx.conf
+MEDIA_URL_TTL = config('MEDIA_URL_TTL', default=30 * 24 * 3600, cast=int)  # sekundy ważności podpisanego adresu (i tylko dla aktywnego konta)
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -121,7 +169,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'cows.pagination.KeysetPagination',  # kursor zamiast ?page= (bez COUNT i OFFSET)
     'PAGE_SIZE': 50,
 }
 
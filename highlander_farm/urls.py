@@ -15,7 +15,6 @@ urlpatterns = [
     path('api/', include('cows.urls')),
 ]
 
-# Dodaj obsługę plików statycznych i mediów (rozwiąże błędy 404 w adminie)
+# Dodaj obsługę plików statycznych (rozwiąże błędy 404 w adminie). Media nie - idą przez /api/media/ (cows/media.py)
 if settings.DEBUG:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file